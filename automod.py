@@ -0,0 +1,131 @@
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+from config import (
+    AUTOMOD_RATE_PER_SECOND, AUTOMOD_RATE_BURST, AUTOMOD_DUPLICATE_WINDOW,
+    AUTOMOD_DUPLICATE_THRESHOLD, AUTOMOD_MAX_MENTIONS, AUTOMOD_BLOCK_INVITES,
+    AUTOMOD_BLOCK_LINKS, AUTOMOD_ALLOWED_DOMAINS
+)
+from word_matcher import WordFilterRegistry
+
+URL_PATTERN = re.compile(r"https?://([^\s/:?#]+)", re.IGNORECASE)
+INVITE_PATTERN = re.compile(r"(?:discord(?:app)?\.com/invite|discord\.gg)/\S+", re.IGNORECASE)
+# Users are forgotten after this many seconds without a message
+IDLE_EXPIRY = 300
+
+# (rule, detail)
+Violation = Tuple[str, str]
+
+class UserState:
+    """Token bucket and recent message hashes for one user"""
+    __slots__ = ("tokens", "updated", "hashes", "hash_counts")
+    
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        # (sent_at, content hash) within the duplicate window
+        self.hashes: Deque[Tuple[float, int]] = deque()
+        self.hash_counts: Dict[int, int] = {}
+
+class AutoMod:
+    """Per-message spam checks that only touch the sending user's state"""
+    def __init__(
+        self,
+        rate: float = AUTOMOD_RATE_PER_SECOND,
+        burst: int = AUTOMOD_RATE_BURST,
+        duplicate_window: float = AUTOMOD_DUPLICATE_WINDOW,
+        duplicate_threshold: int = AUTOMOD_DUPLICATE_THRESHOLD,
+        max_mentions: int = AUTOMOD_MAX_MENTIONS,
+        block_invites: bool = AUTOMOD_BLOCK_INVITES,
+        block_links: bool = AUTOMOD_BLOCK_LINKS,
+        allowed_domains: Iterable[str] = AUTOMOD_ALLOWED_DOMAINS,
+        word_filters: Optional[WordFilterRegistry] = None
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.duplicate_window = duplicate_window
+        self.duplicate_threshold = duplicate_threshold
+        self.max_mentions = max_mentions
+        self.block_invites = block_invites
+        self.block_links = block_links
+        self.allowed_domains = {domain.lower() for domain in allowed_domains}
+        # Aho-Corasick matchers of banned terms per guild
+        self.word_filters = word_filters if word_filters is not None else WordFilterRegistry()
+        self._users: Dict[Tuple[int, int], UserState] = {}
+        self._last_sweep = time.monotonic()
+    
+    def check(self, guild_id: int, user_id: int, content: str, mentions: int = 0, now: Optional[float] = None) -> Optional[Violation]:
+        """Return the first rule a message breaks, or None"""
+        now = time.monotonic() if now is None else now
+        key = (guild_id, user_id)
+        state = self._users.get(key)
+        if state is None:
+            state = self._users[key] = UserState(self.burst, now)
+        
+        # Token bucket: refill lazily from the time since the user's last message
+        state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+        state.updated = now
+        rate_limited = state.tokens < 1
+        if not rate_limited:
+            state.tokens -= 1
+        
+        duplicates = self._track_duplicate(state, content, now)
+        
+        if now - self._last_sweep > IDLE_EXPIRY:
+            self._sweep(now)
+        
+        if rate_limited:
+            return ("rate", f"more than {self.burst} messages in a burst")
+        if self.duplicate_threshold and duplicates >= self.duplicate_threshold:
+            return ("duplicate", f"same message sent {duplicates} times in {self.duplicate_window:g}s")
+        if self.max_mentions and mentions > self.max_mentions:
+            return ("mentions", f"{mentions} mentions in one message")
+        if content:
+            link = self._check_links(content)
+            if link:
+                return link
+            term = self.word_filters.matcher(guild_id).search(content)
+            if term:
+                return ("banned_word", f"banned word: {term}")
+        return None
+    
+    def _track_duplicate(self, state: UserState, content: str, now: float) -> int:
+        """Add a message to the user's rolling hash window; returns how often it was seen"""
+        cutoff = now - self.duplicate_window
+        while state.hashes and state.hashes[0][0] < cutoff:
+            _, old = state.hashes.popleft()
+            remaining = state.hash_counts[old] - 1
+            if remaining:
+                state.hash_counts[old] = remaining
+            else:
+                del state.hash_counts[old]
+        if not content:
+            return 0
+        digest = hash(" ".join(content.lower().split()))
+        state.hashes.append((now, digest))
+        count = state.hash_counts.get(digest, 0) + 1
+        state.hash_counts[digest] = count
+        return count
+    
+    def _check_links(self, content: str) -> Optional[Violation]:
+        # Schemes and hosts are case-insensitive (HTTP://, DISCORD.GG)
+        lowered = content.lower()
+        if "http" not in lowered and "discord" not in lowered:
+            return None
+        if self.block_invites and INVITE_PATTERN.search(content):
+            return ("invite", "server invite link")
+        if self.block_links:
+            for domain in URL_PATTERN.findall(content):
+                domain = domain.lower()
+                if not any(domain == allowed or domain.endswith("." + allowed) for allowed in self.allowed_domains):
+                    return ("link", f"link to {domain}")
+        return None
+    
+    def _sweep(self, now: float):
+        """Forget users who have been quiet long enough that their state has fully reset"""
+        self._last_sweep = now
+        idle = [key for key, state in self._users.items() if now - state.updated > IDLE_EXPIRY]
+        for key in idle:
+            del self._users[key]
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the AutoMod banned-word matcher.
+Per-message search time should stay flat as the term list grows.
+"""
+
+import random
+import string
+import time
+
+from word_matcher import WordMatcher, normalize
+
+MESSAGES = 2000
+ADDED_TERMS = 20
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+def build_messages(rng: random.Random):
+    words = [random_word(rng) for _ in range(500)]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(5, 40))) for _ in range(MESSAGES)]
+
+def bench(term_count: int, messages):
+    rng = random.Random(term_count)
+    terms = [random_word(rng) + "x" for _ in range(term_count)]
+    
+    start = time.perf_counter()
+    matcher = WordMatcher(terms)
+    matcher.search("warm up")
+    build = time.perf_counter() - start
+    
+    # Adding a term links only its new nodes; averaged over several terms
+    added = [random_word(rng) + "q" for _ in range(ADDED_TERMS)]
+    start = time.perf_counter()
+    for term in added:
+        matcher.add([term])
+    add = (time.perf_counter() - start) / ADDED_TERMS
+    
+    start = time.perf_counter()
+    matcher._link()
+    relink = time.perf_counter() - start
+    
+    folded = [normalize(message) for message in messages]
+    start = time.perf_counter()
+    for message in messages:
+        matcher.search(message)
+    total = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for text, fold in zip(messages, folded):
+        matcher.search(text, fold)
+    search_only = time.perf_counter() - start
+    
+    print(
+        f"{term_count:>6} terms: build {build * 1000:8.1f}ms, add one {add * 1000:7.3f}ms (full relink {relink * 1000:6.1f}ms), "
+        f"{total / len(messages) * 1e6:6.1f}µs/message ({search_only / len(messages) * 1e6:5.1f}µs without normalize)"
+    )
+
+def main():
+    print("🧪 Banned-word matcher benchmark")
+    print("=" * 40)
+    messages = build_messages(random.Random(0))
+    for term_count in (10, 100, 1000, 10000):
+        bench(term_count, messages)
+
+if __name__ == "__main__":
+    main()
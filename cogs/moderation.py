@@ -1,25 +1,155 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from typing import Optional
+from typing import Dict, List, Optional, Set, Tuple
 import asyncio
+import re
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
-from config import MAX_WARNINGS, MUTE_DURATION, LOG_CHANNEL_ID, EMBED_COLORS
-from database import ModerationDB
+from config import (
+    MAX_WARNINGS, MUTE_DURATION, LOG_CHANNEL_ID, EMBED_COLORS, PURGE_MAX_AMOUNT,
+    RAID_DETECTION, RAID_MUTE_DURATION, AUTOMOD_ENABLED, AUTOMOD_ACTION_COOLDOWN,
+    AUTOMOD_MUTE_AFTER_WARNINGS
+)
+from database import create_database
+from mute_scheduler import MuteScheduler, MuteKey
+from overwrites import ProgressCallback, apply_overwrite, has_overwrite, provision_overwrites
+from purge import MessageCheck, build_check, purge_channel, purge_guild
+from mass_actions import bulk_ban, collect_user_ids, run_batch
+from raid_detector import RaidDetector
+from automod import AutoMod
+from log_sink import LogSink
+from metrics import log_sink_queue_depth
+from tracing import span, start_trace, traced
 from utils import (
     has_mod_permissions, can_moderate_target, create_moderation_embed,
     parse_duration, format_duration, sanitize_reason
 )
 
+# Warnings shown per /warnings page; with reasons shortened this stays under the 6000 character embed limit
+WARNINGS_PER_PAGE = 10
+# Users whose rendered /warnings pages are kept
+WARNING_PAGE_CACHE_USERS = 100
+
+class WarningsView(discord.ui.View):
+    """Buttons that page through a user's warnings one store page at a time"""
+    def __init__(self, cog: "ModerationCog", initiator: discord.abc.User, user: discord.Member, page_count: int, timeout: int = 180):
+        super().__init__(timeout=timeout)
+        self.cog = cog
+        self.initiator = initiator
+        self.user = user
+        self.page = 0
+        self.page_count = page_count
+        self._update_buttons()
+    
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+    
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.initiator.id:
+            await interaction.response.send_message("❌ Only the moderator who ran this command can change pages.", ephemeral=True)
+            return False
+        return True
+    
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        embed, self.page, self.page_count = self.cog.warnings_page(self.user, page)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+    
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary, emoji="◀️")
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page - 1)
+    
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary, emoji="▶️")
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+    
+    async def on_timeout(self) -> None:
+        for item in self.children:
+            if isinstance(item, discord.ui.Button):
+                item.disabled = True
+
 class ModerationCog(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, db=None):
         self.bot = bot
-        self.db = ModerationDB()
+        # main.py injects the process-wide store so the web server sees every change
+        self.db = db if db is not None else create_database()
         self.muted_role_name = "Muted"
+        # One task unmutes everyone in expiry order instead of a sleeping task per mute
+        self.mute_scheduler = MuteScheduler(self.expire_mutes)
+        # Guilds whose channels had one full pass for the Muted overwrite during this run;
+        # channels that failed are retried when they change, not on every mute
+        self._provisioned_guilds: Set[int] = set()
+        self._provisioning: Dict[int, asyncio.Task] = {}
+        # Log embeds are queued and sent up to 10 per message
+        self.log_sink = LogSink(bot, LOG_CHANNEL_ID)
+        # (guild_id, user_id) -> {page: (embed, page_count)}, dropped when the user's warnings change
+        self._warning_pages: "OrderedDict[Tuple[int, int], Dict[int, Tuple[discord.Embed, int]]]" = OrderedDict()
+        # Join-rate raid detection; guild_id -> verification level to restore after a lockdown
+        self.raid_detector = RaidDetector()
+        self._lockdown_levels: Dict[int, discord.VerificationLevel] = {}
+        self._lockdown_tasks: Dict[int, asyncio.Task] = {}
+        # Spam filter for on_message; (guild_id, user_id) -> when AutoMod last warned them
+        self.automod = AutoMod()
+        self._automod_actioned: Dict[Tuple[int, int], float] = {}
+        # Fire-and-forget work started from listeners; held so it isn't garbage collected mid-run
+        self._background_tasks: Set[asyncio.Task] = set()
+    
+    async def cog_load(self):
+        """Rebuild the unmute schedule from stored mutes so restarts don't lose them"""
+        for mute in self.db.get_all_mutes():
+            try:
+                self.mute_scheduler.schedule(mute.get('guild_id'), mute['user_id'], mute['expires_at'])
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Skipping invalid mute record for {mute.get('user_id')}: {e}")
+        self.db.add_event_listener(self.invalidate_warning_pages)
+        self.mute_scheduler.start()
+        self.log_sink.start()
+        log_sink_queue_depth.set_function(lambda: self.log_sink.queue_depth)
+        print(f"⏰ Scheduled {len(self.mute_scheduler)} pending unmute(s)")
+    
+    async def cog_unload(self):
+        """Stop the unmute scheduler and deliver queued log messages"""
+        self.mute_scheduler.stop()
+        for task in self._lockdown_tasks.values():
+            task.cancel()
+        for task in self._background_tasks:
+            task.cancel()
+        await self.log_sink.close()
+        log_sink_queue_depth.set_function(None)
+        if self.invalidate_warning_pages in self.db.event_listeners:
+            self.db.event_listeners.remove(self.invalidate_warning_pages)
+    
+    def spawn(self, coro) -> asyncio.Task:
+        """Run a coroutine in the background, keeping a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+    
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Start the trace that times each stage of the command"""
+        command = interaction.command
+        interaction.extras['trace'] = start_trace(command.qualified_name if command else "unknown")
+        return True
+    
+    def observe_command(self, interaction: discord.Interaction, status: str):
+        """Finish the command's trace, recording its latency"""
+        trace = interaction.extras.get('trace')
+        if trace is not None:
+            trace.finish(status)
+    
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command: app_commands.Command):
+        if getattr(command, "binding", None) is self:
+            self.observe_command(interaction, "ok")
     
     async def cog_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
         """Handle errors in moderation commands"""
+        self.observe_command(interaction, "error")
         try:
             # Check if interaction is still valid
             if interaction.response.is_done():
@@ -55,17 +185,74 @@ class ModerationCog(commands.Cog):
             print(f"Failed to handle command error: {e}")
             print(f"Original error: {error}")
     
+    def invalidate_warning_pages(self, event: Dict):
+        """Drop cached /warnings pages of a user whose warnings changed"""
+        if event['type'] not in ('warning_added', 'warnings_cleared'):
+            return
+        if 'guild_id' in event:
+            self._warning_pages.pop((event['guild_id'], event['user_id']), None)
+        else:
+            # Unpartitioned stores share warnings between guilds
+            for key in [key for key in self._warning_pages if key[1] == event['user_id']]:
+                del self._warning_pages[key]
+    
+    def warnings_page(self, user: discord.Member, page: int) -> Tuple[discord.Embed, int, int]:
+        """Render one page of a user's warnings; returns (embed, page, page_count)"""
+        key = (user.guild.id, user.id)
+        cached = self._warning_pages.get(key)
+        if cached is not None:
+            self._warning_pages.move_to_end(key)
+            page_count = next(iter(cached.values()))[1]
+            page = max(0, min(page, page_count - 1))
+            if page in cached:
+                return cached[page][0], page, page_count
+        
+        db = self.db.for_guild(user.guild.id)
+        warning_count = db.get_warning_count(user.id)
+        page_count = max(1, -(-warning_count // WARNINGS_PER_PAGE))
+        page = max(0, min(page, page_count - 1))
+        
+        if not warning_count:
+            embed = create_moderation_embed(
+                title="📋 User Warnings",
+                description=f"{user.mention} has no warnings.",
+                color="success",
+                user=user
+            )
+        else:
+            embed = create_moderation_embed(
+                title="📋 User Warnings",
+                description=f"{user.mention} has {warning_count} warning(s):",
+                color="info",
+                user=user
+            )
+            
+            for warning in db.get_warnings_page(user.id, page * WARNINGS_PER_PAGE, WARNINGS_PER_PAGE):
+                reason = warning['reason']
+                if len(reason) > 400:
+                    reason = reason[:397] + "..."
+                embed.add_field(
+                    name=f"Warning #{warning['warning_id']}",
+                    value=f"**Reason:** {reason}\n**Moderator:** <@{warning['moderator_id']}>\n**Date:** <t:{int(datetime.fromisoformat(warning['timestamp']).timestamp())}:R>",
+                    inline=False
+                )
+            
+            if page_count > 1:
+                embed.set_footer(text=f"Moderation Bot • Page {page + 1}/{page_count}")
+        
+        pages = self._warning_pages.setdefault(key, {})
+        pages[page] = (embed, page_count)
+        self._warning_pages.move_to_end(key)
+        while len(self._warning_pages) > WARNING_PAGE_CACHE_USERS:
+            self._warning_pages.popitem(last=False)
+        return embed, page, page_count
+    
     async def log_moderation_action(self, embed: discord.Embed):
         """Log moderation action to log channel"""
-        if LOG_CHANNEL_ID:
-            try:
-                log_channel = self.bot.get_channel(LOG_CHANNEL_ID)
-                if log_channel:
-                    await log_channel.send(embed=embed)
-            except Exception as e:
-                print(f"Failed to log moderation action: {e}")
+        with span("logging"):
+            self.log_sink.put(embed)
     
-    async def get_or_create_muted_role(self, guild: discord.Guild) -> Optional[discord.Role]:
+    async def get_or_create_muted_role(self, guild: discord.Guild, progress: Optional[ProgressCallback] = None) -> Optional[discord.Role]:
         """Get or create muted role"""
         muted_role = discord.utils.get(guild.roles, name=self.muted_role_name)
         
@@ -76,17 +263,82 @@ class ModerationCog(commands.Cog):
                     color=discord.Color.dark_grey(),
                     reason="Moderation bot muted role"
                 )
-                
-                # Set permissions for all channels
-                for channel in guild.channels:
-                    if isinstance(channel, (discord.TextChannel, discord.VoiceChannel)):
-                        await channel.set_permissions(muted_role, send_messages=False, speak=False)
-                
             except discord.Forbidden:
                 return None
         
+        # Set permissions for all channels once per run; this also finishes a
+        # setup that was interrupted before every channel was done
+        if guild.id not in self._provisioned_guilds:
+            task = self._provisioning.get(guild.id)
+            if task is None:
+                task = asyncio.create_task(self.provision_muted_role(guild, muted_role, progress))
+                self._provisioning[guild.id] = task
+            # Shielded so a timed-out interaction doesn't abandon the setup
+            await asyncio.shield(task)
+        
         return muted_role
     
+    async def provision_muted_role(self, guild: discord.Guild, muted_role: discord.Role, progress: Optional[ProgressCallback] = None):
+        """Apply the Muted role overwrite to every text and voice channel"""
+        try:
+            channels = [
+                channel for channel in guild.channels
+                if isinstance(channel, (discord.TextChannel, discord.VoiceChannel))
+            ]
+            result = await provision_overwrites(
+                muted_role,
+                channels,
+                self.muted_overwrite(),
+                reason="Moderation bot muted role",
+                progress=progress
+            )
+            if result['total']:
+                print(f"🔧 Muted role overwrites in {guild.name}: {result['updated']} set, {result['failed']} failed")
+            # Failures are mostly Forbidden, which retrying on every mute won't fix; those
+            # channels are tried again when they or the bot's permissions change
+            self._provisioned_guilds.add(guild.id)
+        finally:
+            self._provisioning.pop(guild.id, None)
+    
+    def muted_overwrite(self) -> discord.PermissionOverwrite:
+        """Channel overwrite that keeps the Muted role from talking"""
+        return discord.PermissionOverwrite(send_messages=False, speak=False)
+    
+    async def provision_channel(self, channel: discord.abc.GuildChannel):
+        """Give one channel the Muted overwrite if it lacks it"""
+        if not isinstance(channel, (discord.TextChannel, discord.VoiceChannel)):
+            return
+        muted_role = discord.utils.get(channel.guild.roles, name=self.muted_role_name)
+        overwrite = self.muted_overwrite()
+        if muted_role is None or has_overwrite(channel, muted_role, overwrite):
+            return
+        try:
+            await apply_overwrite(channel, muted_role, overwrite, reason="Moderation bot muted role")
+        except discord.HTTPException as e:
+            print(f"Failed to set overwrite on #{channel}: {e}")
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        await self.provision_channel(channel)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        # Our own overwrite also lands here, but then has_overwrite is already true
+        if before.overwrites != after.overwrites:
+            await self.provision_channel(after)
+    
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        # The bot may now be allowed into channels that failed before; redo the pass on the next mute
+        if after in after.guild.me.roles and before.permissions != after.permissions:
+            self._provisioned_guilds.discard(after.guild.id)
+    
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        # A recreated Muted role starts without overwrites
+        if role.name == self.muted_role_name:
+            self._provisioned_guilds.discard(role.guild.id)
+    
     @app_commands.command(name="warn", description="Warn a user for breaking rules")
     @app_commands.describe(
         user="The user to warn",
@@ -95,23 +347,28 @@ class ModerationCog(commands.Cog):
     async def warn(self, interaction: discord.Interaction, user: discord.Member, reason: str):
         """Warn a user"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            can_mod, error_msg = can_moderate_target(interaction.user, user)
+            with span("permission"):
+                can_mod, error_msg = can_moderate_target(interaction.user, user)
             if not can_mod:
                 await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
                 return
             
-            await interaction.response.defer()
+            await traced("defer", interaction.response.defer())
             
             # Sanitize reason
             sanitized_reason = sanitize_reason(reason)
             
             # Add warning to database
-            warning = self.db.add_warning(user.id, interaction.user.id, sanitized_reason)
-            warnings = self.db.get_warnings(user.id)
+            with span("db"):
+                db = self.db.for_guild(interaction.guild.id)
+                warning = db.add_warning(user.id, interaction.user.id, sanitized_reason)
+                warning_count = db.get_warning_count(user.id)
             
             # Create embed
             embed = create_moderation_embed(
@@ -122,16 +379,16 @@ class ModerationCog(commands.Cog):
                 moderator=interaction.user,
                 reason=sanitized_reason,
                 Warning_ID=warning['warning_id'],
-                Total_Warnings=len(warnings)
+                Total_Warnings=warning_count
             )
             
-            await interaction.followup.send(embed=embed)
+            await traced("rest", interaction.followup.send(embed=embed))
             await self.log_moderation_action(embed)
             
             # Check if user should be auto-banned
-            if len(warnings) >= MAX_WARNINGS:
+            if warning_count >= MAX_WARNINGS:
                 try:
-                    await user.ban(reason=f"Auto-ban: Reached {MAX_WARNINGS} warnings")
+                    await traced("rest", user.ban(reason=f"Auto-ban: Reached {MAX_WARNINGS} warnings"))
                     ban_embed = create_moderation_embed(
                         title="🚫 User Auto-Banned",
                         description=f"{user.mention} has been automatically banned for reaching {MAX_WARNINGS} warnings.",
@@ -140,7 +397,7 @@ class ModerationCog(commands.Cog):
                         moderator=self.bot.user,
                         reason=f"Auto-ban: Reached {MAX_WARNINGS} warnings"
                     )
-                    await interaction.followup.send(embed=ban_embed)
+                    await traced("rest", interaction.followup.send(embed=ban_embed))
                     await self.log_moderation_action(ban_embed)
                 except discord.Forbidden:
                     await interaction.followup.send("⚠️ User reached max warnings but couldn't be banned due to permissions.")
@@ -161,37 +418,20 @@ class ModerationCog(commands.Cog):
     async def warnings(self, interaction: discord.Interaction, user: discord.Member):
         """View user warnings"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            await interaction.response.defer()
-            
-            warnings = self.db.get_warnings(user.id)
+            await traced("defer", interaction.response.defer())
             
-            if not warnings:
-                embed = create_moderation_embed(
-                    title="📋 User Warnings",
-                    description=f"{user.mention} has no warnings.",
-                    color="success",
-                    user=user
-                )
-            else:
-                embed = create_moderation_embed(
-                    title="📋 User Warnings",
-                    description=f"{user.mention} has {len(warnings)} warning(s):",
-                    color="info",
-                    user=user
-                )
-                
-                for warning in warnings:
-                    embed.add_field(
-                        name=f"Warning #{warning['warning_id']}",
-                        value=f"**Reason:** {warning['reason']}\n**Moderator:** <@{warning['moderator_id']}>\n**Date:** <t:{int(datetime.fromisoformat(warning['timestamp']).timestamp())}:R>",
-                        inline=False
-                    )
+            with span("db"):
+                embed, _, page_count = self.warnings_page(user, 0)
             
-            await interaction.followup.send(embed=embed)
+            # Only users with more than one page of warnings get buttons
+            view = WarningsView(self, interaction.user, user, page_count) if page_count > 1 else discord.utils.MISSING
+            await traced("rest", interaction.followup.send(embed=embed, view=view))
             
         except Exception as e:
             print(f"Error in warnings command: {e}")
@@ -208,18 +448,24 @@ class ModerationCog(commands.Cog):
     async def clear_warnings(self, interaction: discord.Interaction, user: discord.Member):
         """Clear user warnings"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            await interaction.response.defer()
+            await traced("defer", interaction.response.defer())
             
-            warnings = self.db.get_warnings(user.id)
+            with span("db"):
+                db = self.db.for_guild(interaction.guild.id)
+                warnings = db.get_warnings(user.id)
             if not warnings:
                 await interaction.followup.send(f"❌ {user.mention} has no warnings to clear.")
                 return
             
-            self.db.clear_warnings(user.id)
+            with span("db"):
+                db = self.db.for_guild(interaction.guild.id)
+                db.clear_warnings(user.id)
             
             embed = create_moderation_embed(
                 title="🧹 Warnings Cleared",
@@ -230,7 +476,7 @@ class ModerationCog(commands.Cog):
                 Warnings_Cleared=len(warnings)
             )
             
-            await interaction.followup.send(embed=embed)
+            await traced("rest", interaction.followup.send(embed=embed))
             await self.log_moderation_action(embed)
             
         except Exception as e:
@@ -252,16 +498,19 @@ class ModerationCog(commands.Cog):
     async def mute(self, interaction: discord.Interaction, user: discord.Member, duration: str, reason: str = "No reason provided"):
         """Mute a user"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            can_mod, error_msg = can_moderate_target(interaction.user, user)
+            with span("permission"):
+                can_mod, error_msg = can_moderate_target(interaction.user, user)
             if not can_mod:
                 await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
                 return
             
-            await interaction.response.defer()
+            await traced("defer", interaction.response.defer())
             
             # Parse duration
             duration_seconds = parse_duration(duration)
@@ -273,17 +522,24 @@ class ModerationCog(commands.Cog):
             sanitized_reason = sanitize_reason(reason)
             
             try:
+                async def report_progress(done: int, total: int):
+                    await interaction.edit_original_response(
+                        content=f"🔧 Setting up the {self.muted_role_name} role: {done}/{total} channels..."
+                    )
+                
                 # Get or create muted role
-                muted_role = await self.get_or_create_muted_role(interaction.guild)
+                muted_role = await traced("rest", self.get_or_create_muted_role(interaction.guild, progress=report_progress))
                 if not muted_role:
                     await interaction.followup.send("❌ Could not create or find muted role.")
                     return
                 
                 # Add muted role to user
-                await user.add_roles(muted_role, reason=f"Muted by {interaction.user}: {sanitized_reason}")
+                await traced("rest", user.add_roles(muted_role, reason=f"Muted by {interaction.user}: {sanitized_reason}"))
                 
                 # Add to database
-                mute_record = self.db.add_mute(user.id, interaction.user.id, duration_seconds, sanitized_reason)
+                with span("db"):
+                    db = self.db.for_guild(interaction.guild.id)
+                    mute_record = db.add_mute(user.id, interaction.user.id, duration_seconds, sanitized_reason, guild_id=interaction.guild.id)
                 
                 # Create embed
                 embed = create_moderation_embed(
@@ -297,11 +553,11 @@ class ModerationCog(commands.Cog):
                     Expires=f"<t:{int(datetime.fromisoformat(mute_record['expires_at']).timestamp())}:R>"
                 )
                 
-                await interaction.followup.send(embed=embed)
+                await traced("rest", interaction.followup.send(embed=embed))
                 await self.log_moderation_action(embed)
                 
                 # Schedule unmute
-                self.bot.loop.create_task(self.schedule_unmute(user, duration_seconds, interaction.guild))
+                self.mute_scheduler.schedule(interaction.guild.id, user.id, mute_record['expires_at'])
                 
             except discord.Forbidden:
                 await interaction.followup.send("❌ Could not mute user. Check bot permissions.")
@@ -318,41 +574,60 @@ class ModerationCog(commands.Cog):
             except:
                 print(f"Could not send error message for mute command: {e}")
     
-    async def schedule_unmute(self, user: discord.Member, duration: int, guild: discord.Guild):
-        """Schedule automatic unmute"""
-        await asyncio.sleep(duration)
-        
+    async def expire_mutes(self, due: List[MuteKey]):
+        """Unmute a batch of members whose mutes have expired"""
+        await self.bot.wait_until_ready()
+        await asyncio.gather(*(self.expire_mute(guild_id, user_id) for guild_id, user_id in due))
+    
+    async def expire_mute(self, guild_id: Optional[int], user_id: int):
+        """Automatically unmute a member whose mute expired"""
         try:
-            # Check if user is still in the guild
-            member = guild.get_member(user.id)
-            if not member:
-                return
-            
-            # Remove muted role
-            muted_role = discord.utils.get(guild.roles, name=self.muted_role_name)
-            if muted_role and muted_role in member.roles:
-                await member.remove_roles(muted_role, reason="Mute expired")
-                
-                # Remove from database
-                self.db.remove_mute(user.id)
+            # Pinned so the store can't be evicted while the role is removed
+            with self.db.pinned(guild_id) as db:
+                # Already unmuted by hand since it was scheduled
+                if not db.get_mute(user_id):
+                    return
                 
-                # Send unmute notification
-                embed = create_moderation_embed(
-                    title="🔊 User Unmuted",
-                    description=f"{user.mention} has been automatically unmuted.",
-                    color="success",
-                    user=user,
-                    reason="Mute duration expired"
-                )
+                # Mutes recorded before guild ids were stored: look in every guild
+                guilds = [self.bot.get_guild(guild_id)] if guild_id else self.bot.guilds
+                member = None
+                for guild in guilds:
+                    member = guild.get_member(user_id) if guild else None
+                    if member:
+                        break
                 
-                # Try to DM user
-                try:
-                    await user.send(embed=embed)
-                except:
-                    pass
+                # Check if user is still in the guild
+                if not member:
+                    db.remove_mute(user_id, expired=True)
+                    return
                 
-                # Log unmute
-                await self.log_moderation_action(embed)
+                # Remove muted role
+                muted_role = discord.utils.get(member.guild.roles, name=self.muted_role_name)
+                if not muted_role or muted_role not in member.roles:
+                    db.remove_mute(user_id, expired=True)
+                else:
+                    await member.remove_roles(muted_role, reason="Mute expired")
+                    
+                    # Remove from database
+                    db.remove_mute(user_id, expired=True)
+                    
+                    # Send unmute notification
+                    embed = create_moderation_embed(
+                        title="🔊 User Unmuted",
+                        description=f"{member.mention} has been automatically unmuted.",
+                        color="success",
+                        user=member,
+                        reason="Mute duration expired"
+                    )
+                    
+                    # Try to DM user
+                    try:
+                        await member.send(embed=embed)
+                    except:
+                        pass
+                    
+                    # Log unmute
+                    await self.log_moderation_action(embed)
                 
         except Exception as e:
             print(f"Error in scheduled unmute: {e}")
@@ -362,11 +637,13 @@ class ModerationCog(commands.Cog):
     async def unmute(self, interaction: discord.Interaction, user: discord.Member):
         """Unmute a user"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            await interaction.response.defer()
+            await traced("defer", interaction.response.defer())
             
             muted_role = discord.utils.get(interaction.guild.roles, name=self.muted_role_name)
             if not muted_role or muted_role not in user.roles:
@@ -374,8 +651,11 @@ class ModerationCog(commands.Cog):
                 return
             
             try:
-                await user.remove_roles(muted_role, reason=f"Unmuted by {interaction.user}")
-                self.db.remove_mute(user.id)
+                await traced("rest", user.remove_roles(muted_role, reason=f"Unmuted by {interaction.user}"))
+                with span("db"):
+                    db = self.db.for_guild(interaction.guild.id)
+                    db.remove_mute(user.id)
+                self.mute_scheduler.cancel(interaction.guild.id, user.id)
                 
                 embed = create_moderation_embed(
                     title="🔊 User Unmuted",
@@ -385,7 +665,7 @@ class ModerationCog(commands.Cog):
                     moderator=interaction.user
                 )
                 
-                await interaction.followup.send(embed=embed)
+                await traced("rest", interaction.followup.send(embed=embed))
                 await self.log_moderation_action(embed)
                 
             except discord.Forbidden:
@@ -409,25 +689,30 @@ class ModerationCog(commands.Cog):
     async def kick(self, interaction: discord.Interaction, user: discord.Member, reason: str = "No reason provided"):
         """Kick a user"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            can_mod, error_msg = can_moderate_target(interaction.user, user)
+            with span("permission"):
+                can_mod, error_msg = can_moderate_target(interaction.user, user)
             if not can_mod:
                 await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
                 return
             
-            await interaction.response.defer()
+            await traced("defer", interaction.response.defer())
             
             # Sanitize reason
             sanitized_reason = sanitize_reason(reason)
             
             try:
-                await user.kick(reason=f"Kicked by {interaction.user}: {sanitized_reason}")
+                await traced("rest", user.kick(reason=f"Kicked by {interaction.user}: {sanitized_reason}"))
                 
                 # Log kick
-                self.db.log_kick(user.id, interaction.user.id, sanitized_reason)
+                with span("db"):
+                    db = self.db.for_guild(interaction.guild.id)
+                    db.log_kick(user.id, interaction.user.id, sanitized_reason)
                 
                 embed = create_moderation_embed(
                     title="👢 User Kicked",
@@ -438,7 +723,7 @@ class ModerationCog(commands.Cog):
                     reason=sanitized_reason
                 )
                 
-                await interaction.followup.send(embed=embed)
+                await traced("rest", interaction.followup.send(embed=embed))
                 await self.log_moderation_action(embed)
                 
             except discord.Forbidden:
@@ -462,25 +747,30 @@ class ModerationCog(commands.Cog):
     async def ban(self, interaction: discord.Interaction, user: discord.Member, reason: str = "No reason provided"):
         """Ban a user"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            can_mod, error_msg = can_moderate_target(interaction.user, user)
+            with span("permission"):
+                can_mod, error_msg = can_moderate_target(interaction.user, user)
             if not can_mod:
                 await interaction.response.send_message(f"❌ {error_msg}", ephemeral=True)
                 return
             
-            await interaction.response.defer()
+            await traced("defer", interaction.response.defer())
             
             # Sanitize reason
             sanitized_reason = sanitize_reason(reason)
             
             try:
-                await user.ban(reason=f"Banned by {interaction.user}: {sanitized_reason}")
+                await traced("rest", user.ban(reason=f"Banned by {interaction.user}: {sanitized_reason}"))
                 
                 # Add to database
-                self.db.add_ban(user.id, interaction.user.id, sanitized_reason)
+                with span("db"):
+                    db = self.db.for_guild(interaction.guild.id)
+                    db.add_ban(user.id, interaction.user.id, sanitized_reason)
                 
                 embed = create_moderation_embed(
                     title="🚫 User Banned",
@@ -491,7 +781,7 @@ class ModerationCog(commands.Cog):
                     reason=sanitized_reason
                 )
                 
-                await interaction.followup.send(embed=embed)
+                await traced("rest", interaction.followup.send(embed=embed))
                 await self.log_moderation_action(embed)
                 
             except discord.Forbidden:
@@ -515,26 +805,30 @@ class ModerationCog(commands.Cog):
     async def unban(self, interaction: discord.Interaction, user_id: str, reason: str = "No reason provided"):
         """Unban a user"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            await interaction.response.defer()
+            await traced("defer", interaction.response.defer())
             
             try:
                 user_id = int(user_id)
-                user = await self.bot.fetch_user(user_id)
+                user = await traced("rest", self.bot.fetch_user(user_id))
                 
                 # Check if user is banned
-                ban_entry = await interaction.guild.fetch_ban(user)
+                ban_entry = await traced("rest", interaction.guild.fetch_ban(user))
                 if not ban_entry:
                     await interaction.followup.send("❌ This user is not banned.")
                     return
                 
-                await interaction.guild.unban(user, reason=f"Unbanned by {interaction.user}: {reason}")
+                await traced("rest", interaction.guild.unban(user, reason=f"Unbanned by {interaction.user}: {reason}"))
                 
                 # Remove from database
-                self.db.remove_ban(user_id)
+                with span("db"):
+                    db = self.db.for_guild(interaction.guild.id)
+                    db.remove_ban(user_id)
                 
                 embed = create_moderation_embed(
                     title="✅ User Unbanned",
@@ -545,7 +839,7 @@ class ModerationCog(commands.Cog):
                     reason=reason
                 )
                 
-                await interaction.followup.send(embed=embed)
+                await traced("rest", interaction.followup.send(embed=embed))
                 await self.log_moderation_action(embed)
                 
             except ValueError:
@@ -567,43 +861,108 @@ class ModerationCog(commands.Cog):
     
     @app_commands.command(name="purge", description="Delete multiple messages")
     @app_commands.describe(
-        amount="Number of messages to delete (1-100)",
-        user="Only delete messages from this user (optional)"
+        amount=f"Number of messages to delete (1-{PURGE_MAX_AMOUNT})",
+        user="Only delete messages from this user (optional)",
+        pattern="Only delete messages matching this regular expression (optional)",
+        attachments="Only delete messages with attachments (optional)",
+        newer_than="Only delete messages newer than this, e.g. 30m, 2h (optional)",
+        older_than="Only delete messages older than this, e.g. 1d (optional)",
+        guild_wide="Purge the user's messages from every channel; amount applies per channel (optional)"
     )
-    async def purge(self, interaction: discord.Interaction, amount: int, user: Optional[discord.Member] = None):
+    async def purge(
+        self,
+        interaction: discord.Interaction,
+        amount: int,
+        user: Optional[discord.Member] = None,
+        pattern: Optional[str] = None,
+        attachments: bool = False,
+        newer_than: Optional[str] = None,
+        older_than: Optional[str] = None,
+        guild_wide: bool = False
+    ):
         """Purge messages"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            if amount < 1 or amount > 100:
-                await interaction.response.send_message("❌ Amount must be between 1 and 100.", ephemeral=True)
+            if amount < 1 or amount > PURGE_MAX_AMOUNT:
+                await interaction.response.send_message(f"❌ Amount must be between 1 and {PURGE_MAX_AMOUNT}.", ephemeral=True)
+                return
+            
+            if guild_wide and not user:
+                await interaction.response.send_message("❌ A guild-wide purge needs a user to purge.", ephemeral=True)
+                return
+            
+            regex = None
+            if pattern:
+                try:
+                    regex = re.compile(pattern, re.IGNORECASE)
+                except re.error as e:
+                    await interaction.response.send_message(f"❌ Invalid pattern: {e}", ephemeral=True)
+                    return
+            
+            newer_seconds = parse_duration(newer_than) if newer_than else None
+            older_seconds = parse_duration(older_than) if older_than else None
+            if (newer_than and not newer_seconds) or (older_than and not older_seconds):
+                await interaction.response.send_message("❌ Invalid duration format. Use: 5m, 1h, 2d, etc.", ephemeral=True)
                 return
+            now = discord.utils.utcnow()
+            after = now - timedelta(seconds=newer_seconds) if newer_seconds else None
+            before = now - timedelta(seconds=older_seconds) if older_seconds else None
             
-            await interaction.response.defer()
+            await traced("defer", interaction.response.defer())
             
             try:
-                def check(msg):
-                    if user:
-                        return msg.author == user
-                    return True
+                # Keep the deferred response so progress can be shown in it
+                original = await interaction.original_response()
+                check = build_check(user=user, pattern=regex, attachments_only=attachments, exclude_ids={original.id})
+                
+                if guild_wide:
+                    await self.purge_guild_wide(interaction, user, amount, check, after, before)
+                    return
                 
-                deleted = await interaction.channel.purge(limit=amount, check=check)
+                async def report_progress(deleted: int, scanned: int):
+                    await interaction.edit_original_response(
+                        content=f"🗑️ Purging: {deleted} deleted, {scanned} scanned..."
+                    )
+                
+                result = await traced("rest", purge_channel(
+                    interaction.channel,
+                    amount,
+                    check,
+                    after=after,
+                    before=before,
+                    reason=f"Purged by {interaction.user}",
+                    progress=report_progress
+                ))
                 
                 embed = create_moderation_embed(
                     title="🗑️ Messages Purged",
-                    description=f"Deleted {len(deleted)} message(s).",
+                    description=f"Deleted {result['deleted']} message(s).",
                     color="success",
                     moderator=interaction.user,
                     Channel=interaction.channel.mention,
-                    Amount=len(deleted)
+                    Amount=result['deleted'],
+                    Scanned=result['scanned']
                 )
                 
+                if result['failed']:
+                    embed.add_field(name="Failed", value=str(result['failed']), inline=True)
                 if user:
                     embed.add_field(name="User Filter", value=user.mention, inline=True)
+                if pattern:
+                    embed.add_field(name="Pattern", value=f"`{pattern[:100]}`", inline=True)
+                if attachments:
+                    embed.add_field(name="Attachments Only", value="Yes", inline=True)
+                if newer_than:
+                    embed.add_field(name="Newer Than", value=newer_than, inline=True)
+                if older_than:
+                    embed.add_field(name="Older Than", value=older_than, inline=True)
                 
-                await interaction.followup.send(embed=embed, delete_after=10)
+                await traced("rest", interaction.followup.send(embed=embed, delete_after=10))
                 await self.log_moderation_action(embed)
                 
             except discord.Forbidden:
@@ -619,20 +978,80 @@ class ModerationCog(commands.Cog):
             except:
                 print(f"Could not send error message for purge command: {e}")
     
+    async def purge_guild_wide(
+        self,
+        interaction: discord.Interaction,
+        user: discord.Member,
+        amount: int,
+        check: MessageCheck,
+        after: Optional[datetime],
+        before: Optional[datetime]
+    ):
+        """Purge a user's messages from every channel the bot can clean up"""
+        guild = interaction.guild
+        channels = []
+        for channel in [*guild.text_channels, *guild.threads]:
+            permissions = channel.permissions_for(guild.me)
+            if permissions.read_message_history and permissions.manage_messages:
+                channels.append(channel)
+        
+        async def report_progress(done: int, total: int):
+            await interaction.edit_original_response(
+                content=f"🗑️ Purging {user.display_name} across the server: {done}/{total} channels..."
+            )
+        
+        result = await traced("rest", purge_guild(
+            channels,
+            amount,
+            check,
+            after=after,
+            before=before,
+            reason=f"Guild-wide purge by {interaction.user}",
+            progress=report_progress
+        ))
+        
+        embed = create_moderation_embed(
+            title="🗑️ Guild-wide Purge",
+            description=f"Deleted {result['deleted']} message(s) from {user.mention} across {len(result['per_channel'])} channel(s).",
+            color="success",
+            user=user,
+            moderator=interaction.user,
+            Channels_Scanned=result['channels'],
+            Messages_Scanned=result['scanned'],
+            Deleted=result['deleted']
+        )
+        
+        if result['failed']:
+            embed.add_field(name="Failed", value=str(result['failed']), inline=True)
+        if result['per_channel']:
+            busiest = sorted(result['per_channel'].items(), key=lambda item: item[1]['deleted'], reverse=True)
+            lines = [f"{channel.mention}: {counts['deleted']}" for channel, counts in busiest[:10]]
+            if len(busiest) > 10:
+                lines.append(f"...and {len(busiest) - 10} more")
+            embed.add_field(name="Channels", value="\n".join(lines), inline=False)
+        
+        await traced("rest", interaction.followup.send(embed=embed))
+        await self.log_moderation_action(embed)
+    
     @app_commands.command(name="modinfo", description="Get moderation information about a user")
     @app_commands.describe(user="The user to check")
     async def modinfo(self, interaction: discord.Interaction, user: discord.Member):
         """Get moderation info for a user"""
         try:
-            if not has_mod_permissions(interaction.user):
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
                 await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
                 return
             
-            await interaction.response.defer()
+            await traced("defer", interaction.response.defer())
             
-            warnings = self.db.get_warnings(user.id)
-            mute_record = self.db.get_mute(user.id)
-            ban_record = self.db.get_bans(user.id) if hasattr(self.db, 'get_bans') else None
+            with span("db"):
+                db = self.db.for_guild(interaction.guild.id)
+                warning_count = db.get_warning_count(user.id)
+                recent_warning = db.get_latest_warning(user.id)
+                mute_record = db.get_mute(user.id)
+                ban_record = db.get_ban(user.id)
             
             embed = create_moderation_embed(
                 title="📊 Moderation Info",
@@ -641,12 +1060,11 @@ class ModerationCog(commands.Cog):
                 user=user
             )
             
-            embed.add_field(name="Warnings", value=len(warnings), inline=True)
+            embed.add_field(name="Warnings", value=warning_count, inline=True)
             embed.add_field(name="Currently Muted", value="Yes" if mute_record else "No", inline=True)
             embed.add_field(name="Banned", value="Yes" if ban_record else "No", inline=True)
             
-            if warnings:
-                recent_warning = warnings[-1]
+            if recent_warning:
                 embed.add_field(
                     name="Latest Warning",
                     value=f"**{recent_warning['reason']}**\n<@{recent_warning['moderator_id']}> • <t:{int(datetime.fromisoformat(recent_warning['timestamp']).timestamp())}:R>",
@@ -660,7 +1078,7 @@ class ModerationCog(commands.Cog):
                     inline=False
                 )
             
-            await interaction.followup.send(embed=embed)
+            await traced("rest", interaction.followup.send(embed=embed))
             
         except Exception as e:
             print(f"Error in modinfo command: {e}")
@@ -671,6 +1089,572 @@ class ModerationCog(commands.Cog):
                     await interaction.followup.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
             except:
                 print(f"Could not send error message for modinfo command: {e}")
+    
+    def mass_targets(self, interaction: discord.Interaction, user_ids: List[int], members_only: bool = False) -> Tuple[List[int], Dict[int, str]]:
+        """Split pasted user IDs into those that can be actioned and those skipped with a reason"""
+        targets = []
+        skipped: Dict[int, str] = {}
+        for user_id in user_ids:
+            if user_id in (interaction.user.id, self.bot.user.id):
+                skipped[user_id] = "cannot target yourself or the bot"
+                continue
+            member = interaction.guild.get_member(user_id)
+            if member is None:
+                if members_only:
+                    skipped[user_id] = "not in the server"
+                else:
+                    targets.append(user_id)
+                continue
+            can_mod, error_msg = can_moderate_target(interaction.user, member)
+            if not can_mod:
+                skipped[user_id] = error_msg
+                continue
+            targets.append(user_id)
+        return targets, skipped
+    
+    def mass_summary_embed(
+        self,
+        interaction: discord.Interaction,
+        title: str,
+        action: str,
+        result: Dict,
+        skipped: Dict[int, str],
+        reason: str,
+        **fields
+    ) -> discord.Embed:
+        """One summary embed for a mass action instead of an embed per user"""
+        failed = {**skipped, **result['failed']}
+        embed = create_moderation_embed(
+            title=title,
+            description=f"{action} {len(result['succeeded'])} of {len(result['succeeded']) + len(failed)} user(s).",
+            color="warning" if failed else "success",
+            moderator=interaction.user,
+            reason=reason,
+            Succeeded=len(result['succeeded']),
+            Failed=len(failed),
+            **fields
+        )
+        if failed:
+            lines = [f"`{user_id}`: {error}" for user_id, error in list(failed.items())[:10]]
+            if len(failed) > 10:
+                lines.append(f"...and {len(failed) - 10} more")
+            embed.add_field(name="Not Actioned", value="\n".join(lines)[:1024], inline=False)
+        return embed
+    
+    async def run_mass_action(
+        self,
+        interaction: discord.Interaction,
+        name: str,
+        user_ids: Optional[str],
+        attachment: Optional[discord.Attachment]
+    ) -> Optional[List[int]]:
+        """Shared permission check, defer and ID parsing for the mass commands"""
+        with span("permission"):
+            allowed = has_mod_permissions(interaction.user)
+        if not allowed:
+            await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+            return None
+        
+        await traced("defer", interaction.response.defer())
+        
+        try:
+            ids = await traced("rest", collect_user_ids(user_ids, attachment))
+        except ValueError as e:
+            await interaction.followup.send(f"❌ {e}")
+            return None
+        if not ids:
+            await interaction.followup.send(f"❌ No user IDs found. Paste IDs or attach a text file to {name}.")
+            return None
+        return ids
+    
+    def mass_progress(self, interaction: discord.Interaction, verb: str, unit: str = "users") -> ProgressCallback:
+        """Progress callback that edits the deferred response"""
+        async def report_progress(done: int, total: int):
+            await interaction.edit_original_response(content=f"⏳ {verb}: {done}/{total} {unit}...")
+        return report_progress
+    
+    @app_commands.command(name="massban", description="Ban a list of user IDs")
+    @app_commands.describe(
+        user_ids="User IDs to ban, separated by spaces, commas or new lines",
+        attachment="Text file with user IDs (optional)",
+        reason="Reason for the bans"
+    )
+    async def massban(
+        self,
+        interaction: discord.Interaction,
+        user_ids: Optional[str] = None,
+        attachment: Optional[discord.Attachment] = None,
+        reason: str = "No reason provided"
+    ):
+        """Ban many users at once"""
+        try:
+            ids = await self.run_mass_action(interaction, "/massban", user_ids, attachment)
+            if ids is None:
+                return
+            
+            sanitized_reason = sanitize_reason(reason)
+            # Users that already left can still be banned by ID
+            targets, skipped = self.mass_targets(interaction, ids)
+            result = await traced("rest", bulk_ban(
+                interaction.guild,
+                targets,
+                reason=f"Mass ban by {interaction.user}: {sanitized_reason}",
+                progress=self.mass_progress(interaction, "Banning")
+            ))
+            
+            with span("db"):
+                db = self.db.for_guild(interaction.guild.id)
+                with db.batch():
+                    for user_id in result['succeeded']:
+                        db.add_ban(user_id, interaction.user.id, sanitized_reason)
+            
+            embed = self.mass_summary_embed(interaction, "🚫 Mass Ban", "Banned", result, skipped, sanitized_reason)
+            await traced("rest", interaction.followup.send(embed=embed))
+            await self.log_moderation_action(embed)
+            
+        except discord.Forbidden:
+            await interaction.followup.send("❌ Could not ban users. Check bot permissions.")
+        except Exception as e:
+            print(f"Error in massban command: {e}")
+            try:
+                if not interaction.response.is_done():
+                    await interaction.response.send_message(f"❌ An error occurred: {str(e)}", ephemeral=True)
+                else:
+                    await interaction.followup.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+            except:
+                print(f"Could not send error message for massban command: {e}")
+    
+    @app_commands.command(name="masskick", description="Kick a list of user IDs")
+    @app_commands.describe(
+        user_ids="User IDs to kick, separated by spaces, commas or new lines",
+        attachment="Text file with user IDs (optional)",
+        reason="Reason for the kicks"
+    )
+    async def masskick(
+        self,
+        interaction: discord.Interaction,
+        user_ids: Optional[str] = None,
+        attachment: Optional[discord.Attachment] = None,
+        reason: str = "No reason provided"
+    ):
+        """Kick many users at once"""
+        try:
+            ids = await self.run_mass_action(interaction, "/masskick", user_ids, attachment)
+            if ids is None:
+                return
+            
+            sanitized_reason = sanitize_reason(reason)
+            targets, skipped = self.mass_targets(interaction, ids, members_only=True)
+            audit_reason = f"Mass kick by {interaction.user}: {sanitized_reason}"
+            
+            async def kick(user_id: int):
+                await interaction.guild.kick(discord.Object(id=user_id), reason=audit_reason)
+            
+            result = await traced("rest", run_batch(targets, kick, progress=self.mass_progress(interaction, "Kicking")))
+            
+            with span("db"):
+                db = self.db.for_guild(interaction.guild.id)
+                with db.batch():
+                    for user_id in result['succeeded']:
+                        db.log_kick(user_id, interaction.user.id, sanitized_reason)
+            
+            embed = self.mass_summary_embed(interaction, "👢 Mass Kick", "Kicked", result, skipped, sanitized_reason)
+            await traced("rest", interaction.followup.send(embed=embed))
+            await self.log_moderation_action(embed)
+            
+        except Exception as e:
+            print(f"Error in masskick command: {e}")
+            try:
+                if not interaction.response.is_done():
+                    await interaction.response.send_message(f"❌ An error occurred: {str(e)}", ephemeral=True)
+                else:
+                    await interaction.followup.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+            except:
+                print(f"Could not send error message for masskick command: {e}")
+    
+    @app_commands.command(name="massmute", description="Mute a list of user IDs")
+    @app_commands.describe(
+        duration="Duration (e.g., 5m, 1h, 2d)",
+        user_ids="User IDs to mute, separated by spaces, commas or new lines",
+        attachment="Text file with user IDs (optional)",
+        reason="Reason for the mutes"
+    )
+    async def massmute(
+        self,
+        interaction: discord.Interaction,
+        duration: str,
+        user_ids: Optional[str] = None,
+        attachment: Optional[discord.Attachment] = None,
+        reason: str = "No reason provided"
+    ):
+        """Mute many users at once"""
+        try:
+            duration_seconds = parse_duration(duration)
+            if not duration_seconds:
+                await interaction.response.send_message("❌ Invalid duration format. Use: 5m, 1h, 2d, etc.", ephemeral=True)
+                return
+            
+            ids = await self.run_mass_action(interaction, "/massmute", user_ids, attachment)
+            if ids is None:
+                return
+            
+            sanitized_reason = sanitize_reason(reason)
+            targets, skipped = self.mass_targets(interaction, ids, members_only=True)
+            
+            muted_role = await traced("rest", self.get_or_create_muted_role(interaction.guild, progress=self.mass_progress(interaction, f"Setting up the {self.muted_role_name} role", "channels")))
+            if not muted_role:
+                await interaction.followup.send("❌ Could not create or find muted role.")
+                return
+            audit_reason = f"Mass mute by {interaction.user}: {sanitized_reason}"
+            
+            async def mute(user_id: int):
+                member = interaction.guild.get_member(user_id)
+                if member is None:
+                    raise LookupError("left the server")
+                await member.add_roles(muted_role, reason=audit_reason)
+            
+            result = await traced("rest", run_batch(targets, mute, progress=self.mass_progress(interaction, "Muting")))
+            
+            with span("db"):
+                db = self.db.for_guild(interaction.guild.id)
+                with db.batch():
+                    for user_id in result['succeeded']:
+                        mute_record = db.add_mute(user_id, interaction.user.id, duration_seconds, sanitized_reason, guild_id=interaction.guild.id)
+                        self.mute_scheduler.schedule(interaction.guild.id, user_id, mute_record['expires_at'])
+            
+            embed = self.mass_summary_embed(
+                interaction, "🔇 Mass Mute", "Muted", result, skipped, sanitized_reason,
+                Duration=format_duration(duration_seconds)
+            )
+            await traced("rest", interaction.followup.send(embed=embed))
+            await self.log_moderation_action(embed)
+            
+        except Exception as e:
+            print(f"Error in massmute command: {e}")
+            try:
+                if not interaction.response.is_done():
+                    await interaction.response.send_message(f"❌ An error occurred: {str(e)}", ephemeral=True)
+                else:
+                    await interaction.followup.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+            except:
+                print(f"Could not send error message for massmute command: {e}")
+    
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        """Feed joins to the raid detector and lock the server down when it trips"""
+        if not RAID_DETECTION or member.bot:
+            return
+        guild = member.guild
+        reason = self.raid_detector.record_join(guild.id, member.id, member.name, member.created_at)
+        if reason:
+            self.spawn(self.start_lockdown(guild, reason))
+        elif self.raid_detector.is_locked(guild.id):
+            self.spawn(self.mute_raid_suspects(guild, [member.id]))
+    
+    async def start_lockdown(self, guild: discord.Guild, reason: str):
+        """Raise verification, mute the joins that tripped the detector and alert the log channel"""
+        print(f"🚨 Raid detected in {guild.name}: {reason}")
+        try:
+            if guild.id not in self._lockdown_levels and guild.verification_level < discord.VerificationLevel.high:
+                self._lockdown_levels[guild.id] = guild.verification_level
+                await guild.edit(verification_level=discord.VerificationLevel.high, reason=f"Raid lockdown: {reason}")
+        except discord.HTTPException as e:
+            print(f"Failed to raise verification level in {guild.name}: {e}")
+        
+        muted = await self.mute_raid_suspects(guild, self.raid_detector.window_suspects(guild.id))
+        
+        embed = create_moderation_embed(
+            title="🚨 Raid Lockdown",
+            description=f"Raid detected: {reason}. New members are muted until the lockdown ends.",
+            color="error",
+            moderator=self.bot.user,
+            Verification_Level=str(guild.verification_level),
+            Muted=muted,
+            Ends=f"<t:{int(time.time() + self.raid_detector.lockdown_duration)}:R>"
+        )
+        embed.add_field(name="Next Steps", value="`/raidban` bans the queued suspects, `/endlockdown` lifts the lockdown now.", inline=False)
+        await self.log_moderation_action(embed)
+        
+        task = self._lockdown_tasks.pop(guild.id, None)
+        if task:
+            task.cancel()
+        self._lockdown_tasks[guild.id] = asyncio.create_task(self._end_lockdown_later(guild))
+    
+    async def _end_lockdown_later(self, guild: discord.Guild):
+        await asyncio.sleep(self.raid_detector.lockdown_duration)
+        self._lockdown_tasks.pop(guild.id, None)
+        await self.end_lockdown(guild, "Lockdown expired")
+    
+    async def end_lockdown(self, guild: discord.Guild, reason: str):
+        """Restore the verification level saved when the lockdown started"""
+        self.raid_detector.end_lockdown(guild.id)
+        level = self._lockdown_levels.pop(guild.id, None)
+        if level is not None:
+            try:
+                await guild.edit(verification_level=level, reason=reason)
+            except discord.HTTPException as e:
+                print(f"Failed to restore verification level in {guild.name}: {e}")
+        
+        embed = create_moderation_embed(
+            title="✅ Lockdown Ended",
+            description=reason,
+            color="success",
+            Suspects_Queued=self.raid_detector.status(guild.id)['suspects']
+        )
+        await self.log_moderation_action(embed)
+    
+    async def mute_raid_suspects(self, guild: discord.Guild, user_ids: List[int]) -> int:
+        """Mute raid suspects with the Muted role; returns how many were muted"""
+        if not user_ids:
+            return 0
+        muted_role = await self.get_or_create_muted_role(guild)
+        if not muted_role:
+            return 0
+        
+        async def mute(user_id: int):
+            member = guild.get_member(user_id)
+            if member is None:
+                raise LookupError("left the server")
+            if muted_role not in member.roles:
+                await member.add_roles(muted_role, reason="Raid lockdown")
+        
+        result = await run_batch(user_ids, mute)
+        db = self.db.for_guild(guild.id)
+        with db.batch():
+            for user_id in result['succeeded']:
+                mute_record = db.add_mute(user_id, self.bot.user.id, RAID_MUTE_DURATION, "Raid lockdown", guild_id=guild.id)
+                self.mute_scheduler.schedule(guild.id, user_id, mute_record['expires_at'])
+        return len(result['succeeded'])
+    
+    @app_commands.command(name="raidstatus", description="Show recent join activity and the raid lockdown state")
+    async def raidstatus(self, interaction: discord.Interaction):
+        """Show the raid detector's current window"""
+        with span("permission"):
+            allowed = has_mod_permissions(interaction.user)
+        if not allowed:
+            await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+            return
+        
+        status = self.raid_detector.status(interaction.guild.id)
+        cluster = status['top_name_cluster']
+        embed = create_moderation_embed(
+            title="🛡️ Raid Status",
+            description="🚨 Lockdown active" if status['locked'] else "No lockdown active",
+            color="error" if status['locked'] else "info",
+            Recent_Joins=f"{status['joins']} in {self.raid_detector.window:g}s",
+            Suspects_Queued=status['suspects'],
+            Largest_Name_Cluster=f"{cluster[0]} ({cluster[1]})" if cluster else "None"
+        )
+        embed.add_field(
+            name="Account Age of Recent Joins",
+            value="\n".join(f"{label}: {count}" for label, count in status['age_histogram'].items()),
+            inline=False
+        )
+        if status['locked']:
+            embed.add_field(name="Lockdown Ends", value=f"<t:{int(status['locked_until'])}:R>", inline=True)
+        await traced("rest", interaction.response.send_message(embed=embed))
+    
+    @app_commands.command(name="raidban", description="Ban every member queued as a raid suspect")
+    @app_commands.describe(reason="Reason for the bans")
+    async def raidban(self, interaction: discord.Interaction, reason: str = "Raid"):
+        """Batch ban the queued raid suspects"""
+        try:
+            with span("permission"):
+                allowed = has_mod_permissions(interaction.user)
+            if not allowed:
+                await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+                return
+            
+            await traced("defer", interaction.response.defer())
+            
+            suspects = self.raid_detector.take_suspects(interaction.guild.id)
+            if not suspects:
+                await interaction.followup.send("❌ No raid suspects are queued.")
+                return
+            
+            sanitized_reason = sanitize_reason(reason)
+            targets, skipped = self.mass_targets(interaction, suspects)
+            result = await traced("rest", bulk_ban(
+                interaction.guild,
+                targets,
+                reason=f"Raid ban by {interaction.user}: {sanitized_reason}",
+                progress=self.mass_progress(interaction, "Banning")
+            ))
+            
+            with span("db"):
+                db = self.db.for_guild(interaction.guild.id)
+                with db.batch():
+                    for user_id in result['succeeded']:
+                        db.add_ban(user_id, interaction.user.id, sanitized_reason)
+            
+            embed = self.mass_summary_embed(interaction, "🚫 Raid Ban", "Banned", result, skipped, sanitized_reason)
+            await traced("rest", interaction.followup.send(embed=embed))
+            await self.log_moderation_action(embed)
+            
+        except discord.Forbidden:
+            await interaction.followup.send("❌ Could not ban users. Check bot permissions.")
+        except Exception as e:
+            print(f"Error in raidban command: {e}")
+            try:
+                if not interaction.response.is_done():
+                    await interaction.response.send_message(f"❌ An error occurred: {str(e)}", ephemeral=True)
+                else:
+                    await interaction.followup.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+            except:
+                print(f"Could not send error message for raidban command: {e}")
+    
+    @app_commands.command(name="endlockdown", description="Lift the raid lockdown now")
+    async def endlockdown(self, interaction: discord.Interaction):
+        """End a raid lockdown early"""
+        with span("permission"):
+            allowed = has_mod_permissions(interaction.user)
+        if not allowed:
+            await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+            return
+        
+        if not self.raid_detector.is_locked(interaction.guild.id) and interaction.guild.id not in self._lockdown_levels:
+            await interaction.response.send_message("❌ There is no active lockdown.", ephemeral=True)
+            return
+        
+        await traced("defer", interaction.response.defer())
+        task = self._lockdown_tasks.pop(interaction.guild.id, None)
+        if task:
+            task.cancel()
+        await self.end_lockdown(interaction.guild, f"Lockdown lifted by {interaction.user}")
+        await traced("rest", interaction.followup.send("✅ Lockdown lifted."))
+    
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        """Run every guild message through the AutoMod checks"""
+        if not AUTOMOD_ENABLED or message.guild is None or message.author.bot:
+            return
+        if not isinstance(message.author, discord.Member) or has_mod_permissions(message.author):
+            return
+        mentions = len(message.mentions) + len(message.role_mentions)
+        violation = self.automod.check(message.guild.id, message.author.id, message.content, mentions)
+        if violation:
+            self.spawn(self.handle_automod_violation(message, *violation))
+    
+    async def handle_automod_violation(self, message: discord.Message, rule: str, detail: str):
+        """Delete the message, warn the author and mute repeat offenders"""
+        member = message.author
+        try:
+            await message.delete()
+        except (discord.NotFound, discord.Forbidden):
+            pass
+        except discord.HTTPException as e:
+            print(f"AutoMod failed to delete message {message.id}: {e}")
+        
+        # A spam burst breaks the rules many times over; warn once per cooldown
+        key = (message.guild.id, member.id)
+        now = time.monotonic()
+        if now - self._automod_actioned.get(key, 0.0) < AUTOMOD_ACTION_COOLDOWN:
+            return
+        self._automod_actioned[key] = now
+        if len(self._automod_actioned) > 10000:
+            self._automod_actioned = {k: t for k, t in self._automod_actioned.items() if now - t < AUTOMOD_ACTION_COOLDOWN}
+        
+        reason = f"AutoMod: {detail}"
+        db = self.db.for_guild(message.guild.id)
+        warning = db.add_warning(member.id, self.bot.user.id, reason)
+        warning_count = db.get_warning_count(member.id)
+        
+        embed = create_moderation_embed(
+            title="🤖 AutoMod Warning",
+            description=f"{member.mention} was warned automatically in {message.channel.mention}.",
+            color="warning",
+            user=member,
+            moderator=self.bot.user,
+            reason=reason,
+            Rule=rule,
+            Warning_ID=warning['warning_id'],
+            Total_Warnings=warning_count
+        )
+        await self.log_moderation_action(embed)
+        
+        # Fetched again: the store may have been evicted during the await
+        if warning_count >= AUTOMOD_MUTE_AFTER_WARNINGS and not self.db.for_guild(message.guild.id).get_mute(member.id):
+            await self.automod_mute(member, reason)
+    
+    async def automod_mute(self, member: discord.Member, reason: str):
+        """Mute a member with the Muted role for MUTE_DURATION"""
+        muted_role = await self.get_or_create_muted_role(member.guild)
+        if not muted_role:
+            return
+        try:
+            await member.add_roles(muted_role, reason=reason)
+        except discord.HTTPException as e:
+            print(f"AutoMod failed to mute {member}: {e}")
+            return
+        
+        mute_record = self.db.for_guild(member.guild.id).add_mute(member.id, self.bot.user.id, MUTE_DURATION, reason, guild_id=member.guild.id)
+        self.mute_scheduler.schedule(member.guild.id, member.id, mute_record['expires_at'])
+        
+        embed = create_moderation_embed(
+            title="🔇 User Muted",
+            description=f"{member.mention} has been muted automatically.",
+            color="warning",
+            user=member,
+            moderator=self.bot.user,
+            reason=reason,
+            Duration=format_duration(MUTE_DURATION),
+            Expires=f"<t:{int(datetime.fromisoformat(mute_record['expires_at']).timestamp())}:R>"
+        )
+        await self.log_moderation_action(embed)
+    
+    @app_commands.command(name="addbannedword", description="Add words or phrases to this server's AutoMod filter")
+    @app_commands.describe(words="Comma-separated words or phrases")
+    async def addbannedword(self, interaction: discord.Interaction, words: str):
+        """Add banned terms for this guild"""
+        with span("permission"):
+            allowed = has_mod_permissions(interaction.user)
+        if not allowed:
+            await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+            return
+        
+        terms = [word.strip() for word in words.split(",") if word.strip()]
+        with span("db"):
+            added = self.automod.word_filters.add(interaction.guild.id, terms)
+        if not added:
+            await interaction.response.send_message("❌ Those words are already filtered.", ephemeral=True)
+            return
+        await traced("rest", interaction.response.send_message(f"✅ Added {len(added)} banned word(s).", ephemeral=True))
+    
+    @app_commands.command(name="removebannedword", description="Remove words or phrases from this server's AutoMod filter")
+    @app_commands.describe(words="Comma-separated words or phrases")
+    async def removebannedword(self, interaction: discord.Interaction, words: str):
+        """Remove banned terms for this guild"""
+        with span("permission"):
+            allowed = has_mod_permissions(interaction.user)
+        if not allowed:
+            await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+            return
+        
+        terms = [word.strip() for word in words.split(",") if word.strip()]
+        with span("db"):
+            removed = self.automod.word_filters.remove(interaction.guild.id, terms)
+        if not removed:
+            await interaction.response.send_message("❌ None of those words are filtered in this server.", ephemeral=True)
+            return
+        await traced("rest", interaction.response.send_message(f"✅ Removed {len(removed)} banned word(s).", ephemeral=True))
+    
+    @app_commands.command(name="bannedwords", description="List this server's AutoMod banned words")
+    async def bannedwords(self, interaction: discord.Interaction):
+        """Show the guild's banned terms"""
+        with span("permission"):
+            allowed = has_mod_permissions(interaction.user)
+        if not allowed:
+            await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+            return
+        
+        terms = self.automod.word_filters.terms(interaction.guild.id)
+        if not terms:
+            await interaction.response.send_message("No banned words are set for this server.", ephemeral=True)
+            return
+        listing = ", ".join(f"`{term}`" for term in terms)
+        if len(listing) > 1900:
+            listing = listing[:1900] + "…"
+        await traced("rest", interaction.response.send_message(f"🚫 Banned words ({len(terms)}): {listing}", ephemeral=True))
 
 async def setup(bot):
-    await bot.add_cog(ModerationCog(bot))
+    await bot.add_cog(ModerationCog(bot, getattr(bot, "moderation_db", None)))
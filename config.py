@@ -26,4 +26,105 @@ EMBED_COLORS = {
 
 # Web server (FastAPI) settings
 WEB_HOST = os.getenv('WEB_HOST', '0.0.0.0')
-WEB_PORT = int(os.getenv('WEB_PORT', '8000'))
\ No newline at end of file
+WEB_PORT = int(os.getenv('WEB_PORT', '8000'))
+# Serve the dashboard from this process; launcher.py turns it off for bot workers
+WEB_ENABLED = os.getenv('WEB_ENABLED', 'true').lower() == 'true'
+# 'inline' serves the dashboard on the bot's event loop, 'thread' on its own thread and loop,
+# 'process' in WEB_WORKERS uvicorn processes that get stats and events over IPC_SOCKET
+WEB_MODE = os.getenv('WEB_MODE', 'inline').lower()
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '2'))
+
+# Sharding: run an AutoShardedBot; SHARD_COUNT 0 uses Discord's recommended count
+BOT_SHARDED = os.getenv('BOT_SHARDED', 'false').lower() == 'true'
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+# Shards this process runs (comma-separated); launcher.py sets it for each worker
+SHARD_IDS = [int(s) for s in os.getenv('SHARD_IDS', '').split(',') if s.strip()]
+# Worker processes launcher.py spreads the shards over
+SHARD_PROCESSES = int(os.getenv('SHARD_PROCESSES', '1'))
+# Unix socket bot workers report their stats and change events to
+IPC_SOCKET = os.getenv('IPC_SOCKET', 'moderation_ipc.sock')
+# Seconds between stats reports from a worker with no changes (mutes expire on their own)
+IPC_REPORT_INTERVAL = float(os.getenv('IPC_REPORT_INTERVAL', '5'))
+
+# Moderation data storage
+DB_FILE = os.getenv('DB_FILE', 'moderation_data.json')
+# 'json' rewrites the whole file on every change, 'journal' appends one record per change,
+# 'sqlite' stores everything in an indexed SQLite database (DB_SQLITE_FILE)
+DB_STORAGE_MODE = os.getenv('DB_STORAGE_MODE', 'json').lower()
+# Journal records written before they are compacted into a fresh snapshot
+DB_JOURNAL_COMPACT_EVERY = int(os.getenv('DB_JOURNAL_COMPACT_EVERY', '1000'))
+DB_SQLITE_FILE = os.getenv('DB_SQLITE_FILE', 'moderation_data.db')
+# Seconds between background flushes of moderation data; 0 writes synchronously on every change
+DB_FLUSH_INTERVAL = float(os.getenv('DB_FLUSH_INTERVAL', '1.0'))
+# Keep each guild's moderation data in its own store under DB_GUILD_DIR, loaded on first use
+DB_PARTITION_BY_GUILD = os.getenv('DB_PARTITION_BY_GUILD', 'false').lower() == 'true'
+DB_GUILD_DIR = os.getenv('DB_GUILD_DIR', 'guild_data')
+# Seconds without access before a guild's store is flushed and dropped from memory
+DB_GUILD_IDLE_SECONDS = float(os.getenv('DB_GUILD_IDLE_SECONDS', '900'))
+# Most guild stores held in memory at once; the least recently used are evicted first
+DB_MAX_LOADED_GUILDS = int(os.getenv('DB_MAX_LOADED_GUILDS', '500'))
+
+# Moderation activity history served by /api/timeseries
+TIMESERIES_FILE = os.getenv('TIMESERIES_FILE', 'moderation_activity.json')
+# Seconds between background writes of the activity rollups (0 = write on every action)
+TIMESERIES_FLUSH_INTERVAL = float(os.getenv('TIMESERIES_FLUSH_INTERVAL', '10'))
+# How long per-minute and per-hour buckets are kept; per-day buckets are never dropped
+TIMESERIES_MINUTE_RETENTION_HOURS = float(os.getenv('TIMESERIES_MINUTE_RETENTION_HOURS', '48'))
+TIMESERIES_HOUR_RETENTION_DAYS = float(os.getenv('TIMESERIES_HOUR_RETENTION_DAYS', '90'))
+
+# Channel permission overwrites applied concurrently when setting up the Muted role
+OVERWRITE_CONCURRENCY = int(os.getenv('OVERWRITE_CONCURRENCY', '5'))
+# Seconds a moderation log message waits for more actions to batch with (up to 10 per message)
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '2.0'))
+# Log embeds held while the log channel is unavailable; the oldest are dropped beyond this
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '1000'))
+
+# Dashboard WebSocket fan-out
+WS_SEND_QUEUE_SIZE = int(os.getenv('WS_SEND_QUEUE_SIZE', '100'))  # Messages buffered per client
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', '10'))  # Seconds before a stalled client is dropped
+WS_SLOW_CONSUMER_POLICY = os.getenv('WS_SLOW_CONSUMER_POLICY', 'drop_oldest')  # or 'disconnect'
+WS_STATS_MAX_RATE = float(os.getenv('WS_STATS_MAX_RATE', '2'))  # Stats broadcasts per second at most
+WS_REPLAY_BUFFER = int(os.getenv('WS_REPLAY_BUFFER', '1000'))  # Delta events kept for resuming clients
+
+# /api/stats snapshot cache
+API_STATS_MAX_AGE = float(os.getenv('API_STATS_MAX_AGE', '5'))  # Seconds a snapshot is reused without a change (mute expiries raise no event)
+API_STATS_MAX_WAIT = float(os.getenv('API_STATS_MAX_WAIT', '60'))  # Longest ?wait= long-poll accepted
+
+# Command tracing
+TRACE_SLOW_COMMAND_SECONDS = float(os.getenv('TRACE_SLOW_COMMAND_SECONDS', '2.0'))  # Log a stage breakdown above this; 0 disables
+TRACE_FILE = os.getenv('TRACE_FILE', '')  # Append every command trace to this JSONL file (disabled when empty)
+
+# Bulk purge
+PURGE_MAX_AMOUNT = int(os.getenv('PURGE_MAX_AMOUNT', '5000'))  # Messages one /purge may delete
+PURGE_SCAN_LIMIT = int(os.getenv('PURGE_SCAN_LIMIT', '10000'))  # Messages of history scanned per channel
+PURGE_CHANNEL_CONCURRENCY = int(os.getenv('PURGE_CHANNEL_CONCURRENCY', '5'))  # Channels scanned at once by a guild-wide purge
+PURGE_GUILD_SCAN_LIMIT = int(os.getenv('PURGE_GUILD_SCAN_LIMIT', '1000'))  # Recent messages scanned per channel by a guild-wide purge
+
+# Mass moderation (/massban, /masskick, /massmute)
+MASS_ACTION_MAX_USERS = int(os.getenv('MASS_ACTION_MAX_USERS', '1000'))  # User IDs accepted per command
+MASS_ACTION_CONCURRENCY = int(os.getenv('MASS_ACTION_CONCURRENCY', '5'))  # Kicks/mutes in flight at once
+
+# Raid detection on member joins; opt-in, since a lockdown raises verification and mutes new members
+RAID_DETECTION = os.getenv('RAID_DETECTION', 'false').lower() == 'true'
+RAID_WINDOW_SECONDS = float(os.getenv('RAID_WINDOW_SECONDS', '10'))  # Sliding window for the counters below
+RAID_JOIN_THRESHOLD = int(os.getenv('RAID_JOIN_THRESHOLD', '10'))  # Joins in the window that trigger a lockdown
+RAID_YOUNG_ACCOUNT_AGE = int(os.getenv('RAID_YOUNG_ACCOUNT_AGE', '604800'))  # Seconds; accounts younger than this are "new"
+RAID_YOUNG_THRESHOLD = int(os.getenv('RAID_YOUNG_THRESHOLD', '5'))  # New accounts in the window that trigger a lockdown
+RAID_NAME_CLUSTER_THRESHOLD = int(os.getenv('RAID_NAME_CLUSTER_THRESHOLD', '4'))  # Similar names in the window that trigger a lockdown
+RAID_LOCKDOWN_DURATION = int(os.getenv('RAID_LOCKDOWN_DURATION', '900'))  # Seconds before a lockdown lifts by itself
+RAID_MUTE_DURATION = int(os.getenv('RAID_MUTE_DURATION', '3600'))  # Seconds suspects joining during a lockdown stay muted
+
+# AutoMod (on_message spam filter); opt-in, since it deletes messages and issues warnings that count toward MAX_WARNINGS
+AUTOMOD_ENABLED = os.getenv('AUTOMOD_ENABLED', 'false').lower() == 'true'
+AUTOMOD_RATE_PER_SECOND = float(os.getenv('AUTOMOD_RATE_PER_SECOND', '1'))  # Sustained messages per second per user
+AUTOMOD_RATE_BURST = int(os.getenv('AUTOMOD_RATE_BURST', '5'))  # Messages a user may send in a burst
+AUTOMOD_DUPLICATE_WINDOW = float(os.getenv('AUTOMOD_DUPLICATE_WINDOW', '30'))  # Seconds duplicate messages are remembered
+AUTOMOD_DUPLICATE_THRESHOLD = int(os.getenv('AUTOMOD_DUPLICATE_THRESHOLD', '3'))  # Identical messages in the window that count as spam
+AUTOMOD_MAX_MENTIONS = int(os.getenv('AUTOMOD_MAX_MENTIONS', '5'))  # User/role mentions allowed in one message
+AUTOMOD_BLOCK_INVITES = os.getenv('AUTOMOD_BLOCK_INVITES', 'true').lower() == 'true'
+AUTOMOD_BLOCK_LINKS = os.getenv('AUTOMOD_BLOCK_LINKS', 'false').lower() == 'true'
+AUTOMOD_ALLOWED_DOMAINS = [d.strip().lower() for d in os.getenv('AUTOMOD_ALLOWED_DOMAINS', '').split(',') if d.strip()]
+AUTOMOD_BANNED_WORDS = [w.strip() for w in os.getenv('AUTOMOD_BANNED_WORDS', '').split(',') if w.strip()]  # Banned in every guild
+AUTOMOD_WORDS_FILE = os.getenv('AUTOMOD_WORDS_FILE', 'automod_words.json')  # Per-guild banned words added with /addbannedword
+AUTOMOD_ACTION_COOLDOWN = float(os.getenv('AUTOMOD_ACTION_COOLDOWN', '10'))  # Seconds between AutoMod warnings for one user
+AUTOMOD_MUTE_AFTER_WARNINGS = int(os.getenv('AUTOMOD_MUTE_AFTER_WARNINGS', '2'))  # Warnings after which AutoMod also mutes (MUTE_DURATION)
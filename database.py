@@ -1,90 +1,408 @@
+import atexit
+import heapq
 import json
 import os
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Optional, Callable
 from datetime import datetime, timedelta
 
+from config import DB_FILE, DB_STORAGE_MODE, DB_JOURNAL_COMPACT_EVERY, DB_FLUSH_INTERVAL, DB_PARTITION_BY_GUILD
+from metrics import db_file_size, db_flush_duration
+
+# Change event emitted to event listeners for each kind of mutation
+EVENT_TYPES = {
+    'add_warning': 'warning_added',
+    'clear_warnings': 'warnings_cleared',
+    'add_mute': 'mute_added',
+    'remove_mute': 'mute_removed',
+    'add_ban': 'ban_added',
+    'remove_ban': 'ban_removed',
+    'log_kick': 'kick_logged'
+}
+
+def make_event(op: str, user_id, entry: Optional[Dict] = None) -> Dict:
+    """Build the change event that event listeners receive for a mutation"""
+    entry = entry or {}
+    event_type = EVENT_TYPES[op]
+    if op == 'remove_mute' and entry.get('expired'):
+        event_type = 'mute_expired'
+    return {
+        'type': event_type,
+        'user_id': int(user_id if user_id is not None else entry['user_id']),
+        'moderator_id': entry.get('moderator_id'),
+        'timestamp': entry.get('timestamp') or datetime.now().isoformat()
+    }
+
+class BackgroundWriter:
+    """Daemon thread that periodically calls a flush function off the event loop"""
+    def __init__(self, flush: Callable, interval: float, name: str = "moderation-db-writer"):
+        self._flush = flush
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self._flush()
+            except Exception as e:
+                print(f"Error flushing moderation data: {e}")
+    
+    def stop(self):
+        """Stop the writer thread after its current flush"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+class ActiveMuteTracker:
+    """Counts unexpired mutes using a min-heap keyed by expiry time"""
+    def __init__(self):
+        self._heap: List[tuple] = []
+        # user_id -> expiry timestamp of the mute currently counted as active
+        self._expiry: Dict[str, float] = {}
+    
+    def track(self, user_id: str, expires_at: str):
+        """Start counting a mute, replacing any previous mute for the user"""
+        try:
+            expiry = datetime.fromisoformat(expires_at).timestamp()
+        except (TypeError, ValueError):
+            return
+        self._expiry[user_id] = expiry
+        heapq.heappush(self._heap, (expiry, user_id))
+    
+    def untrack(self, user_id: str):
+        """Stop counting a user's mute; its heap entry is discarded lazily"""
+        self._expiry.pop(user_id, None)
+    
+    def count(self) -> int:
+        """Number of mutes that have not expired yet"""
+        now = datetime.now().timestamp()
+        while self._heap and self._heap[0][0] <= now:
+            expiry, user_id = heapq.heappop(self._heap)
+            # Skip entries superseded by a newer mute or an unmute
+            if self._expiry.get(user_id) == expiry:
+                del self._expiry[user_id]
+        return len(self._expiry)
+
 class ModerationDB:
-    def __init__(self, db_file: str = "moderation_data.json"):
+    def __init__(
+        self,
+        db_file: str = DB_FILE,
+        storage_mode: str = DB_STORAGE_MODE,
+        compact_every: int = DB_JOURNAL_COMPACT_EVERY,
+        flush_interval: float = DB_FLUSH_INTERVAL,
+        autoflush: bool = True,
+        read_only: bool = False
+    ):
         self.db_file = db_file
+        # Never write the data file or its journal (e.g. when importing from it)
+        self.read_only = read_only
+        self.storage_mode = storage_mode if storage_mode in ("json", "journal") else "json"
+        self.journal_file = f"{db_file}.journal"
+        self.compact_every = max(1, compact_every)
+        self._journal_seq = 0
+        self._journal_records = 0
+        # _lock guards self.data and the pending records, _io_lock keeps flushes in order
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()
+        self._pending: List[Dict] = []
+        self._batch_depth = 0
+        # Without a writer thread, write every change immediately unless the owner
+        # flushes (GuildPartitionedDB flushes all guild stores from one thread)
+        self._autoflush = autoflush
+        # Running totals kept up to date by _apply so stats never rescan history
+        self._counts: Dict[str, int] = {}
+        self._active_mutes = ActiveMuteTracker()
         self.data = self.load_data()
         self.on_data_change_callbacks: List[Callable] = []
+        self.event_listeners: List[Callable[[Dict], None]] = []
+        
+        # Mutations only touch memory; a background thread writes them out in batches
+        self._writer = None
+        if flush_interval > 0:
+            self._writer = BackgroundWriter(self.flush, flush_interval)
+            atexit.register(self.close)
     
     def add_data_change_callback(self, callback: Callable):
         """Add a callback to be called when data changes"""
         self.on_data_change_callbacks.append(callback)
     
-    def notify_data_change(self):
+    def add_event_listener(self, listener: Callable[[Dict], None]):
+        """Add a listener that receives a change event for every mutation"""
+        self.event_listeners.append(listener)
+    
+    def notify_data_change(self, event: Optional[Dict] = None):
         """Notify all callbacks that data has changed"""
         for callback in self.on_data_change_callbacks:
             try:
                 callback()
             except Exception as e:
                 print(f"Error in data change callback: {e}")
+        if event is None:
+            return
+        for listener in self.event_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Error in change event listener: {e}")
     
     def load_data(self) -> Dict:
-        """Load data from JSON file"""
+        """Load data from JSON file, replaying the journal in journal mode"""
+        data = None
         if os.path.exists(self.db_file):
             try:
                 with open(self.db_file, 'r') as f:
-                    return json.load(f)
+                    data = json.load(f)
             except (json.JSONDecodeError, FileNotFoundError):
                 pass
-        return {
-            'warnings': {},
-            'mutes': {},
-            'bans': {},
-            'kick_log': []
+        if data is None:
+            data = {
+                'warnings': {},
+                'mutes': {},
+                'bans': {},
+                'kick_log': []
+            }
+        
+        self._journal_seq = data.get('journal_seq', 0)
+        self._rebuild_counts(data)
+        # Replayed in every mode, so switching from journal to json keeps the records
+        # written since the last compaction
+        if self._replay_journal(data) and not self.read_only:
+            self.data = data
+            self._compact()
+            if self.storage_mode != "journal":
+                os.remove(self.journal_file)
+        return data
+    
+    def _rebuild_counts(self, data: Dict):
+        """Recompute the running totals from a freshly loaded snapshot"""
+        warnings = data.get('warnings', {})
+        self._counts = {
+            'total_warnings': sum(len(warns) for warns in warnings.values()),
+            'total_users_warned': len(warnings),
+            'total_bans': len(data.get('bans', {})),
+            'total_kicks': len(data.get('kick_log', []))
         }
+        self._active_mutes = ActiveMuteTracker()
+        for user_id, mute in data.get('mutes', {}).items():
+            self._active_mutes.track(user_id, mute.get('expires_at'))
+    
+    def _replay_journal(self, data: Dict) -> int:
+        """Apply journal records written after the last snapshot; returns how many were applied"""
+        applied = 0
+        if not os.path.exists(self.journal_file):
+            return applied
+        
+        with open(self.journal_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write; everything before it is intact
+                    print(f"Skipping corrupt journal record in {self.journal_file}")
+                    continue
+                self._journal_records += 1
+                if record.get('seq', 0) <= self._journal_seq:
+                    continue
+                self._apply(data, record)
+                self._journal_seq = record['seq']
+                applied += 1
+        return applied
     
     def save_data(self):
         """Save data to JSON file"""
-        with open(self.db_file, 'w') as f:
-            json.dump(self.data, f, indent=2, default=str)
+        if self.read_only:
+            return
+        with self._io_lock:
+            with self._lock:
+                self._pending = []
+            with db_flush_duration.time(backend=self.storage_mode):
+                if self.storage_mode == "journal":
+                    self._compact()
+                else:
+                    self._write_snapshot()
+            if self._autoflush:
+                self._record_file_sizes()
         # Notify that data has changed
         self.notify_data_change()
     
-    def get_moderation_stats(self) -> Dict[str, any]:
-        """Get current moderation statistics"""
-        warnings = self.data.get('warnings', {})
-        mutes = self.data.get('mutes', {})
-        bans = self.data.get('bans', {})
-        kicks = self.data.get('kick_log', [])
+    def flush(self):
+        """Write out every mutation made since the last flush"""
+        with self._io_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+            if records and not self.read_only:
+                with db_flush_duration.time(backend=self.storage_mode):
+                    self._persist(records)
+                if self._autoflush:
+                    self._record_file_sizes()
+    
+    def close(self):
+        """Stop the background writer and flush anything still pending"""
+        if self._writer:
+            self._writer.stop()
+            self._writer = None
+        self.flush()
+    
+    def _record_file_sizes(self):
+        """Export the on-disk size of the snapshot (and journal) files"""
+        files = [self.db_file]
+        if self.storage_mode == "journal":
+            files.append(self.journal_file)
+        for path in files:
+            try:
+                db_file_size.set(os.path.getsize(path), file=os.path.basename(path))
+            except OSError:
+                pass
+    
+    def _persist(self, records: List[Dict]):
+        """Write a batch of mutation records with the configured storage mode"""
+        if self.storage_mode == "journal":
+            self._append_journal(records)
+        else:
+            # Any number of mutations collapse into a single snapshot rewrite
+            self._write_snapshot()
+    
+    def _write_snapshot(self):
+        """Atomically write the full data set to the snapshot file"""
+        with self._lock:
+            self.data['journal_seq'] = self._journal_seq
+            payload = json.dumps(self.data, indent=2, default=str)
+        tmp_file = f"{self.db_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_file, self.db_file)
+    
+    def compact(self):
+        """Fold the journal into a fresh snapshot and truncate it"""
+        if self.read_only:
+            return
+        with self._io_lock:
+            self._compact()
+    
+    def _compact(self):
+        self._write_snapshot()
+        # The snapshot records the last applied seq, so a crash before the
+        # truncate only leaves records that replay will skip
+        with open(self.journal_file, 'w'):
+            pass
+        self._journal_records = 0
+    
+    def _append_journal(self, records: List[Dict]):
+        """Append mutation records to the journal"""
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in records)
+        with open(self.journal_file, 'a') as f:
+            f.write(lines)
+        self._journal_records += len(records)
+        if self._journal_records >= self.compact_every:
+            self._compact()
+    
+    def _apply(self, data: Dict, record: Dict):
+        """Apply a mutation record to the in-memory data"""
+        op = record['op']
+        user_id = record.get('user_id')
+        entry = record.get('entry')
         
-        # Count active mutes (not expired)
-        active_mutes = 0
-        for mute in mutes.values():
-            if 'expires_at' in mute:
-                try:
-                    expires_at = datetime.fromisoformat(mute['expires_at'])
-                    if expires_at > datetime.now():
-                        active_mutes += 1
-                except:
-                    pass
+        counts = self._counts
         
-        return {
-            'total_warnings': sum(len(warns) for warns in warnings.values()),
-            'total_users_warned': len(warnings),
-            'active_mutes': active_mutes,
-            'total_bans': len(bans),
-            'total_kicks': len(kicks),
-            'timestamp': datetime.now().isoformat()
-        }
+        if op == 'add_warning':
+            if user_id not in data['warnings']:
+                counts['total_users_warned'] += 1
+            data['warnings'].setdefault(user_id, []).append(entry)
+            counts['total_warnings'] += 1
+        elif op == 'clear_warnings':
+            cleared = data['warnings'].pop(user_id, None)
+            if cleared is not None:
+                counts['total_warnings'] -= len(cleared)
+                counts['total_users_warned'] -= 1
+        elif op == 'add_mute':
+            data['mutes'][user_id] = entry
+            self._active_mutes.track(user_id, entry.get('expires_at'))
+        elif op == 'remove_mute':
+            data['mutes'].pop(user_id, None)
+            self._active_mutes.untrack(user_id)
+        elif op == 'add_ban':
+            if user_id not in data['bans']:
+                counts['total_bans'] += 1
+            data['bans'][user_id] = entry
+        elif op == 'remove_ban':
+            if data['bans'].pop(user_id, None) is not None:
+                counts['total_bans'] -= 1
+        elif op == 'log_kick':
+            data['kick_log'].append(entry)
+            counts['total_kicks'] += 1
+        else:
+            print(f"Unknown moderation record op: {op}")
+    
+    def _commit(self, op: str, user_id: Optional[str] = None, entry: Optional[Dict] = None):
+        """Apply a mutation in memory and queue it for the writer"""
+        with self._lock:
+            self._journal_seq += 1
+            record = {'seq': self._journal_seq, 'op': op}
+            if user_id is not None:
+                record['user_id'] = user_id
+            if entry is not None:
+                record['entry'] = entry
+            
+            self._apply(self.data, record)
+            self._pending.append(record)
+        
+        if self._writer is None and self._autoflush and not self._batch_depth:
+            self.flush()
+        self.notify_data_change(make_event(op, user_id, entry))
+    
+    @contextmanager
+    def batch(self):
+        """Group many mutations into a single write"""
+        # Holding the lock keeps the background writer from flushing half a batch
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+        if self._writer is None and self._autoflush and not self._batch_depth:
+            self.flush()
+    
+    def for_guild(self, guild_id: Optional[int]) -> "ModerationDB":
+        """Store holding a guild's records; this store shares one data set across guilds"""
+        return self
+    
+    @contextmanager
+    def pinned(self, guild_id: Optional[int]):
+        """Hold a guild's store for the whole block; this store is never unloaded"""
+        yield self
+    
+    def get_moderation_stats(self) -> Dict[str, any]:
+        """Get current moderation statistics"""
+        with self._lock:
+            return {
+                'total_warnings': self._counts['total_warnings'],
+                'total_users_warned': self._counts['total_users_warned'],
+                'active_mutes': self._active_mutes.count(),
+                'total_bans': self._counts['total_bans'],
+                'total_kicks': self._counts['total_kicks'],
+                'timestamp': datetime.now().isoformat()
+            }
     
     def add_warning(self, user_id: int, moderator_id: int, reason: str):
         """Add a warning for a user"""
         user_id = str(user_id)
-        if user_id not in self.data['warnings']:
-            self.data['warnings'][user_id] = []
         
         warning = {
             'reason': reason,
             'moderator_id': moderator_id,
             'timestamp': datetime.now().isoformat(),
-            'warning_id': len(self.data['warnings'][user_id]) + 1
+            'warning_id': len(self.data['warnings'].get(user_id, [])) + 1
         }
         
-        self.data['warnings'][user_id].append(warning)
-        self.save_data()
+        self._commit('add_warning', user_id, warning)
         return warning
     
     def get_warnings(self, user_id: int) -> List[Dict]:
@@ -92,14 +410,26 @@ class ModerationDB:
         user_id = str(user_id)
         return self.data['warnings'].get(user_id, [])
     
+    def get_warning_count(self, user_id: int) -> int:
+        """Get the number of warnings for a user"""
+        return len(self.get_warnings(user_id))
+    
+    def get_latest_warning(self, user_id: int) -> Optional[Dict]:
+        """Get the most recent warning for a user"""
+        warnings = self.get_warnings(user_id)
+        return warnings[-1] if warnings else None
+    
+    def get_warnings_page(self, user_id: int, offset: int, limit: int) -> List[Dict]:
+        """Get one page of a user's warnings, oldest first"""
+        return self.get_warnings(user_id)[offset:offset + limit]
+    
     def clear_warnings(self, user_id: int):
         """Clear all warnings for a user"""
         user_id = str(user_id)
         if user_id in self.data['warnings']:
-            del self.data['warnings'][user_id]
-            self.save_data()
+            self._commit('clear_warnings', user_id)
     
-    def add_mute(self, user_id: int, moderator_id: int, duration: int, reason: str):
+    def add_mute(self, user_id: int, moderator_id: int, duration: int, reason: str, guild_id: Optional[int] = None):
         """Add a mute record"""
         user_id = str(user_id)
         mute = {
@@ -107,25 +437,29 @@ class ModerationDB:
             'duration': duration,
             'reason': reason,
             'timestamp': datetime.now().isoformat(),
-            'expires_at': (datetime.now() + timedelta(seconds=duration)).isoformat()
+            'expires_at': (datetime.now() + timedelta(seconds=duration)).isoformat(),
+            'guild_id': guild_id
         }
         
-        self.data['mutes'][user_id] = mute
-        self.save_data()
+        self._commit('add_mute', user_id, mute)
         return mute
     
-    def remove_mute(self, user_id: int):
+    def remove_mute(self, user_id: int, expired: bool = False):
         """Remove a mute record"""
         user_id = str(user_id)
         if user_id in self.data['mutes']:
-            del self.data['mutes'][user_id]
-            self.save_data()
+            self._commit('remove_mute', user_id, {'expired': True} if expired else None)
     
     def get_mute(self, user_id: int) -> Optional[Dict]:
         """Get mute record for a user"""
         user_id = str(user_id)
         return self.data['mutes'].get(user_id)
     
+    def get_all_mutes(self) -> List[Dict]:
+        """Get every stored mute record, including its user_id"""
+        with self._lock:
+            return [dict(mute, user_id=int(user_id)) for user_id, mute in self.data['mutes'].items()]
+    
     def add_ban(self, user_id: int, moderator_id: int, reason: str):
         """Add a ban record"""
         user_id = str(user_id)
@@ -135,16 +469,19 @@ class ModerationDB:
             'timestamp': datetime.now().isoformat()
         }
         
-        self.data['bans'][user_id] = ban
-        self.save_data()
+        self._commit('add_ban', user_id, ban)
         return ban
     
     def remove_ban(self, user_id: int):
         """Remove a ban record"""
         user_id = str(user_id)
         if user_id in self.data['bans']:
-            del self.data['bans'][user_id]
-            self.save_data()
+            self._commit('remove_ban', user_id)
+    
+    def get_ban(self, user_id: int) -> Optional[Dict]:
+        """Get ban record for a user"""
+        user_id = str(user_id)
+        return self.data['bans'].get(user_id)
     
     def log_kick(self, user_id: int, moderator_id: int, reason: str):
         """Log a kick action"""
@@ -155,6 +492,28 @@ class ModerationDB:
             'timestamp': datetime.now().isoformat()
         }
         
-        self.data['kick_log'].append(kick_log)
-        self.save_data()
+        self._commit('log_kick', entry=kick_log)
         return kick_log
+    
+    def iter_actions(self) -> List[Dict]:
+        """Change events for every stored warning, mute, ban and kick (to backfill activity rollups)"""
+        with self._lock:
+            events = [
+                make_event('add_warning', user_id, warning)
+                for user_id, warnings in self.data['warnings'].items()
+                for warning in warnings
+            ]
+            events.extend(make_event('add_mute', user_id, mute) for user_id, mute in self.data['mutes'].items())
+            events.extend(make_event('add_ban', user_id, ban) for user_id, ban in self.data['bans'].items())
+            events.extend(make_event('log_kick', None, kick) for kick in self.data['kick_log'])
+        return events
+
+def create_database(storage_mode: str = DB_STORAGE_MODE):
+    """Create the moderation store for the configured storage mode"""
+    if DB_PARTITION_BY_GUILD:
+        from database_guilds import GuildPartitionedDB
+        return GuildPartitionedDB(storage_mode=storage_mode)
+    if storage_mode == "sqlite":
+        from database_sqlite import SQLiteModerationDB
+        return SQLiteModerationDB()
+    return ModerationDB(storage_mode=storage_mode)
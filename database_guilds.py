@@ -0,0 +1,410 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Set, Union
+
+from config import (
+    DB_GUILD_DIR, DB_STORAGE_MODE, DB_FLUSH_INTERVAL, DB_GUILD_IDLE_SECONDS, DB_MAX_LOADED_GUILDS,
+    SHARD_IDS, SHARD_COUNT
+)
+from database import ActiveMuteTracker, BackgroundWriter, ModerationDB
+from database_sqlite import SQLiteModerationDB
+from metrics import db_file_size, loaded_guild_stores
+from sharding import shard_owner
+
+GuildStore = Union[ModerationDB, SQLiteModerationDB]
+
+COUNT_KEYS = ('total_warnings', 'total_users_warned', 'total_bans', 'total_kicks')
+MUTE_EVENTS = ('mute_added', 'mute_removed', 'mute_expired')
+# Stores used this recently are never evicted; code that holds a store
+# across an await should pin it (see GuildPartitionedDB.pinned) instead
+MIN_RESIDENCY = 60.0
+# Index journal records kept before folding them into the index file; at
+# least one per known guild, so each fold pays for that many cheap appends
+INDEX_COMPACT_MIN = 100
+
+class GuildPartitionedDB:
+    """Moderation data split into one lazily loaded store per guild"""
+    # Change events carry the guild they happened in
+    partitioned = True
+    
+    def __init__(
+        self,
+        data_dir: str = DB_GUILD_DIR,
+        storage_mode: str = DB_STORAGE_MODE,
+        flush_interval: float = DB_FLUSH_INTERVAL,
+        idle_seconds: float = DB_GUILD_IDLE_SECONDS,
+        max_loaded: int = DB_MAX_LOADED_GUILDS,
+        shard_ids: Optional[List[int]] = SHARD_IDS,
+        shard_count: int = SHARD_COUNT
+    ):
+        self.data_dir = data_dir
+        self.storage_mode = storage_mode
+        self.idle_seconds = idle_seconds
+        self.max_loaded = max(1, max_loaded)
+        # Bot workers only see the guilds on their own shards (see launcher.py);
+        # each keeps its own index, named after its shard range
+        self.owns = shard_owner(shard_ids, shard_count)
+        index_name = "index.json"
+        if self.owns:
+            index_name = f"index.{shard_count}.{min(shard_ids)}-{max(shard_ids)}.json"
+        self.index_file = os.path.join(data_dir, index_name)
+        self.index_journal_file = f"{self.index_file}.journal"
+        self._index_journal_records = 0
+        os.makedirs(data_dir, exist_ok=True)
+        
+        self._lock = threading.RLock()
+        # Serializes index file writes; taken before _lock, never inside it
+        self._index_io_lock = threading.Lock()
+        # guild_id -> loaded store, least recently used first
+        self._guilds: "OrderedDict[int, GuildStore]" = OrderedDict()
+        self._last_used: Dict[int, float] = {}
+        # guild_id -> number of holders that have pinned its store
+        self._pins: Dict[int, int] = {}
+        # Totals and mute expiries of every guild, loaded or not, so stats and the
+        # unmute schedule never have to open a guild's store
+        self._index: Dict[int, Dict] = {}
+        self._totals: Dict[str, int] = dict.fromkeys(COUNT_KEYS, 0)
+        self._active_mutes = ActiveMuteTracker()
+        self._index_dirty = False
+        # Guilds whose file stamp must be taken at the next index save
+        self._unstamped: Set[int] = set()
+        self.on_data_change_callbacks: List[Callable] = []
+        self.event_listeners: List[Callable[[Dict], None]] = []
+        self._writer = None
+        self._load_index()
+        loaded_guild_stores.set_function(lambda: len(self._guilds))
+        
+        # One writer thread flushes every loaded guild and evicts idle ones
+        if flush_interval > 0:
+            self._writer = BackgroundWriter(self.flush, flush_interval, name="moderation-guild-writer")
+            atexit.register(self.close)
+    
+    def add_data_change_callback(self, callback: Callable):
+        """Add a callback to be called when data changes"""
+        self.on_data_change_callbacks.append(callback)
+    
+    def add_event_listener(self, listener: Callable[[Dict], None]):
+        """Add a listener that receives a change event for every mutation"""
+        self.event_listeners.append(listener)
+    
+    def notify_data_change(self, event: Optional[Dict] = None):
+        """Notify all callbacks that data has changed"""
+        for callback in self.on_data_change_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in data change callback: {e}")
+        if event is None:
+            return
+        for listener in self.event_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Error in change event listener: {e}")
+    
+    def _load_index(self):
+        """Read the per-guild totals written by the last run, then reopen guilds changed since"""
+        index = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error loading guild index {self.index_file}: {e}")
+        for guild_id, entry in index.items():
+            self._set_entry(int(guild_id), entry)
+        if self._replay_index_journal():
+            self._index_dirty = True
+        self._reconcile_index()
+        self._save_index()
+    
+    def _replay_index_journal(self) -> int:
+        """Apply guild entries appended since the index was last written; returns how many"""
+        applied = 0
+        if not os.path.exists(self.index_journal_file):
+            return applied
+        with open(self.index_journal_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write; everything before it is intact
+                    print(f"Skipping corrupt index journal record in {self.index_journal_file}")
+                    continue
+                self._set_entry(int(record['guild_id']), record['entry'])
+                applied += 1
+        return applied
+    
+    def _reconcile_index(self):
+        """Open guild stores whose files don't match their index entry (a crash, a missing index or a reshard)"""
+        guild_ids = set()
+        for name in os.listdir(self.data_dir):
+            prefix = name.split(".", 1)[0]
+            if prefix.isdigit():
+                guild_ids.add(int(prefix))
+        stale = [
+            guild_id for guild_id in guild_ids
+            if (self.owns is None or self.owns(guild_id))
+            and self._index.get(guild_id, {}).get('stamp') != self._file_stamp(guild_id)
+        ]
+        if not stale:
+            return
+        print(f"🔄 Refreshing guild index {self.index_file} for {len(stale)} guild(s)")
+        for guild_id in stale:
+            store = self._open(guild_id)
+            store.close()
+    
+    def _file_stamp(self, guild_id: int) -> List[int]:
+        """Latest modification time and total size of a guild's files"""
+        path = os.path.join(self.data_dir, str(guild_id))
+        if self.storage_mode == "sqlite":
+            paths = (f"{path}.db", f"{path}.db-wal")
+        else:
+            paths = (f"{path}.json", f"{path}.json.journal")
+        mtime = size = 0
+        for file_path in paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            mtime = max(mtime, stat.st_mtime_ns)
+            size += stat.st_size
+        return [mtime, size]
+    
+    def _save_index(self):
+        """Write the whole index and fold the index journal into it"""
+        with self._index_io_lock:
+            with self._lock:
+                if not self._index_dirty:
+                    return
+                # Taken after the guild's files were written, so a later load can tell they changed since
+                for guild_id in self._unstamped:
+                    if guild_id in self._index:
+                        self._index[guild_id]['stamp'] = self._file_stamp(guild_id)
+                self._unstamped.clear()
+                payload = json.dumps({str(guild_id): entry for guild_id, entry in self._index.items()})
+                self._index_dirty = False
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_file, self.index_file)
+            # Every journaled entry is in the file now; replaying one again would be harmless
+            with open(self.index_journal_file, 'w'):
+                pass
+            self._index_journal_records = 0
+        db_file_size.set(os.path.getsize(self.index_file), file=os.path.basename(self.index_file))
+    
+    def _append_index(self, guild_id: int):
+        """Append one guild's index entry to the index journal"""
+        with self._index_io_lock:
+            with self._lock:
+                entry = self._index.get(guild_id)
+                if entry is None:
+                    return
+                # The store already wrote its change, so its files are current
+                entry['stamp'] = self._file_stamp(guild_id)
+                line = json.dumps({'guild_id': guild_id, 'entry': entry}) + "\n"
+            with open(self.index_journal_file, 'a') as f:
+                f.write(line)
+            self._index_journal_records += 1
+            compact = self._index_journal_records >= max(INDEX_COMPACT_MIN, len(self._index))
+        if compact:
+            self._save_index()
+    
+    def _set_entry(self, guild_id: int, entry: Dict):
+        """Replace a guild's index entry, keeping the cross-guild totals in step"""
+        old = self._index.get(guild_id, {})
+        old_mutes = old.get('mutes', {})
+        mutes = entry.get('mutes', {})
+        for key in COUNT_KEYS:
+            self._totals[key] += entry.get(key, 0) - old.get(key, 0)
+        for user_id in old_mutes.keys() - mutes.keys():
+            self._active_mutes.untrack(f"{guild_id}:{user_id}")
+        for user_id, expires_at in mutes.items():
+            if old_mutes.get(user_id) != expires_at:
+                self._active_mutes.track(f"{guild_id}:{user_id}", expires_at)
+        self._index[guild_id] = entry
+    
+    def _refresh(self, guild_id: int, store: GuildStore, mutes: bool = True):
+        """Copy a loaded guild's running totals (and mutes) into the index"""
+        stats = store.get_moderation_stats()
+        entry = {key: stats[key] for key in COUNT_KEYS}
+        if mutes:
+            entry['mutes'] = {str(mute['user_id']): mute['expires_at'] for mute in store.get_all_mutes()}
+        else:
+            entry['mutes'] = self._index.get(guild_id, {}).get('mutes', {})
+        self._set_entry(guild_id, entry)
+        self._index_dirty = True
+        self._unstamped.add(guild_id)
+    
+    def _open(self, guild_id: int) -> GuildStore:
+        """Load a guild's store from its own file"""
+        path = os.path.join(self.data_dir, str(guild_id))
+        # Without a writer thread each store writes its own changes synchronously
+        autoflush = self._writer is None
+        if self.storage_mode == "sqlite":
+            store = SQLiteModerationDB(f"{path}.db", flush_interval=0, autoflush=autoflush)
+        else:
+            store = ModerationDB(f"{path}.json", storage_mode=self.storage_mode, flush_interval=0, autoflush=autoflush)
+        store.add_event_listener(lambda event: self._guild_changed(guild_id, store, event))
+        self._refresh(guild_id, store)
+        return store
+    
+    def _guild_changed(self, guild_id: int, store: GuildStore, event: Dict):
+        with self._lock:
+            self._refresh(guild_id, store, mutes=event['type'] in MUTE_EVENTS)
+        if self._writer is None:
+            # The store already wrote this change; keep the index (and its mutes) in step
+            # by journaling just this guild's entry
+            self._append_index(guild_id)
+        self.notify_data_change(dict(event, guild_id=guild_id))
+    
+    def for_guild(self, guild_id: Optional[int]) -> GuildStore:
+        """Store holding a guild's records, loaded on first use"""
+        # Records without a guild (e.g. DMs) share store 0
+        guild_id = int(guild_id or 0)
+        with self._lock:
+            store = self._guilds.get(guild_id)
+            opened = store is None
+            if opened:
+                store = self._guilds[guild_id] = self._open(guild_id)
+            else:
+                self._guilds.move_to_end(guild_id)
+            self._last_used[guild_id] = time.monotonic()
+            if opened and self._writer is None:
+                self._evict()
+            return store
+    
+    @contextmanager
+    def pinned(self, guild_id: Optional[int]):
+        """Hold a guild's store loaded for the whole block, e.g. across awaits"""
+        guild_id = int(guild_id or 0)
+        with self._lock:
+            # Pinned first, so loading it can't evict it straight away
+            self._pins[guild_id] = self._pins.get(guild_id, 0) + 1
+            try:
+                store = self.for_guild(guild_id)
+            except Exception:
+                self._unpin(guild_id)
+                raise
+        try:
+            yield store
+        finally:
+            with self._lock:
+                self._unpin(guild_id)
+    
+    def _unpin(self, guild_id: int):
+        self._pins[guild_id] -= 1
+        if not self._pins[guild_id]:
+            del self._pins[guild_id]
+        self._last_used[guild_id] = time.monotonic()
+    
+    def loaded_guilds(self) -> List[int]:
+        with self._lock:
+            return list(self._guilds)
+    
+    def _evict(self):
+        """Close idle guilds, and the least recently used ones beyond max_loaded"""
+        now = time.monotonic()
+        with self._lock:
+            overflow = len(self._guilds) - self.max_loaded
+            for guild_id in list(self._guilds):
+                # Someone still holds this store; closing it would orphan their writes
+                if guild_id in self._pins:
+                    continue
+                idle = now - self._last_used[guild_id]
+                # Oldest first, so every later guild was used more recently
+                if idle < MIN_RESIDENCY or (overflow <= 0 and idle < self.idle_seconds):
+                    break
+                self._unload(guild_id)
+                overflow -= 1
+    
+    def _unload(self, guild_id: int):
+        """Close a loaded guild, keeping its index entry"""
+        with self._lock:
+            store = self._guilds.pop(guild_id)
+            del self._last_used[guild_id]
+            self._refresh(guild_id, store)
+            store.close()
+    
+    def flush(self):
+        """Write out every loaded guild and the index, then evict idle guilds"""
+        # Eviction only runs here (on the writer thread) when there is one, so a
+        # store is never closed while this loop flushes it
+        with self._lock:
+            stores = list(self._guilds.values())
+        for store in stores:
+            store.flush()
+        self._evict()
+        self._save_index()
+    
+    def close(self):
+        """Stop the background writer and close every loaded guild"""
+        if self._writer:
+            self._writer.stop()
+            self._writer = None
+        with self._lock:
+            for guild_id, store in self._guilds.items():
+                self._refresh(guild_id, store)
+                store.close()
+            self._guilds.clear()
+            self._last_used.clear()
+        self._save_index()
+    
+    def get_moderation_stats(self) -> Dict[str, any]:
+        """Get current moderation statistics summed over every guild"""
+        with self._lock:
+            return {
+                'total_warnings': self._totals['total_warnings'],
+                'total_users_warned': self._totals['total_users_warned'],
+                'active_mutes': self._active_mutes.count(),
+                'total_bans': self._totals['total_bans'],
+                'total_kicks': self._totals['total_kicks'],
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    def get_guild_stats(self, guild_id: int) -> Dict[str, any]:
+        """Get one guild's statistics without loading its store"""
+        with self._lock:
+            entry = self._index.get(guild_id, {})
+            loaded = guild_id in self._guilds
+        now = datetime.now().isoformat()
+        stats = {key: entry.get(key, 0) for key in COUNT_KEYS}
+        # ISO timestamps from datetime.now() compare in time order
+        stats['active_mutes'] = sum(1 for expires_at in entry.get('mutes', {}).values() if expires_at > now)
+        stats['guild_id'] = guild_id
+        stats['loaded'] = loaded
+        stats['timestamp'] = now
+        return stats
+    
+    def iter_actions(self) -> Iterator[Dict]:
+        """Change events for every stored record of every guild, one guild at a time"""
+        with self._lock:
+            guild_ids = list(self._index)
+        for guild_id in guild_ids:
+            with self._lock:
+                loaded = guild_id in self._guilds
+                events = self.for_guild(guild_id).iter_actions()
+            for event in events:
+                yield dict(event, guild_id=guild_id)
+            # Only one guild's records are in memory at a time; guilds opened just
+            # for this are closed again unless someone pinned them meanwhile
+            if not loaded:
+                with self._lock:
+                    if guild_id in self._guilds and guild_id not in self._pins:
+                        self._unload(guild_id)
+    
+    def get_all_mutes(self) -> List[Dict]:
+        """Get the guild, user and expiry of every stored mute from the index"""
+        with self._lock:
+            return [
+                {'user_id': int(user_id), 'guild_id': guild_id or None, 'expires_at': expires_at}
+                for guild_id, entry in self._index.items()
+                for user_id, expires_at in entry.get('mutes', {}).items()
+            ]
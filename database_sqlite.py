@@ -0,0 +1,443 @@
+import atexit
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Callable
+from datetime import datetime, timedelta
+
+from config import DB_SQLITE_FILE, DB_FLUSH_INTERVAL
+from database import ActiveMuteTracker, BackgroundWriter, ModerationDB, make_event
+from metrics import db_file_size, db_flush_duration
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS warnings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    warning_id INTEGER NOT NULL,
+    moderator_id INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_warnings_user ON warnings (user_id, warning_id);
+CREATE INDEX IF NOT EXISTS idx_warnings_moderator ON warnings (moderator_id);
+CREATE INDEX IF NOT EXISTS idx_warnings_timestamp ON warnings (timestamp);
+
+CREATE TABLE IF NOT EXISTS mutes (
+    user_id INTEGER PRIMARY KEY,
+    moderator_id INTEGER NOT NULL,
+    duration INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    guild_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_mutes_moderator ON mutes (moderator_id);
+CREATE INDEX IF NOT EXISTS idx_mutes_expires_at ON mutes (expires_at);
+
+CREATE TABLE IF NOT EXISTS bans (
+    user_id INTEGER PRIMARY KEY,
+    moderator_id INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bans_moderator ON bans (moderator_id);
+CREATE INDEX IF NOT EXISTS idx_bans_timestamp ON bans (timestamp);
+
+CREATE TABLE IF NOT EXISTS kicks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    moderator_id INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_kicks_user ON kicks (user_id);
+CREATE INDEX IF NOT EXISTS idx_kicks_moderator ON kicks (moderator_id);
+CREATE INDEX IF NOT EXISTS idx_kicks_timestamp ON kicks (timestamp);
+"""
+
+class SQLiteModerationDB:
+    """ModerationDB backed by an indexed SQLite file instead of an in-memory dict"""
+    def __init__(self, db_file: str = DB_SQLITE_FILE, flush_interval: float = DB_FLUSH_INTERVAL, autoflush: bool = True):
+        self.db_file = db_file
+        # One connection shared with the writer thread, so every use goes through _lock
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Databases created before mutes recorded their guild
+        columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(mutes)")]
+        if 'guild_id' not in columns:
+            self.conn.execute("ALTER TABLE mutes ADD COLUMN guild_id INTEGER")
+        self.conn.commit()
+        self.on_data_change_callbacks: List[Callable] = []
+        self.event_listeners: List[Callable[[Dict], None]] = []
+        self._batch_depth = 0
+        # False when the owner commits for us (see ModerationDB)
+        self._autoflush = autoflush
+        self._load_counts()
+        
+        # Statements run immediately inside an open transaction (so reads see them)
+        # and the background writer group-commits them
+        self._writer = None
+        if flush_interval > 0:
+            self._writer = BackgroundWriter(self.flush, flush_interval, name="moderation-sqlite-writer")
+            atexit.register(self.close)
+    
+    def add_data_change_callback(self, callback: Callable):
+        """Add a callback to be called when data changes"""
+        self.on_data_change_callbacks.append(callback)
+    
+    def add_event_listener(self, listener: Callable[[Dict], None]):
+        """Add a listener that receives a change event for every mutation"""
+        self.event_listeners.append(listener)
+    
+    def notify_data_change(self, event: Optional[Dict] = None):
+        """Notify all callbacks that data has changed"""
+        for callback in self.on_data_change_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in data change callback: {e}")
+        if event is None:
+            return
+        for listener in self.event_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Error in change event listener: {e}")
+    
+    def save_data(self):
+        """Commit pending changes to the database file"""
+        if self._writer is None:
+            self.flush()
+        self.notify_data_change()
+    
+    def _changed(self, event: Dict):
+        """Commit (unless the writer batches it) and notify listeners of a mutation"""
+        if self._writer is None and self._autoflush and not self._batch_depth:
+            self.flush()
+        self.notify_data_change(event)
+    
+    @contextmanager
+    def batch(self):
+        """Run many mutations in a single transaction"""
+        # Holding the lock keeps the background writer from committing half a batch
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+        # Like single mutations, left to the writer (or the owning store) when there is one
+        if self._writer is None and self._autoflush and not self._batch_depth:
+            self.flush()
+    
+    def flush(self):
+        """Commit the open transaction"""
+        with self._lock:
+            if self.conn.in_transaction:
+                with db_flush_duration.time(backend="sqlite"):
+                    self.conn.commit()
+                if self._autoflush:
+                    self._record_file_size()
+    
+    def _record_file_size(self):
+        """Export the size of the database file and its write-ahead log"""
+        for path in (self.db_file, f"{self.db_file}-wal"):
+            try:
+                db_file_size.set(os.path.getsize(path), file=os.path.basename(path))
+            except OSError:
+                pass
+    
+    def close(self):
+        """Commit and close the database connection"""
+        if self._writer:
+            self._writer.stop()
+            self._writer = None
+        with self._lock:
+            try:
+                self.conn.commit()
+                self.conn.close()
+            except sqlite3.ProgrammingError:
+                # Already closed
+                pass
+    
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        """Run a write statement and return the number of affected rows"""
+        with self._lock:
+            return self.conn.execute(sql, params).rowcount
+    
+    def _fetchone(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+    
+    def _fetchall(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+    
+    def _load_counts(self):
+        """Aggregate the running totals once; mutators keep them current afterwards"""
+        row = self._fetchone(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM warnings) AS total_warnings,
+                (SELECT COUNT(DISTINCT user_id) FROM warnings) AS total_users_warned,
+                (SELECT COUNT(*) FROM bans) AS total_bans,
+                (SELECT COUNT(*) FROM kicks) AS total_kicks
+            """
+        )
+        self._counts = dict(row)
+        
+        self._active_mutes = ActiveMuteTracker()
+        rows = self._fetchall(
+            "SELECT user_id, expires_at FROM mutes WHERE expires_at > ?",
+            (datetime.now().isoformat(),)
+        )
+        for row in rows:
+            self._active_mutes.track(str(row['user_id']), row['expires_at'])
+    
+    def for_guild(self, guild_id: Optional[int]) -> "SQLiteModerationDB":
+        """Store holding a guild's records; this store shares one database across guilds"""
+        return self
+    
+    @contextmanager
+    def pinned(self, guild_id: Optional[int]):
+        """Hold a guild's store for the whole block; this store is never unloaded"""
+        yield self
+    
+    def get_moderation_stats(self) -> Dict[str, any]:
+        """Get current moderation statistics"""
+        with self._lock:
+            return {
+                'total_warnings': self._counts['total_warnings'],
+                'total_users_warned': self._counts['total_users_warned'],
+                'active_mutes': self._active_mutes.count(),
+                'total_bans': self._counts['total_bans'],
+                'total_kicks': self._counts['total_kicks'],
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    def add_warning(self, user_id: int, moderator_id: int, reason: str):
+        """Add a warning for a user"""
+        with self._lock:
+            warning = {
+                'reason': reason,
+                'moderator_id': moderator_id,
+                'timestamp': datetime.now().isoformat(),
+                'warning_id': self.get_warning_count(user_id) + 1
+            }
+            
+            self._execute(
+                "INSERT INTO warnings (user_id, warning_id, moderator_id, reason, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (int(user_id), warning['warning_id'], moderator_id, reason, warning['timestamp'])
+            )
+            self._counts['total_warnings'] += 1
+            if warning['warning_id'] == 1:
+                self._counts['total_users_warned'] += 1
+        self._changed(make_event('add_warning', user_id, warning))
+        return warning
+    
+    def get_warnings(self, user_id: int) -> List[Dict]:
+        """Get all warnings for a user"""
+        rows = self._fetchall(
+            "SELECT reason, moderator_id, timestamp, warning_id FROM warnings WHERE user_id = ? ORDER BY warning_id",
+            (int(user_id),)
+        )
+        return [dict(row) for row in rows]
+    
+    def get_warning_count(self, user_id: int) -> int:
+        """Get the number of warnings for a user"""
+        row = self._fetchone("SELECT COUNT(*) FROM warnings WHERE user_id = ?", (int(user_id),))
+        return row[0]
+    
+    def get_latest_warning(self, user_id: int) -> Optional[Dict]:
+        """Get the most recent warning for a user"""
+        row = self._fetchone(
+            "SELECT reason, moderator_id, timestamp, warning_id FROM warnings WHERE user_id = ? ORDER BY warning_id DESC LIMIT 1",
+            (int(user_id),)
+        )
+        return dict(row) if row else None
+    
+    def get_warnings_page(self, user_id: int, offset: int, limit: int) -> List[Dict]:
+        """Get one page of a user's warnings, oldest first"""
+        rows = self._fetchall(
+            "SELECT reason, moderator_id, timestamp, warning_id FROM warnings WHERE user_id = ? ORDER BY warning_id LIMIT ? OFFSET ?",
+            (int(user_id), limit, offset)
+        )
+        return [dict(row) for row in rows]
+    
+    def clear_warnings(self, user_id: int):
+        """Clear all warnings for a user"""
+        with self._lock:
+            cleared = self._execute("DELETE FROM warnings WHERE user_id = ?", (int(user_id),))
+            if cleared:
+                self._counts['total_warnings'] -= cleared
+                self._counts['total_users_warned'] -= 1
+        if cleared:
+            self._changed(make_event('clear_warnings', user_id))
+    
+    def add_mute(self, user_id: int, moderator_id: int, duration: int, reason: str, guild_id: Optional[int] = None):
+        """Add a mute record"""
+        mute = {
+            'moderator_id': moderator_id,
+            'duration': duration,
+            'reason': reason,
+            'timestamp': datetime.now().isoformat(),
+            'expires_at': (datetime.now() + timedelta(seconds=duration)).isoformat(),
+            'guild_id': guild_id
+        }
+        
+        with self._lock:
+            self._execute(
+                "INSERT OR REPLACE INTO mutes (user_id, moderator_id, duration, reason, timestamp, expires_at, guild_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (int(user_id), moderator_id, duration, reason, mute['timestamp'], mute['expires_at'], guild_id)
+            )
+            self._active_mutes.track(str(user_id), mute['expires_at'])
+        self._changed(make_event('add_mute', user_id, mute))
+        return mute
+    
+    def remove_mute(self, user_id: int, expired: bool = False):
+        """Remove a mute record"""
+        with self._lock:
+            removed = self._execute("DELETE FROM mutes WHERE user_id = ?", (int(user_id),))
+            self._active_mutes.untrack(str(user_id))
+        if removed:
+            self._changed(make_event('remove_mute', user_id, {'expired': True} if expired else None))
+    
+    def get_mute(self, user_id: int) -> Optional[Dict]:
+        """Get mute record for a user"""
+        row = self._fetchone(
+            "SELECT moderator_id, duration, reason, timestamp, expires_at, guild_id FROM mutes WHERE user_id = ?",
+            (int(user_id),)
+        )
+        return dict(row) if row else None
+    
+    def get_all_mutes(self) -> List[Dict]:
+        """Get every stored mute record, including its user_id"""
+        rows = self._fetchall(
+            "SELECT user_id, moderator_id, duration, reason, timestamp, expires_at, guild_id FROM mutes ORDER BY expires_at"
+        )
+        return [dict(row) for row in rows]
+    
+    def add_ban(self, user_id: int, moderator_id: int, reason: str):
+        """Add a ban record"""
+        ban = {
+            'moderator_id': moderator_id,
+            'reason': reason,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        with self._lock:
+            if self.get_ban(user_id) is None:
+                self._counts['total_bans'] += 1
+            self._execute(
+                "INSERT OR REPLACE INTO bans (user_id, moderator_id, reason, timestamp) VALUES (?, ?, ?, ?)",
+                (int(user_id), moderator_id, reason, ban['timestamp'])
+            )
+        self._changed(make_event('add_ban', user_id, ban))
+        return ban
+    
+    def remove_ban(self, user_id: int):
+        """Remove a ban record"""
+        with self._lock:
+            removed = self._execute("DELETE FROM bans WHERE user_id = ?", (int(user_id),))
+            self._counts['total_bans'] -= removed
+        if removed:
+            self._changed(make_event('remove_ban', user_id))
+    
+    def get_ban(self, user_id: int) -> Optional[Dict]:
+        """Get ban record for a user"""
+        row = self._fetchone(
+            "SELECT moderator_id, reason, timestamp FROM bans WHERE user_id = ?",
+            (int(user_id),)
+        )
+        return dict(row) if row else None
+    
+    def log_kick(self, user_id: int, moderator_id: int, reason: str):
+        """Log a kick action"""
+        kick_log = {
+            'user_id': user_id,
+            'moderator_id': moderator_id,
+            'reason': reason,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        with self._lock:
+            self._execute(
+                "INSERT INTO kicks (user_id, moderator_id, reason, timestamp) VALUES (?, ?, ?, ?)",
+                (int(user_id), moderator_id, reason, kick_log['timestamp'])
+            )
+            self._counts['total_kicks'] += 1
+        self._changed(make_event('log_kick', user_id, kick_log))
+        return kick_log
+    
+    def iter_actions(self) -> List[Dict]:
+        """Change events for every stored warning, mute, ban and kick (to backfill activity rollups)"""
+        events = []
+        with self._lock:
+            for op, table in (('add_warning', 'warnings'), ('add_mute', 'mutes'), ('add_ban', 'bans'), ('log_kick', 'kicks')):
+                rows = self._fetchall(f"SELECT user_id, moderator_id, timestamp FROM {table}")
+                events.extend(make_event(op, row['user_id'], dict(row)) for row in rows)
+        return events
+
+def import_json(json_file: str, sqlite_file: str = DB_SQLITE_FILE) -> Dict[str, int]:
+    """One-shot import of an existing JSON (and journal) data file into SQLite"""
+    # Loading replays any journal records not yet compacted into the snapshot;
+    # read-only so the source files are left exactly as they were
+    data = ModerationDB(json_file, storage_mode="journal", flush_interval=0, read_only=True).data
+    db = SQLiteModerationDB(sqlite_file, flush_interval=0)
+    
+    with db.conn:
+        db.conn.execute("DELETE FROM warnings")
+        db.conn.execute("DELETE FROM mutes")
+        db.conn.execute("DELETE FROM bans")
+        db.conn.execute("DELETE FROM kicks")
+        
+        db.conn.executemany(
+            "INSERT INTO warnings (user_id, warning_id, moderator_id, reason, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (
+                (int(user_id), w['warning_id'], w['moderator_id'], w['reason'], w['timestamp'])
+                for user_id, warns in data.get('warnings', {}).items()
+                for w in warns
+            )
+        )
+        db.conn.executemany(
+            "INSERT INTO mutes (user_id, moderator_id, duration, reason, timestamp, expires_at, guild_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (int(user_id), m['moderator_id'], m['duration'], m['reason'], m['timestamp'], m['expires_at'], m.get('guild_id'))
+                for user_id, m in data.get('mutes', {}).items()
+            )
+        )
+        db.conn.executemany(
+            "INSERT INTO bans (user_id, moderator_id, reason, timestamp) VALUES (?, ?, ?, ?)",
+            (
+                (int(user_id), b['moderator_id'], b['reason'], b['timestamp'])
+                for user_id, b in data.get('bans', {}).items()
+            )
+        )
+        db.conn.executemany(
+            "INSERT INTO kicks (user_id, moderator_id, reason, timestamp) VALUES (?, ?, ?, ?)",
+            (
+                (int(k['user_id']), k['moderator_id'], k['reason'], k['timestamp'])
+                for k in data.get('kick_log', [])
+            )
+        )
+    
+    db._load_counts()
+    counts = db.get_moderation_stats()
+    db.close()
+    return counts
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python database_sqlite.py <moderation_data.json> [moderation_data.db]")
+        sys.exit(1)
+    
+    target = sys.argv[2] if len(sys.argv) > 2 else DB_SQLITE_FILE
+    stats = import_json(sys.argv[1], target)
+    print(f"✅ Imported {sys.argv[1]} into {target}")
+    print(f"📊 {stats['total_warnings']} warnings, {stats['total_bans']} bans, {stats['total_kicks']} kicks")
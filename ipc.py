@@ -0,0 +1,351 @@
+import asyncio
+import json
+import os
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+from config import IPC_SOCKET, IPC_REPORT_INTERVAL
+
+STAT_KEYS = ('total_warnings', 'total_users_warned', 'active_mutes', 'total_bans', 'total_kicks')
+# Messages kept for the hub while it is unreachable
+MAX_QUEUED_MESSAGES = 10000
+# Bytes buffered for a web process before it is dropped as too slow
+MAX_SUBSCRIBER_BUFFER = 1024 * 1024
+
+class StatsSource:
+    """Store stand-in exposing stats and change events that come from elsewhere"""
+    def __init__(self):
+        self.on_data_change_callbacks: List[Callable] = []
+        self.event_listeners: List[Callable[[Dict], None]] = []
+    
+    def add_data_change_callback(self, callback: Callable):
+        """Add a callback to be called when data changes"""
+        self.on_data_change_callbacks.append(callback)
+    
+    def add_event_listener(self, listener: Callable[[Dict], None]):
+        """Add a listener that receives a change event for every mutation"""
+        self.event_listeners.append(listener)
+    
+    def notify_data_change(self, event: Optional[Dict] = None):
+        """Notify all callbacks that data has changed"""
+        for callback in self.on_data_change_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in data change callback: {e}")
+        if event is None:
+            return
+        for listener in self.event_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Error in change event listener: {e}")
+
+class StatsHub(StatsSource):
+    """Sums stats and change events from bot processes and streams them to web processes over a Unix socket"""
+    # Workers always partition by guild (see launcher.py), so their events carry it
+    partitioned = True
+    
+    def __init__(self, socket_path: str = IPC_SOCKET):
+        super().__init__()
+        self.socket_path = socket_path
+        # worker -> its latest stats; kept after a disconnect since its data still exists
+        self._worker_stats: Dict[str, Dict] = {}
+        self._subscribers: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # ActivityRollup answering web processes' /api/timeseries queries
+        self.activity = None
+    
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        if os.path.exists(self.socket_path):
+            # Left behind by a previous run that didn't shut down cleanly
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        print(f"🔌 Stats hub listening on {self.socket_path}")
+    
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._server is not None:
+            self._server.close()
+            # Let the connection handlers finish instead of being cancelled at shutdown
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+    
+    def attach(self, db, worker: str = "local", interval: float = IPC_REPORT_INTERVAL):
+        """Report a store living in this process, as a StatsReporter does for a worker"""
+        def publish(event: Dict):
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is self._loop:
+                self._report(worker, db.get_moderation_stats(), event)
+            else:
+                self._loop.call_soon_threadsafe(lambda: self._report(worker, db.get_moderation_stats(), event))
+        
+        async def refresh():
+            # Mutes expire without a change event
+            while True:
+                await asyncio.sleep(interval)
+                self._report(worker, db.get_moderation_stats())
+        
+        db.add_event_listener(publish)
+        self._report(worker, db.get_moderation_stats())
+        self._tasks.append(asyncio.create_task(refresh()))
+    
+    def _report(self, worker: str, stats: Dict, event: Optional[Dict] = None):
+        """Take one worker's totals (and the change that produced them)"""
+        stats = dict(stats)
+        stats.pop('timestamp', None)
+        changed = self._worker_stats.get(worker) != stats
+        self._worker_stats[worker] = stats
+        # Periodic reports usually repeat the last totals
+        if not changed and event is None:
+            return
+        # Stats first, so listeners of the event already see the new totals
+        self.notify_data_change(event)
+        if self._subscribers:
+            self._send_subscribers(event)
+    
+    def _send_subscribers(self, event: Optional[Dict] = None):
+        message = {'stats': self.get_moderation_stats()}
+        if event is not None:
+            message['event'] = event
+        line = json.dumps(message, default=str).encode() + b"\n"
+        for writer in list(self._subscribers):
+            if writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                # Too far behind; it reconnects and starts over from a fresh snapshot
+                self._subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Read newline-delimited JSON from a worker, or register a subscriber"""
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    print("Skipping malformed stats report")
+                    continue
+                if message.get('subscribe'):
+                    # Web workers: current totals now, then every change
+                    self._subscribers.add(writer)
+                    self._send_subscribers()
+                elif 'query' in message:
+                    self._answer(writer, message)
+                elif 'stats' in message:
+                    self._report(str(message.get('worker')), message['stats'], message.get('event'))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Hub shutting down
+            pass
+        finally:
+            self._connections.discard(task)
+            self._subscribers.discard(writer)
+            writer.close()
+    
+    def _answer(self, writer: asyncio.StreamWriter, message: Dict):
+        """Run a web process's activity query against this process's rollups"""
+        reply = {'reply': message.get('id'), 'result': None}
+        if self.activity is not None:
+            try:
+                reply['result'] = self.activity.query(**message.get('params', {}))
+            except ValueError as e:
+                # Sent back so the web process can report it as a bad request
+                reply['error'] = str(e)
+            except TypeError as e:
+                print(f"Skipping bad activity query: {e}")
+        writer.write(json.dumps(reply).encode() + b"\n")
+    
+    def get_moderation_stats(self) -> Dict[str, any]:
+        """Get current moderation statistics summed over every worker"""
+        stats = dict.fromkeys(STAT_KEYS, 0)
+        for worker_stats in list(self._worker_stats.values()):
+            for key in STAT_KEYS:
+                stats[key] += worker_stats.get(key, 0)
+        stats['timestamp'] = datetime.now().isoformat()
+        return stats
+
+class StatsSubscriber(StatsSource):
+    """Stats and change events streamed from a StatsHub, for web server processes"""
+    def __init__(self, socket_path: str = IPC_SOCKET):
+        super().__init__()
+        self.socket_path = socket_path
+        self._stats: Dict = dict.fromkeys(STAT_KEYS, 0)
+        self._task: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        # Query id -> future waiting for the hub's reply
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_query = 0
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def get_moderation_stats(self) -> Dict[str, any]:
+        """Get the latest moderation statistics received from the hub"""
+        return dict(self._stats, timestamp=datetime.now().isoformat())
+    
+    async def query_activity(self, params: Dict, timeout: float = 10.0) -> Optional[Dict]:
+        """Ask the hub for activity rollups; None if it keeps none or can't be reached, ValueError if it rejected the query"""
+        if self._writer is None:
+            return None
+        self._next_query += 1
+        query_id = self._next_query
+        future = asyncio.get_running_loop().create_future()
+        self._pending[query_id] = future
+        try:
+            self._writer.write(json.dumps({'query': 'activity', 'id': query_id, 'params': params}).encode() + b"\n")
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            return None
+        finally:
+            self._pending.pop(query_id, None)
+    
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            delay = 1.0
+            self._writer = writer
+            try:
+                writer.write(b'{"subscribe": true}\n')
+                await writer.drain()
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'reply' in message:
+                        future = self._pending.get(message['reply'])
+                        if future is not None and not future.done():
+                            if 'error' in message:
+                                future.set_exception(ValueError(message['error']))
+                            else:
+                                future.set_result(message.get('result'))
+                        continue
+                    stats = message.get('stats')
+                    if stats is not None:
+                        stats.pop('timestamp', None)
+                        self._stats = stats
+                    self.notify_data_change(message.get('event'))
+                print("⚠️ Stats hub closed the connection")
+            except (ConnectionError, OSError) as e:
+                print(f"⚠️ Lost connection to the stats hub: {e}")
+            finally:
+                self._writer = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_result(None)
+                writer.close()
+            await asyncio.sleep(delay)
+
+class StatsReporter:
+    """Sends this worker's stats and change events to the launcher's StatsHub"""
+    def __init__(self, db, worker: str, socket_path: str = IPC_SOCKET, interval: float = IPC_REPORT_INTERVAL):
+        self.db = db
+        self.worker = worker
+        self.socket_path = socket_path
+        self.interval = interval
+        self._queue: Deque[str] = deque(maxlen=MAX_QUEUED_MESSAGES)
+        self._has_messages: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._has_messages = asyncio.Event()
+        self.db.add_event_listener(self.publish)
+        self._task = asyncio.create_task(self._run())
+    
+    async def close(self):
+        if self.publish in self.db.event_listeners:
+            self.db.event_listeners.remove(self.publish)
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def publish(self, event: Dict):
+        """Store event listener; safe to call from any thread"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._enqueue(event)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, event)
+    
+    def _enqueue(self, event: Optional[Dict] = None):
+        message = {'worker': self.worker, 'stats': self.db.get_moderation_stats()}
+        if event is not None:
+            message['event'] = event
+        self._queue.append(json.dumps(message, default=str))
+        self._has_messages.set()
+    
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                _, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            delay = 1.0
+            try:
+                # Current totals first, so the hub is right even before the next change
+                self._enqueue()
+                while True:
+                    try:
+                        await asyncio.wait_for(self._has_messages.wait(), self.interval)
+                    except asyncio.TimeoutError:
+                        self._enqueue()
+                    self._has_messages.clear()
+                    while self._queue:
+                        writer.write(self._queue.popleft().encode() + b"\n")
+                    await writer.drain()
+            except (ConnectionError, OSError) as e:
+                print(f"⚠️ Lost connection to the stats hub: {e}")
+            finally:
+                writer.close()
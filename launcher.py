@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Runs the bot as several worker processes, each with its own range of shards.
+The dashboard is served from here and shows the totals of every worker.
+"""
+
+import asyncio
+import os
+import signal
+import sys
+
+from config import BOT_TOKEN, SHARD_COUNT, SHARD_PROCESSES, IPC_SOCKET, WEB_ENABLED
+from ipc import StatsHub
+from sharding import fetch_gateway_info, split_shards
+from timeseries import ActivityRollup
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# Seconds before a crashed worker is started again
+RESTART_DELAY = 5.0
+# Discord allows one identify per 5 seconds per max_concurrency bucket
+IDENTIFY_INTERVAL = 5.0
+
+class WorkerProcess:
+    """Keeps one bot process running for a range of shards"""
+    def __init__(self, index: int, shard_ids, shard_count: int, start_delay: float = 0.0):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.start_delay = start_delay
+        self.process = None
+        self.stopping = False
+    
+    def environment(self):
+        env = dict(os.environ)
+        env.update({
+            'BOT_SHARDED': 'true',
+            'SHARD_COUNT': str(self.shard_count),
+            'SHARD_IDS': ",".join(str(shard_id) for shard_id in self.shard_ids),
+            'IPC_SOCKET': IPC_SOCKET,
+            'WEB_ENABLED': 'false',
+            # A guild's data belongs to the one worker running its shard
+            'DB_PARTITION_BY_GUILD': 'true'
+        })
+        return env
+    
+    async def run(self):
+        await asyncio.sleep(self.start_delay)
+        while not self.stopping:
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, MAIN_SCRIPT, env=self.environment()
+            )
+            print(f"🚀 Worker {self.index} started (pid {self.process.pid}, shards {self.shard_ids[0]}-{self.shard_ids[-1]})")
+            code = await self.process.wait()
+            if self.stopping:
+                break
+            print(f"⚠️ Worker {self.index} exited with code {code}, restarting in {RESTART_DELAY:g}s")
+            await asyncio.sleep(RESTART_DELAY)
+    
+    def stop(self):
+        self.stopping = True
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+
+async def main():
+    max_concurrency = 1
+    shard_count = SHARD_COUNT
+    if not shard_count:
+        info = await fetch_gateway_info(BOT_TOKEN)
+        shard_count = info['shards']
+        max_concurrency = info.get('session_start_limit', {}).get('max_concurrency', 1)
+    groups = split_shards(shard_count, SHARD_PROCESSES)
+    print(f"🧩 Running {shard_count} shard(s) in {len(groups)} worker process(es)")
+    
+    hub = StatsHub(IPC_SOCKET)
+    await hub.start()
+    # Every worker's change events pass through the hub, so the rollups are kept here
+    activity = ActivityRollup()
+    activity.attach(hub)
+    hub.activity = activity
+    web_server = None
+    if WEB_ENABLED:
+        from web import WebServer
+        web_server = WebServer(hub, activity)
+        await web_server.start()
+    
+    # Stagger the workers so their shards don't identify at the same time
+    workers = []
+    identified = 0
+    for index, shard_ids in enumerate(groups):
+        delay = identified // max_concurrency * IDENTIFY_INTERVAL
+        workers.append(WorkerProcess(index, shard_ids, shard_count, delay))
+        identified += len(shard_ids)
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    tasks = [asyncio.create_task(worker.run()) for worker in workers]
+    try:
+        await stop.wait()
+    finally:
+        print("⏹️ Stopping workers...")
+        for worker in workers:
+            worker.stop()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if web_server:
+            await web_server.stop()
+        await hub.close()
+        activity.close()
+
+if __name__ == "__main__":
+    if not BOT_TOKEN:
+        print("❌ BOT_TOKEN not found in environment variables!")
+        sys.exit(1)
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+import asyncio
+from collections import deque
+from typing import Deque, List, Optional
+
+import discord
+
+from config import LOG_FLUSH_INTERVAL, LOG_QUEUE_SIZE
+from metrics import log_sink_dropped
+
+# Discord limits per message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+class LogSink:
+    """Queues moderation log embeds and sends them to the log channel in batches"""
+    def __init__(
+        self,
+        bot,
+        channel_id: int,
+        flush_interval: float = LOG_FLUSH_INTERVAL,
+        max_retries: int = 5,
+        max_queue: int = LOG_QUEUE_SIZE
+    ):
+        self.bot = bot
+        self.channel_id = channel_id
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        # Bounded so a long rate limit or a missing channel can't grow memory without limit
+        self._queue: Deque[discord.Embed] = deque(maxlen=max(1, max_queue))
+        self._has_items = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._channel: Optional[discord.abc.Messageable] = None
+        self._task: Optional[asyncio.Task] = None
+        self.sent_embeds = 0
+        self.dropped_embeds = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of embeds waiting to be sent"""
+        return len(self._queue)
+    
+    def put(self, embed: discord.Embed):
+        """Queue an embed for the log channel"""
+        if not self.channel_id:
+            return
+        if len(self._queue) == self._queue.maxlen:
+            # The deque drops the oldest embed on append
+            self.dropped_embeds += 1
+            log_sink_dropped.inc(reason="queue_full")
+        self._queue.append(embed)
+        self._has_items.set()
+        if len(self._queue) >= MAX_EMBEDS_PER_MESSAGE:
+            self._batch_full.set()
+    
+    def start(self):
+        """Start the background sender on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def close(self):
+        """Stop the sender and try to deliver whatever is still queued"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue:
+            await self._send(self._take_batch())
+    
+    def _resolve_channel(self) -> Optional[discord.abc.Messageable]:
+        """Look the log channel up once and reuse it"""
+        if self._channel is None:
+            self._channel = self.bot.get_channel(self.channel_id)
+        return self._channel
+    
+    def _take_batch(self) -> List[discord.Embed]:
+        """Pop as many queued embeds as fit in one message"""
+        batch: List[discord.Embed] = []
+        chars = 0
+        while self._queue and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+            size = len(self._queue[0])
+            if batch and chars + size > MAX_EMBED_CHARS_PER_MESSAGE:
+                break
+            batch.append(self._queue.popleft())
+            chars += size
+        
+        if not self._queue:
+            self._has_items.clear()
+        if len(self._queue) < MAX_EMBEDS_PER_MESSAGE:
+            self._batch_full.clear()
+        return batch
+    
+    async def _run(self):
+        while True:
+            await self._has_items.wait()
+            # Let more actions join the message unless it is already full
+            if len(self._queue) < MAX_EMBEDS_PER_MESSAGE:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self._send(self._take_batch())
+    
+    async def _send(self, embeds: List[discord.Embed]):
+        """Send one message of embeds, retrying rate limits and server errors with backoff"""
+        if not embeds:
+            return
+        
+        channel = self._resolve_channel()
+        if channel is None:
+            self.dropped_embeds += len(embeds)
+            log_sink_dropped.inc(len(embeds), reason="send_failed")
+            print(f"Failed to log moderation action: log channel {self.channel_id} not found")
+            return
+        
+        for attempt in range(self.max_retries):
+            try:
+                await channel.send(embeds=embeds)
+                self.sent_embeds += len(embeds)
+                return
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    if e.status == 404:
+                        # Channel was deleted; resolve it again next time
+                        self._channel = None
+                    print(f"Failed to log moderation action: {e}")
+                    break
+                await asyncio.sleep(min(60, 2 ** attempt))
+            except Exception as e:
+                print(f"Failed to log moderation action: {e}")
+                break
+        
+        self.dropped_embeds += len(embeds)
+        log_sink_dropped.inc(len(embeds), reason="send_failed")
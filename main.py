@@ -1,10 +1,11 @@
 import discord
 from discord.ext import commands
 import asyncio
-import contextlib
 import os
 import asyncio
-from config import BOT_TOKEN, GUILD_ID
+from config import BOT_TOKEN, GUILD_ID, WEB_ENABLED, BOT_SHARDED, SHARD_COUNT, SHARD_IDS
+from database import create_database
+from metrics import gateway_latency, install_rate_limit_counter
 
 # Bot setup
 intents = discord.Intents.default()
@@ -12,11 +13,21 @@ intents.message_content = True
 intents.members = True
 intents.guilds = True
 
-bot = commands.Bot(
-    command_prefix="!",
-    intents=intents,
-    help_command=None
-)
+if BOT_SHARDED:
+    # One gateway connection per shard; launcher.py gives each process a range of SHARD_IDS
+    bot = commands.AutoShardedBot(
+        command_prefix="!",
+        intents=intents,
+        help_command=None,
+        shard_count=SHARD_COUNT or None,
+        shard_ids=SHARD_IDS or None
+    )
+else:
+    bot = commands.Bot(
+        command_prefix="!",
+        intents=intents,
+        help_command=None
+    )
 
 @bot.event
 async def on_ready():
@@ -24,6 +35,11 @@ async def on_ready():
     print(f"🤖 {bot.user} is online and ready!")
     print(f"📊 Connected to {len(bot.guilds)} guild(s)")
     
+    # Commands are registered per application, so only the worker with shard 0 syncs them
+    if SHARD_IDS and 0 not in SHARD_IDS:
+        print("✅ Bot setup complete!")
+        return
+    
     # Wait a bit before syncing commands
     await asyncio.sleep(2)
     
@@ -43,6 +59,11 @@ async def on_ready():
     
     print("✅ Bot setup complete!")
 
+@bot.event
+async def on_shard_ready(shard_id):
+    """Called when one shard of an AutoShardedBot is ready"""
+    print(f"🧩 Shard {shard_id} ready")
+
 @bot.event
 async def on_guild_join(guild):
     """Called when the bot joins a guild"""
@@ -118,13 +139,13 @@ async def help_command(interaction: discord.Interaction):
         
         embed.add_field(
             name="👢 User Management",
-            value="• `/kick` - Kick a user from server\n• `/ban` - Ban a user from server\n• `/unban` - Unban a user",
+            value="• `/kick` - Kick a user from server\n• `/ban` - Ban a user from server\n• `/unban` - Unban a user\n• `/massban`, `/masskick`, `/massmute` - Act on a list of user IDs\n• `/raidstatus`, `/raidban`, `/endlockdown` - Raid lockdown",
             inline=False
         )
         
         embed.add_field(
             name="🗑️ Message Management",
-            value="• `/purge` - Delete multiple messages\n• `/modinfo` - Get user moderation info",
+            value="• `/purge` - Delete multiple messages\n• `/modinfo` - Get user moderation info\n• `/addbannedword`, `/removebannedword`, `/bannedwords` - AutoMod word filter",
             inline=False
         )
         
@@ -235,23 +256,48 @@ async def load_extensions():
 
 async def main():
     """Main function to start the bot"""
+    # One moderation store shared by the cog and the web server
+    db = create_database()
+    bot.moderation_db = db
+    # Export gateway latency and the 429s discord.py retries internally
+    gateway_latency.set_function(lambda: bot.latency)
+    install_rate_limit_counter()
     async with bot:
         await load_extensions()
-        # Start the FastAPI server in the background
+        # Start the FastAPI server in the background (WEB_MODE picks loop, thread or processes)
+        web_server = None
+        activity = None
+        if WEB_ENABLED:
+            try:
+                # Per-minute/hour/day action counts for /api/timeseries
+                from timeseries import ActivityRollup
+                activity = ActivityRollup()
+                activity.attach(db)
+                from web import WebServer
+                web_server = WebServer(db, activity)
+                await web_server.start()
+            except Exception as e:
+                print(f"⚠️ Failed to start web server: {e}")
+                web_server = None
+        # Workers started by launcher.py report to its dashboard instead
+        reporter = None
+        if SHARD_IDS:
+            from ipc import StatsReporter
+            reporter = StatsReporter(db, worker=",".join(str(shard_id) for shard_id in SHARD_IDS))
+            reporter.start()
         try:
-            from web import serve as start_web
-            web_task = asyncio.create_task(start_web())
-            print("🌐 Web server starting...")
-        except Exception as e:
-            print(f"⚠️ Failed to start web server: {e}")
-            web_task = None
-        # Start the Discord bot (blocking until shutdown)
-        await bot.start(BOT_TOKEN)
-        # When bot stops, cancel web server if it's running
-        if web_task:
-            web_task.cancel()
-            with contextlib.suppress(asyncio.CancelledError):
-                await web_task
+            # Start the Discord bot (blocking until shutdown)
+            await bot.start(BOT_TOKEN)
+        finally:
+            # When bot stops, stop the web server if it's running
+            if web_server:
+                await web_server.stop()
+            if reporter:
+                await reporter.close()
+            if activity:
+                activity.close()
+            # Flush moderation data still buffered by the background writer
+            db.close()
 
 if __name__ == "__main__":
     if not BOT_TOKEN:
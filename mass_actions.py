@@ -0,0 +1,124 @@
+import asyncio
+import re
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import discord
+
+from config import MASS_ACTION_CONCURRENCY, MASS_ACTION_MAX_USERS
+from overwrites import ProgressCallback
+
+# Discord snowflakes are 17-20 digits today; allow a little headroom either way
+USER_ID_PATTERN = re.compile(r"\b\d{15,21}\b")
+# Largest ID list attachment we read
+MAX_ATTACHMENT_BYTES = 512 * 1024
+# Users per bulk ban request (Discord's limit)
+BULK_BAN_CHUNK = 200
+
+def parse_user_ids(text: str) -> List[int]:
+    """Pull user IDs out of pasted text (mentions, join logs, one per line...) without duplicates"""
+    seen = set()
+    user_ids = []
+    for match in USER_ID_PATTERN.findall(text or ""):
+        user_id = int(match)
+        if user_id not in seen:
+            seen.add(user_id)
+            user_ids.append(user_id)
+    return user_ids
+
+async def collect_user_ids(text: Optional[str], attachment: Optional[discord.Attachment]) -> List[int]:
+    """Gather user IDs from the command text and an optional text attachment"""
+    sources = [text or ""]
+    if attachment is not None:
+        if attachment.size > MAX_ATTACHMENT_BYTES:
+            raise ValueError(f"Attachment is larger than {MAX_ATTACHMENT_BYTES // 1024} KB")
+        sources.append((await attachment.read()).decode("utf-8", errors="ignore"))
+    user_ids = parse_user_ids("\n".join(sources))
+    if len(user_ids) > MASS_ACTION_MAX_USERS:
+        raise ValueError(f"At most {MASS_ACTION_MAX_USERS} users can be handled at once (got {len(user_ids)})")
+    return user_ids
+
+async def with_rate_limit_retry(action: Callable[[], Awaitable], retries: int = 3):
+    """Run a REST call, backing off if the route is still rate limited"""
+    for attempt in range(retries + 1):
+        try:
+            return await action()
+        except discord.RateLimited as e:
+            if attempt == retries:
+                raise
+            delay = e.retry_after
+        except discord.HTTPException as e:
+            if e.status != 429 or attempt == retries:
+                raise
+            delay = 2 ** attempt
+        await asyncio.sleep(delay)
+
+async def run_batch(
+    user_ids: Iterable[int],
+    action: Callable[[int], Awaitable[None]],
+    concurrency: int = MASS_ACTION_CONCURRENCY,
+    progress: Optional[ProgressCallback] = None,
+    progress_interval: float = 2.0
+) -> Dict:
+    """Run an action for every user ID with bounded concurrency"""
+    user_ids = list(user_ids)
+    result = {'total': len(user_ids), 'succeeded': [], 'failed': {}}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    last_report = time.monotonic()
+    
+    async def worker(user_id: int):
+        nonlocal last_report
+        async with semaphore:
+            try:
+                await with_rate_limit_retry(lambda: action(user_id))
+                result['succeeded'].append(user_id)
+            except discord.NotFound:
+                result['failed'][user_id] = "not found"
+            except discord.Forbidden:
+                result['failed'][user_id] = "missing permissions"
+            except Exception as e:
+                result['failed'][user_id] = str(e)
+        
+        done = len(result['succeeded']) + len(result['failed'])
+        if progress and time.monotonic() - last_report >= progress_interval:
+            last_report = time.monotonic()
+            try:
+                await progress(done, result['total'])
+            except Exception as e:
+                print(f"Failed to report batch progress: {e}")
+    
+    await asyncio.gather(*(worker(user_id) for user_id in user_ids))
+    return result
+
+async def bulk_ban(
+    guild: discord.Guild,
+    user_ids: List[int],
+    reason: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None
+) -> Dict:
+    """Ban many users through Discord's bulk ban endpoint, 200 per request"""
+    result = {'total': len(user_ids), 'succeeded': [], 'failed': {}}
+    for start in range(0, len(user_ids), BULK_BAN_CHUNK):
+        chunk = user_ids[start:start + BULK_BAN_CHUNK]
+        try:
+            response = await with_rate_limit_retry(
+                lambda: guild.bulk_ban([discord.Object(id=user_id) for user_id in chunk], reason=reason, delete_message_seconds=0)
+            )
+        except discord.Forbidden:
+            raise
+        except discord.HTTPException as e:
+            # Discord answers 500000 "failed to ban users" when none could be banned
+            for user_id in chunk:
+                result['failed'][user_id] = str(e)
+        else:
+            banned = {user.id for user in response.banned}
+            result['succeeded'].extend(user_id for user_id in chunk if user_id in banned)
+            for user_id in chunk:
+                if user_id not in banned:
+                    result['failed'][user_id] = "already banned or not bannable"
+        if progress:
+            try:
+                await progress(len(result['succeeded']) + len(result['failed']), result['total'])
+            except Exception as e:
+                print(f"Failed to report batch progress: {e}")
+    return result
@@ -0,0 +1,238 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers a fast slash command up to a slow multi-channel provisioning
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """Base class for a named metric family with optional labels"""
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Updated from the event loop and the background writer thread
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ] + self.samples()
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+class Gauge(Metric):
+    """Value that goes up and down, set directly or read from a callback at scrape time"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, callback: Optional[Callable[[], float]]):
+        """Read the (unlabelled) value from a cheap callback on every scrape"""
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception as e:
+                print(f"Error reading metric {self.name}: {e}")
+                return []
+            if value is None or value != value:
+                # NaN (e.g. bot.latency before the first heartbeat)
+                return []
+            return [f"{self.name} {_format_value(value)}"]
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+class Histogram(Metric):
+    """Cumulative bucketed observations with a running sum and count"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(series[0]), series[1], series[2]) for key, series in self._values.items()]
+        lines = []
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Registry:
+    """Holds every metric family and renders them in the Prometheus text format"""
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+command_duration = registry.register(Histogram(
+    "moderation_command_duration_seconds",
+    "Moderation slash command latency",
+    ("command", "status")
+))
+db_flush_duration = registry.register(Histogram(
+    "moderation_db_flush_duration_seconds",
+    "Time spent writing pending moderation data to disk",
+    ("backend",)
+))
+db_file_size = registry.register(Gauge(
+    "moderation_db_file_size_bytes",
+    "Size of the moderation data file after the last write",
+    ("file",)
+))
+broadcast_duration = registry.register(Histogram(
+    "websocket_broadcast_duration_seconds",
+    "Time spent fanning a message out to WebSocket client queues",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+))
+loaded_guild_stores = registry.register(Gauge(
+    "moderation_db_loaded_guilds",
+    "Guild moderation stores held in memory"
+))
+stats_api_requests = registry.register(Counter(
+    "api_stats_requests_total",
+    "GET /api/stats responses by outcome (hit, miss, not_modified)",
+    ("result",)
+))
+websocket_connections = registry.register(Gauge(
+    "websocket_active_connections",
+    "Connected dashboard WebSocket clients"
+))
+log_sink_queue_depth = registry.register(Gauge(
+    "log_sink_queue_depth",
+    "Moderation log embeds waiting to be sent"
+))
+log_sink_dropped = registry.register(Counter(
+    "log_sink_dropped_total",
+    "Moderation log embeds never sent (queue_full: oldest dropped from a full queue, send_failed)",
+    ("reason",)
+))
+rate_limits = registry.register(Counter(
+    "discord_rate_limited_total",
+    "Discord REST 429 responses"
+))
+global_rate_limits = registry.register(Counter(
+    "discord_global_rate_limited_total",
+    "Discord REST 429 responses that hit the global rate limit"
+))
+gateway_latency = registry.register(Gauge(
+    "discord_gateway_latency_seconds",
+    "Discord gateway heartbeat latency"
+))
+
+class RateLimitLogHandler(logging.Handler):
+    """Counts the 429s discord.py handles internally from its HTTP client log"""
+    def emit(self, record: logging.LogRecord):
+        message = record.msg if isinstance(record.msg, str) else ""
+        # A global 429 logs both lines, so it lands in both counters
+        if "responded with 429" in message:
+            rate_limits.inc()
+        elif message.startswith("Global rate limit has been hit"):
+            global_rate_limits.inc()
+
+def install_rate_limit_counter():
+    """Attach the 429 counter to discord.py's HTTP logger (idempotent)"""
+    logger = logging.getLogger("discord.http")
+    if not any(isinstance(handler, RateLimitLogHandler) for handler in logger.handlers):
+        logger.addHandler(RateLimitLogHandler(logging.WARNING))
+        if logger.getEffectiveLevel() > logging.WARNING:
+            logger.setLevel(logging.WARNING)
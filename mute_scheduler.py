@@ -0,0 +1,90 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+# (guild_id, user_id); guild_id is None for mutes recorded before guilds were stored
+MuteKey = Tuple[Optional[int], int]
+
+class MuteScheduler:
+    """Single background task that expires mutes in deadline order"""
+    def __init__(self, expire_batch: Callable[[List[MuteKey]], Awaitable[None]], batch_size: int = 25):
+        self._expire_batch = expire_batch
+        self.batch_size = batch_size
+        # (expires_at, tiebreaker, key); the counter keeps keys out of comparisons
+        self._heap: List[Tuple[float, int, MuteKey]] = []
+        self._counter = itertools.count()
+        # Latest deadline per mute; older heap entries for the same key are skipped
+        self._deadlines: Dict[MuteKey, float] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def __len__(self) -> int:
+        return len(self._deadlines)
+    
+    def schedule(self, guild_id: Optional[int], user_id: int, expires_at: Union[str, datetime, float]):
+        """Schedule (or reschedule) the unmute for a user"""
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at)
+        if isinstance(expires_at, datetime):
+            expires_at = expires_at.timestamp()
+        
+        key = (guild_id, user_id)
+        self._deadlines[key] = expires_at
+        heapq.heappush(self._heap, (expires_at, next(self._counter), key))
+        # Wake the runner in case this deadline is earlier than the one it sleeps on
+        self._changed.set()
+    
+    def cancel(self, guild_id: Optional[int], user_id: int):
+        """Forget a scheduled unmute; its heap entry is discarded lazily"""
+        self._deadlines.pop((guild_id, user_id), None)
+    
+    def start(self):
+        """Start the scheduler task on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    def stop(self):
+        """Cancel the scheduler task"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+    
+    def _pop_due(self, now: float) -> List[MuteKey]:
+        """Pop up to batch_size live entries whose deadline has passed"""
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            expires_at, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == expires_at:
+                del self._deadlines[key]
+                due.append(key)
+        return due
+    
+    async def _run(self):
+        while True:
+            self._changed.clear()
+            # Drop cancelled/rescheduled entries so the head is a real deadline
+            while self._heap and self._deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - time.time())
+            
+            if timeout != 0.0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                    # A new deadline arrived; recompute the next wakeup
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            
+            due = self._pop_due(time.time())
+            if not due:
+                continue
+            try:
+                await self._expire_batch(due)
+            except Exception as e:
+                print(f"Error expiring mutes: {e}")
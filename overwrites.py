@@ -0,0 +1,84 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+import discord
+
+from config import OVERWRITE_CONCURRENCY
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+def has_overwrite(channel: discord.abc.GuildChannel, target: discord.Role, overwrite: discord.PermissionOverwrite) -> bool:
+    """Check whether a channel already carries every explicit value of an overwrite"""
+    current = channel.overwrites_for(target)
+    allow, deny = overwrite.pair()
+    current_allow, current_deny = current.pair()
+    return (
+        current_allow.value & allow.value == allow.value
+        and current_deny.value & deny.value == deny.value
+    )
+
+async def apply_overwrite(
+    channel: discord.abc.GuildChannel,
+    target: discord.Role,
+    overwrite: discord.PermissionOverwrite,
+    reason: Optional[str] = None,
+    retries: int = 3
+):
+    """Set a channel overwrite, backing off if the route is still rate limited"""
+    for attempt in range(retries + 1):
+        try:
+            await channel.set_permissions(target, overwrite=overwrite, reason=reason)
+            return
+        except discord.RateLimited as e:
+            if attempt == retries:
+                raise
+            delay = e.retry_after
+        except discord.HTTPException as e:
+            if e.status != 429 or attempt == retries:
+                raise
+            delay = 2 ** attempt
+        await asyncio.sleep(delay)
+
+async def provision_overwrites(
+    target: discord.Role,
+    channels: Iterable[discord.abc.GuildChannel],
+    overwrite: discord.PermissionOverwrite,
+    reason: Optional[str] = None,
+    concurrency: int = OVERWRITE_CONCURRENCY,
+    progress: Optional[ProgressCallback] = None,
+    progress_interval: float = 2.0
+) -> Dict[str, int]:
+    """Apply an overwrite to many channels with bounded concurrency"""
+    # Channels that already carry the overwrite cost no REST call, so running
+    # again after an interruption resumes where the last run stopped.
+    # discord.py serialises requests per rate-limit bucket (one per channel on
+    # this route); the semaphore keeps the burst under the global limit.
+    pending = [channel for channel in channels if not has_overwrite(channel, target, overwrite)]
+    result = {'total': len(pending), 'updated': 0, 'skipped': 0, 'failed': 0}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    last_report = time.monotonic()
+    
+    async def worker(channel: discord.abc.GuildChannel):
+        nonlocal last_report
+        async with semaphore:
+            try:
+                await apply_overwrite(channel, target, overwrite, reason=reason)
+                result['updated'] += 1
+            except discord.NotFound:
+                # Channel deleted while we were working through the list
+                result['skipped'] += 1
+            except Exception as e:
+                result['failed'] += 1
+                print(f"Failed to set overwrite on #{channel}: {e}")
+        
+        done = result['updated'] + result['skipped'] + result['failed']
+        if progress and time.monotonic() - last_report >= progress_interval:
+            last_report = time.monotonic()
+            try:
+                await progress(done, result['total'])
+            except Exception as e:
+                print(f"Failed to report overwrite progress: {e}")
+    
+    await asyncio.gather(*(worker(channel) for channel in pending))
+    return result
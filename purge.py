@@ -0,0 +1,183 @@
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+import discord
+
+from config import PURGE_CHANNEL_CONCURRENCY, PURGE_GUILD_SCAN_LIMIT, PURGE_SCAN_LIMIT
+from overwrites import ProgressCallback
+
+MessageCheck = Callable[[discord.Message], bool]
+
+# Discord refuses to bulk delete messages older than 14 days; keep a margin
+# so a message doesn't age past the limit between the scan and the request
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+BULK_DELETE_BATCH = 100
+
+def build_check(
+    user: Optional[discord.abc.User] = None,
+    pattern: Optional["re.Pattern"] = None,
+    attachments_only: bool = False,
+    exclude_ids: Optional[set] = None
+) -> MessageCheck:
+    """Combine the purge filters into a single message predicate"""
+    exclude_ids = exclude_ids or set()
+    
+    def check(message: discord.Message) -> bool:
+        if message.id in exclude_ids:
+            return False
+        if user and message.author.id != user.id:
+            return False
+        if attachments_only and not message.attachments:
+            return False
+        if pattern and not pattern.search(message.content):
+            return False
+        return True
+    
+    return check
+
+async def delete_message(message: discord.Message, retries: int = 3):
+    """Delete a single message, backing off if the route is still rate limited"""
+    for attempt in range(retries + 1):
+        try:
+            await message.delete()
+            return
+        except discord.RateLimited as e:
+            if attempt == retries:
+                raise
+            delay = e.retry_after
+        except discord.HTTPException as e:
+            if e.status != 429 or attempt == retries:
+                raise
+            delay = 2 ** attempt
+        await asyncio.sleep(delay)
+
+async def purge_channel(
+    channel: discord.abc.Messageable,
+    amount: int,
+    check: MessageCheck,
+    after: Optional[datetime] = None,
+    before: Optional[datetime] = None,
+    reason: Optional[str] = None,
+    scan_limit: int = PURGE_SCAN_LIMIT,
+    progress: Optional[ProgressCallback] = None,
+    progress_interval: float = 2.0
+) -> Dict[str, int]:
+    """Delete up to amount matching messages, streaming the channel history newest first"""
+    result = {'scanned': 0, 'deleted': 0, 'failed': 0}
+    bulk_cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+    batch: List[discord.Message] = []
+    last_report = time.monotonic()
+    
+    async def flush_batch():
+        # delete_messages needs at least two messages; a single one uses the normal route
+        try:
+            if len(batch) == 1:
+                await delete_message(batch[0])
+            else:
+                await channel.delete_messages(batch, reason=reason)
+            result['deleted'] += len(batch)
+        except discord.NotFound:
+            # Some were already deleted; Discord rejects the whole batch
+            for message in batch:
+                await delete_one(message)
+        except discord.Forbidden:
+            raise
+        except discord.HTTPException as e:
+            result['failed'] += len(batch)
+            print(f"Failed to bulk delete in #{channel}: {e}")
+        batch.clear()
+    
+    async def delete_one(message: discord.Message):
+        try:
+            await delete_message(message)
+            result['deleted'] += 1
+        except discord.NotFound:
+            pass
+        except discord.Forbidden:
+            raise
+        except discord.HTTPException as e:
+            result['failed'] += 1
+            print(f"Failed to delete message {message.id} in #{channel}: {e}")
+    
+    # history() pages through the channel 100 messages per request, so only
+    # one page and the pending batch are held in memory at a time
+    async for message in channel.history(limit=scan_limit, after=after, before=before, oldest_first=False):
+        result['scanned'] += 1
+        if check(message):
+            if message.created_at > bulk_cutoff:
+                batch.append(message)
+                if len(batch) >= BULK_DELETE_BATCH:
+                    await flush_batch()
+            else:
+                # Too old for bulk delete; flush newer ones first so the order holds
+                if batch:
+                    await flush_batch()
+                await delete_one(message)
+        
+        if progress and time.monotonic() - last_report >= progress_interval:
+            last_report = time.monotonic()
+            try:
+                await progress(result['deleted'] + len(batch), result['scanned'])
+            except Exception as e:
+                print(f"Failed to report purge progress: {e}")
+        
+        if result['deleted'] + result['failed'] + len(batch) >= amount:
+            break
+    
+    if batch:
+        await flush_batch()
+    return result
+
+async def purge_guild(
+    channels: Iterable[discord.abc.Messageable],
+    amount: int,
+    check: MessageCheck,
+    after: Optional[datetime] = None,
+    before: Optional[datetime] = None,
+    reason: Optional[str] = None,
+    scan_limit: int = PURGE_GUILD_SCAN_LIMIT,
+    concurrency: int = PURGE_CHANNEL_CONCURRENCY,
+    progress: Optional[ProgressCallback] = None,
+    progress_interval: float = 2.0
+) -> Dict:
+    """Purge matching messages from many channels at once, up to amount per channel"""
+    # Message deletes are rate limited per channel, so channels can be worked on
+    # in parallel; the semaphore keeps the total request rate under the global limit
+    channels = list(channels)
+    result = {'channels': len(channels), 'scanned': 0, 'deleted': 0, 'failed': 0, 'per_channel': {}}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    done = 0
+    last_report = time.monotonic()
+    
+    async def worker(channel: discord.abc.Messageable):
+        nonlocal done, last_report
+        async with semaphore:
+            try:
+                channel_result = await purge_channel(
+                    channel, amount, check, after=after, before=before, reason=reason, scan_limit=scan_limit
+                )
+            except (discord.Forbidden, discord.NotFound):
+                # No access to this channel's history, or it was deleted meanwhile
+                channel_result = {'scanned': 0, 'deleted': 0, 'failed': 0}
+            except Exception as e:
+                print(f"Failed to purge #{channel}: {e}")
+                channel_result = {'scanned': 0, 'deleted': 0, 'failed': 0}
+        
+        for key in ('scanned', 'deleted', 'failed'):
+            result[key] += channel_result[key]
+        if channel_result['deleted'] or channel_result['failed']:
+            result['per_channel'][channel] = channel_result
+        done += 1
+        
+        if progress and time.monotonic() - last_report >= progress_interval:
+            last_report = time.monotonic()
+            try:
+                await progress(done, len(channels))
+            except Exception as e:
+                print(f"Failed to report purge progress: {e}")
+    
+    await asyncio.gather(*(worker(channel) for channel in channels))
+    return result
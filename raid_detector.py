@@ -0,0 +1,158 @@
+import re
+import time
+import unicodedata
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from config import (
+    RAID_WINDOW_SECONDS, RAID_JOIN_THRESHOLD, RAID_YOUNG_ACCOUNT_AGE,
+    RAID_YOUNG_THRESHOLD, RAID_NAME_CLUSTER_THRESHOLD, RAID_LOCKDOWN_DURATION
+)
+
+# Upper bounds (seconds) of the account-age histogram buckets; the last bucket is open-ended
+ACCOUNT_AGE_BUCKETS = (3600, 86400, 7 * 86400, 30 * 86400)
+ACCOUNT_AGE_LABELS = ("< 1 hour", "< 1 day", "< 1 week", "< 30 days", "older")
+
+_NON_LETTERS = re.compile(r"[^a-z]+")
+
+def name_key(name: str) -> str:
+    """Reduce a username to the shape raid bots share (spammer123, Spammer_77 -> spammer)"""
+    folded = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    return _NON_LETTERS.sub("", folded)
+
+def age_bucket(account_age: float) -> int:
+    for index, bound in enumerate(ACCOUNT_AGE_BUCKETS):
+        if account_age < bound:
+            return index
+    return len(ACCOUNT_AGE_BUCKETS)
+
+class GuildJoinWindow:
+    """Sliding window of recent joins for one guild with running aggregates"""
+    def __init__(self):
+        # (joined_at, user_id, age bucket, name key)
+        self.joins: Deque[Tuple[float, int, int, str]] = deque()
+        self.age_histogram: List[int] = [0] * len(ACCOUNT_AGE_LABELS)
+        self.name_counts: Dict[str, int] = {}
+        self.locked_until = 0.0
+        # Joins to review with /raidban
+        self.suspects: Set[int] = set()
+    
+    def add(self, joined_at: float, user_id: int, bucket: int, key: str):
+        self.joins.append((joined_at, user_id, bucket, key))
+        self.age_histogram[bucket] += 1
+        if key:
+            self.name_counts[key] = self.name_counts.get(key, 0) + 1
+    
+    def expire(self, cutoff: float):
+        """Drop joins older than the window; each join is removed once, so this is amortised O(1)"""
+        while self.joins and self.joins[0][0] < cutoff:
+            _, _, bucket, key = self.joins.popleft()
+            self.age_histogram[bucket] -= 1
+            if key:
+                remaining = self.name_counts[key] - 1
+                if remaining:
+                    self.name_counts[key] = remaining
+                else:
+                    del self.name_counts[key]
+    
+    def young_joins(self, young_age: float) -> int:
+        """Joins in the window from accounts younger than young_age"""
+        return sum(
+            count for bound, count in zip(ACCOUNT_AGE_BUCKETS, self.age_histogram) if bound <= young_age
+        )
+
+class RaidDetector:
+    """Streaming join-rate, account-age and name-cluster raid detection per guild"""
+    def __init__(
+        self,
+        window: float = RAID_WINDOW_SECONDS,
+        join_threshold: int = RAID_JOIN_THRESHOLD,
+        young_account_age: float = RAID_YOUNG_ACCOUNT_AGE,
+        young_threshold: int = RAID_YOUNG_THRESHOLD,
+        name_cluster_threshold: int = RAID_NAME_CLUSTER_THRESHOLD,
+        lockdown_duration: float = RAID_LOCKDOWN_DURATION
+    ):
+        self.window = window
+        self.join_threshold = join_threshold
+        # Counted from the histogram: buckets whose upper bound is within this age
+        self.young_account_age = young_account_age
+        self.young_threshold = young_threshold
+        self.name_cluster_threshold = name_cluster_threshold
+        self.lockdown_duration = lockdown_duration
+        self._guilds: Dict[int, GuildJoinWindow] = {}
+    
+    def guild(self, guild_id: int) -> GuildJoinWindow:
+        state = self._guilds.get(guild_id)
+        if state is None:
+            state = self._guilds[guild_id] = GuildJoinWindow()
+        return state
+    
+    def record_join(self, guild_id: int, user_id: int, name: str, created_at: datetime, now: Optional[float] = None) -> Optional[str]:
+        """Count a join; returns why a raid was detected when this join starts a lockdown"""
+        now = time.time() if now is None else now
+        state = self.guild(guild_id)
+        state.expire(now - self.window)
+        
+        account_age = now - created_at.timestamp()
+        key = name_key(name)
+        if len(key) < 3:
+            # Too short to say anything about similarity
+            key = ""
+        state.add(now, user_id, age_bucket(account_age), key)
+        
+        if self.is_locked(guild_id, now):
+            state.suspects.add(user_id)
+            return None
+        
+        reason = None
+        if len(state.joins) >= self.join_threshold:
+            reason = f"{len(state.joins)} joins in {self.window:g}s"
+        elif self.young_threshold and state.young_joins(self.young_account_age) >= self.young_threshold:
+            reason = f"{state.young_joins(self.young_account_age)} new accounts joined in {self.window:g}s"
+        elif key and self.name_cluster_threshold and state.name_counts[key] >= self.name_cluster_threshold:
+            reason = f"{state.name_counts[key]} similar names ({key}) joined in {self.window:g}s"
+        
+        if reason:
+            state.locked_until = now + self.lockdown_duration
+            state.suspects.update(user_id for _, user_id, _, _ in state.joins)
+        return reason
+    
+    def is_locked(self, guild_id: int, now: Optional[float] = None) -> bool:
+        state = self._guilds.get(guild_id)
+        now = time.time() if now is None else now
+        return state is not None and state.locked_until > now
+    
+    def window_suspects(self, guild_id: int) -> List[int]:
+        """Users who joined within the current window"""
+        state = self._guilds.get(guild_id)
+        return [user_id for _, user_id, _, _ in state.joins] if state else []
+    
+    def take_suspects(self, guild_id: int) -> List[int]:
+        """Hand over (and forget) the users queued for a batch ban"""
+        state = self._guilds.get(guild_id)
+        if state is None:
+            return []
+        suspects = list(state.suspects)
+        state.suspects.clear()
+        return suspects
+    
+    def end_lockdown(self, guild_id: int):
+        state = self._guilds.get(guild_id)
+        if state is not None:
+            state.locked_until = 0.0
+    
+    def status(self, guild_id: int, now: Optional[float] = None) -> Dict:
+        """Current window aggregates for /raidstatus"""
+        now = time.time() if now is None else now
+        state = self.guild(guild_id)
+        state.expire(now - self.window)
+        top_name = max(state.name_counts.items(), key=lambda item: item[1], default=None)
+        return {
+            'joins': len(state.joins),
+            'age_histogram': dict(zip(ACCOUNT_AGE_LABELS, state.age_histogram)),
+            'top_name_cluster': top_name,
+            'locked': state.locked_until > now,
+            'locked_until': state.locked_until,
+            'suspects': len(state.suspects)
+        }
@@ -0,0 +1,35 @@
+from typing import Dict, List, Optional
+
+import aiohttp
+
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Shard whose gateway connection receives a guild's events"""
+    return (guild_id >> 22) % shard_count
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    """Spread shard ids over processes in contiguous, nearly equal ranges"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+def shard_owner(shard_ids: Optional[List[int]], shard_count: int):
+    """Predicate for guilds handled by this process; None when it runs every shard"""
+    if not shard_ids or not shard_count:
+        return None
+    owned = set(shard_ids)
+    return lambda guild_id: shard_for_guild(guild_id, shard_count) in owned
+
+async def fetch_gateway_info(token: str) -> Dict:
+    """Recommended shard count and identify limits for the bot"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_BOT_URL, headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            return await response.json()
@@ -7,7 +7,7 @@ This script simulates moderation actions to show how the web interface updates a
 import time
 import requests
 import json
-from database import ModerationDB
+from database import create_database
 
 def test_realtime_functionality():
     """Test the real-time functionality by performing moderation actions"""
@@ -15,8 +15,8 @@ def test_realtime_functionality():
     print("🤖 Testing Real-time Moderation Bot Web Interface")
     print("=" * 50)
     
-    # Initialize database
-    db = ModerationDB()
+    # Initialize database (a guild-partitioned store hands out one store per guild)
+    db = create_database().for_guild(None)
     
     # Get initial stats
     try:
@@ -0,0 +1,217 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    TIMESERIES_FILE, TIMESERIES_FLUSH_INTERVAL, TIMESERIES_MINUTE_RETENTION_HOURS, TIMESERIES_HOUR_RETENTION_DAYS
+)
+from database import BackgroundWriter
+
+GRANULARITIES = ('minute', 'hour', 'day')
+# Seconds of history kept per granularity; None keeps it forever
+RETENTION = {
+    'minute': TIMESERIES_MINUTE_RETENTION_HOURS * 3600,
+    'hour': TIMESERIES_HOUR_RETENTION_DAYS * 86400,
+    'day': None
+}
+
+# Events that are moderation actions; the rest (clears, unmutes, expiries, unbans)
+# are reported separately as reversals
+ACTION_EVENTS = ('warning_added', 'mute_added', 'ban_added', 'kick_logged')
+
+# (event type, moderator_id, guild_id)
+Cell = Tuple[str, Optional[int], Optional[int]]
+
+def bucket_start(granularity: str, timestamp: float) -> int:
+    """Start of the bucket holding a Unix timestamp"""
+    if granularity == 'minute':
+        return int(timestamp // 60) * 60
+    if granularity == 'hour':
+        return int(timestamp // 3600) * 3600
+    # Local midnight, like the naive local timestamps the stores write
+    day = datetime.fromtimestamp(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(day.timestamp())
+
+def _summary() -> Dict:
+    return {'total': 0, 'actions': {}, 'moderators': {}, 'reversals': {}}
+
+def _count(summary: Dict, event_type: str, moderator_id: Optional[int], count: int):
+    if event_type not in ACTION_EVENTS:
+        summary['reversals'][event_type] = summary['reversals'].get(event_type, 0) + count
+        return
+    summary['total'] += count
+    summary['actions'][event_type] = summary['actions'].get(event_type, 0) + count
+    moderator = str(moderator_id)
+    summary['moderators'][moderator] = summary['moderators'].get(moderator, 0) + count
+
+class ActivityRollup:
+    """Moderation actions counted per minute, hour and day as they are written"""
+    def __init__(
+        self,
+        path: str = TIMESERIES_FILE,
+        flush_interval: float = TIMESERIES_FLUSH_INTERVAL,
+        retention: Optional[Dict[str, Optional[float]]] = None
+    ):
+        self.path = path
+        self.retention = retention or RETENTION
+        self._lock = threading.Lock()
+        # granularity -> bucket start -> counts per cell
+        self._buckets: Dict[str, Dict[int, Dict[Cell, int]]] = {granularity: {} for granularity in GRANULARITIES}
+        # Bucket starts in order, so a range query only visits the buckets inside it
+        self._starts: Dict[str, List[int]] = {granularity: [] for granularity in GRANULARITIES}
+        self._dirty = False
+        # Whether the attached store's events carry their guild, so guild_id can be filtered on
+        self.by_guild = False
+        self.loaded = self._load()
+        
+        self._writer = None
+        if flush_interval > 0:
+            self._writer = BackgroundWriter(self.flush, flush_interval, name="activity-rollup-writer")
+            atexit.register(self.close)
+    
+    def _load(self) -> bool:
+        """Read the rollups written by the last run; False if there were none"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading activity rollups {self.path}: {e}")
+            return False
+        for granularity in GRANULARITIES:
+            for start, cells in data.get(granularity, {}).items():
+                self._buckets[granularity][int(start)] = {
+                    (action, moderator_id, guild_id): count for action, moderator_id, guild_id, count in cells
+                }
+            self._starts[granularity] = sorted(self._buckets[granularity])
+        return True
+    
+    def attach(self, store):
+        """Count a store's actions from now on, backfilling its records on the first run"""
+        if not self.loaded and hasattr(store, 'iter_actions'):
+            # Only records still stored can be counted; cleared warnings and lifted bans are gone
+            # Counted as they stream in; a partitioned store loads one guild at a time
+            count = 0
+            for event in store.iter_actions():
+                self._add(event)
+                count += 1
+            print(f"📈 Backfilled activity history from {count} stored record(s)")
+            self.loaded = True
+            self.flush()
+        store.add_event_listener(self.record)
+        self.by_guild = getattr(store, 'partitioned', False)
+    
+    def record(self, event: Dict):
+        """Store event listener: count one action in every granularity"""
+        self._add(event)
+        if self._writer is None:
+            self.flush()
+    
+    def _add(self, event: Dict):
+        try:
+            timestamp = datetime.fromisoformat(event['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return
+        cell = (event['type'], event.get('moderator_id'), event.get('guild_id'))
+        with self._lock:
+            for granularity in GRANULARITIES:
+                start = bucket_start(granularity, timestamp)
+                cells = self._buckets[granularity].get(start)
+                if cells is None:
+                    cells = self._buckets[granularity][start] = {}
+                    insort(self._starts[granularity], start)
+                cells[cell] = cells.get(cell, 0) + 1
+            self._dirty = True
+    
+    def _prune(self):
+        """Drop buckets older than their granularity's retention"""
+        now = time.time()
+        for granularity, keep in self.retention.items():
+            if keep is None:
+                continue
+            starts = self._starts[granularity]
+            expired = bisect_left(starts, bucket_start(granularity, now - keep))
+            if not expired:
+                continue
+            for start in starts[:expired]:
+                del self._buckets[granularity][start]
+            del starts[:expired]
+            self._dirty = True
+    
+    def flush(self):
+        """Write the rollups out if they changed"""
+        with self._lock:
+            self._prune()
+            if not self._dirty:
+                return
+            payload = json.dumps({
+                granularity: {
+                    str(start): [[*cell, count] for cell, count in cells.items()]
+                    for start, cells in self._buckets[granularity].items()
+                }
+                for granularity in GRANULARITIES
+            })
+            self._dirty = False
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_file, self.path)
+    
+    def close(self):
+        """Stop the background writer and write out what is left"""
+        if self._writer:
+            self._writer.stop()
+            self._writer = None
+        self.flush()
+    
+    def query(
+        self,
+        granularity: str,
+        start: float,
+        end: float,
+        action: Optional[str] = None,
+        moderator_id: Optional[int] = None,
+        guild_id: Optional[int] = None
+    ) -> Dict:
+        """Action counts by type and moderator (plus reversals) for each bucket overlapping [start, end)"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        if guild_id is not None and not self.by_guild:
+            # A shared store doesn't record which guild warnings, bans and kicks came from
+            raise ValueError("guild_id needs DB_PARTITION_BY_GUILD=true")
+        totals = _summary()
+        buckets = []
+        with self._lock:
+            starts = self._starts[granularity]
+            first = bisect_left(starts, bucket_start(granularity, start))
+            last = bisect_left(starts, end)
+            for bucket in starts[first:last]:
+                summary = dict(start=datetime.fromtimestamp(bucket).isoformat(), **_summary())
+                for (cell_action, cell_moderator, cell_guild), count in self._buckets[granularity][bucket].items():
+                    if action is not None and cell_action != action:
+                        continue
+                    if moderator_id is not None and cell_moderator != moderator_id:
+                        continue
+                    if guild_id is not None and cell_guild != guild_id:
+                        continue
+                    _count(summary, cell_action, cell_moderator, count)
+                    _count(totals, cell_action, cell_moderator, count)
+                # Buckets without matching events are left out
+                if summary['total'] or summary['reversals']:
+                    buckets.append(summary)
+        keep = self.retention.get(granularity)
+        return {
+            'granularity': granularity,
+            'start': datetime.fromtimestamp(start).isoformat(),
+            'end': datetime.fromtimestamp(end).isoformat(),
+            # Older buckets of this granularity have been dropped
+            'history_from': datetime.fromtimestamp(bucket_start(granularity, time.time() - keep)).isoformat() if keep else None,
+            'buckets': buckets,
+            'totals': totals
+        }
@@ -0,0 +1,126 @@
+import atexit
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Awaitable, Dict, List, Optional, TypeVar
+
+from config import TRACE_SLOW_COMMAND_SECONDS, TRACE_FILE
+from database import BackgroundWriter
+from metrics import command_duration
+
+T = TypeVar("T")
+
+# Trace of the app command running in the current task
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+class Trace:
+    """Per-stage timings for one app command invocation"""
+    def __init__(self, command: str):
+        self.command = command
+        self.started_at = datetime.utcnow()
+        self._start = time.perf_counter()
+        # (stage, offset from start, duration, depth) for flame analysis
+        self.spans: List[tuple] = []
+        self.stages: Dict[str, float] = {}
+        self._depth = 0
+        self.duration: Optional[float] = None
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time a block and add it to the stage totals"""
+        start = time.perf_counter()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            elapsed = time.perf_counter() - start
+            self.spans.append((stage, start - self._start, elapsed, self._depth))
+            # Nested spans are already counted by their parent
+            if self._depth == 0:
+                self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+
+    def finish(self, status: str = "ok"):
+        """Close the trace, export it, and log it if it was slow"""
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        command_duration.observe(self.duration, command=self.command, status=status)
+        if TRACE_SLOW_COMMAND_SECONDS and self.duration >= TRACE_SLOW_COMMAND_SECONDS:
+            print(f"🐢 Slow command /{self.command} ({status}) took {self.duration * 1000:.0f}ms: {self.describe()}")
+        if trace_writer:
+            trace_writer.write(self.to_dict(status))
+
+    def describe(self) -> str:
+        """One-line stage breakdown, slowest first"""
+        stages = sorted(self.stages.items(), key=lambda item: item[1], reverse=True)
+        other = self.duration - sum(self.stages.values())
+        parts = [f"{stage}={elapsed * 1000:.0f}ms" for stage, elapsed in stages]
+        parts.append(f"other={max(0.0, other) * 1000:.0f}ms")
+        return ", ".join(parts)
+
+    def to_dict(self, status: str) -> Dict:
+        return {
+            'command': self.command,
+            'status': status,
+            'started_at': self.started_at.isoformat(),
+            'duration': self.duration,
+            'stages': self.stages,
+            'spans': [
+                {'stage': stage, 'offset': offset, 'duration': elapsed, 'depth': depth}
+                for stage, offset, elapsed, depth in self.spans
+            ],
+        }
+
+class TraceWriter:
+    """Buffers finished traces and appends them to a JSONL file off the event loop"""
+    def __init__(self, trace_file: str, flush_interval: float = 1.0):
+        self.trace_file = trace_file
+        self._lock = threading.Lock()
+        self._pending: List[Dict] = []
+        self._writer = BackgroundWriter(self.flush, flush_interval, name="trace-writer")
+        atexit.register(self.close)
+
+    def write(self, trace: Dict):
+        with self._lock:
+            self._pending.append(trace)
+
+    def flush(self):
+        with self._lock:
+            traces, self._pending = self._pending, []
+        if traces:
+            with open(self.trace_file, 'a') as f:
+                f.write("".join(json.dumps(trace) + "\n" for trace in traces))
+
+    def close(self):
+        self._writer.stop()
+        self.flush()
+
+trace_writer = TraceWriter(TRACE_FILE) if TRACE_FILE else None
+
+def start_trace(command: str) -> Trace:
+    """Begin tracing a command in the current task"""
+    trace = Trace(command)
+    _current_trace.set(trace)
+    return trace
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def span(stage: str):
+    """Time a block as a stage of the current command; a no-op outside a traced command"""
+    trace = _current_trace.get()
+    if trace is None or trace.duration is not None:
+        yield
+        return
+    with trace.span(stage):
+        yield
+
+async def traced(stage: str, awaitable: Awaitable[T]) -> T:
+    """Await something as a stage of the current command"""
+    with span(stage):
+        return await awaitable
@@ -1,55 +1,398 @@
 import asyncio
+import contextlib
+import os
+import sys
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Any, Dict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import hashlib
 import json
+import time
+import uuid
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import PlainTextResponse, HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 
-from config import WEB_HOST, WEB_PORT
-from database import ModerationDB
+from config import (
+    WEB_HOST, WEB_PORT, WEB_MODE, WEB_WORKERS, WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT,
+    WS_SLOW_CONSUMER_POLICY, WS_STATS_MAX_RATE, WS_REPLAY_BUFFER, IPC_SOCKET,
+    API_STATS_MAX_AGE, API_STATS_MAX_WAIT
+)
+from database import create_database
+from ipc import StatsHub, StatsSubscriber
+from metrics import broadcast_duration, registry, stats_api_requests, websocket_connections
+from timeseries import GRANULARITIES
 
-app = FastAPI(title="Discord Moderation Bot Web")
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """uvicorn worker processes (WEB_MODE=process) follow the bot's stats over IPC_SOCKET"""
+    subscriber = None
+    if db is None and WEB_MODE == "process":
+        subscriber = StatsSubscriber(IPC_SOCKET)
+        subscriber.start()
+        set_database(subscriber)
+    yield
+    if subscriber:
+        await subscriber.close()
+
+app = FastAPI(title="Discord Moderation Bot Web", lifespan=lifespan)
 
 _start_time = datetime.utcnow()
-db = ModerationDB()
+# Set by set_database(); main.py passes the store shared with the bot
+db = None
+# ActivityRollup behind /api/timeseries, when this process keeps one
+activity_rollup = None
+
+class ClientConnection:
+    """A WebSocket client with its own bounded send queue and writer task"""
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager", protocol: int = 1):
+        self.websocket = websocket
+        self.manager = manager
+        # 1: full stats_update messages, 2: snapshot followed by sequenced deltas
+        self.protocol = protocol
+        self.queue: Deque[str] = deque()
+        self.dropped_messages = 0
+        self._has_messages = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    def enqueue(self, message: str) -> bool:
+        """Queue a message; returns False if the client is too slow to keep"""
+        if len(self.queue) >= self.manager.max_queue:
+            if self.manager.slow_consumer_policy != "drop_oldest":
+                return False
+            # Stats messages supersede each other, so the oldest is the least useful
+            self.queue.popleft()
+            self.dropped_messages += 1
+        self.queue.append(message)
+        self._has_messages.set()
+        return True
+
+    async def _writer(self):
+        while True:
+            await self._has_messages.wait()
+            while self.queue:
+                message = self.queue.popleft()
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(message), self.manager.send_timeout)
+                except Exception:
+                    # Dead or stalled socket
+                    self.manager.disconnect(self.websocket, close=True)
+                    return
+            self._has_messages.clear()
+
+    def close(self):
+        """Stop the writer task"""
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
 
 # Store active WebSocket connections
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    def __init__(self, max_queue: int = WS_SEND_QUEUE_SIZE, slow_consumer_policy: str = WS_SLOW_CONSUMER_POLICY, send_timeout: float = WS_SEND_TIMEOUT):
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.max_queue = max(1, max_queue)
+        # "drop_oldest" sheds queued messages, "disconnect" drops the client
+        self.slow_consumer_policy = slow_consumer_policy
+        self.send_timeout = send_timeout
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, protocol: int = 1):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections[websocket] = ClientConnection(websocket, self, protocol)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    def count(self, protocol: Optional[int] = None) -> int:
+        """Number of connected clients, optionally only those speaking a protocol"""
+        if protocol is None:
+            return len(self.active_connections)
+        return sum(1 for connection in self.active_connections.values() if connection.protocol == protocol)
+
+    def disconnect(self, websocket: WebSocket, close: bool = False):
+        connection = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.close()
+        if close:
+            asyncio.create_task(self._close_socket(websocket))
+
+    async def _close_socket(self, websocket: WebSocket):
+        try:
+            # 1013: try again later
+            await websocket.close(code=1013)
+        except Exception:
+            pass
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+        connection = self.active_connections.get(websocket)
+        if connection and not connection.enqueue(message):
+            self.disconnect(websocket, close=True)
+
+    async def broadcast(self, message: str, protocol: Optional[int] = None):
+        self.broadcast_nowait(message, protocol)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                pass
+    def broadcast_nowait(self, message: str, protocol: Optional[int] = None):
+        # Only enqueues, so one slow dashboard can't hold up the others
+        start = time.perf_counter()
+        for websocket, connection in list(self.active_connections.items()):
+            if protocol is not None and connection.protocol != protocol:
+                continue
+            if not connection.enqueue(message):
+                self.disconnect(websocket, close=True)
+        broadcast_duration.observe(time.perf_counter() - start)
+
+    async def broadcast_json(self, payload: Dict[str, Any], protocol: Optional[int] = None):
+        """Serialize once and broadcast to every client"""
+        await self.broadcast(json.dumps(payload), protocol)
 
 manager = ConnectionManager()
+websocket_connections.set_function(manager.count)
 
 async def broadcast_stats_update():
     """Broadcast updated stats to all connected WebSocket clients"""
+    # Delta clients are kept current by the event stream
+    if not manager.count(protocol=1):
+        return
     stats = db.get_moderation_stats()
-    message = json.dumps({
+    await manager.broadcast_json({
         'type': 'stats_update',
         'data': stats
-    })
-    await manager.broadcast(message)
+    }, protocol=1)
+
+class StatsNotifier:
+    """Coalesces data changes into at most max_rate stats broadcasts per second"""
+    def __init__(self, max_rate: float = WS_STATS_MAX_RATE):
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._last_broadcast = 0.0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Broadcast on this event loop (the one serving the WebSockets)"""
+        self._loop = loop
+
+    def mark_dirty(self):
+        """Note that stats changed; safe to call from any thread or from sync code"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            # Nothing is serving WebSockets yet, so there is nobody to tell
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._schedule()
+        else:
+            loop.call_soon_threadsafe(self._schedule)
+
+    def _schedule(self):
+        # A broadcast is already pending and will pick up this change too
+        if self._handle is not None:
+            return
+        delay = max(0.0, self._last_broadcast + self.min_interval - time.monotonic())
+        self._handle = self._loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        self._handle = None
+        self._last_broadcast = time.monotonic()
+        # Stats are read when the broadcast runs, so clients get the latest snapshot
+        asyncio.create_task(broadcast_stats_update())
+
+stats_notifier = StatsNotifier()
+
+class EventStream:
+    """Sequenced change events for protocol 2 clients, with a bounded replay buffer"""
+    def __init__(self, size: int = WS_REPLAY_BUFFER):
+        # Sequence numbers restart with the process, so resumes must name the stream
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self._buffer: Deque[Tuple[int, str]] = deque(maxlen=max(1, size))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Publish on this event loop (the one serving the WebSockets)"""
+        self._loop = loop
+
+    def publish(self, event: Dict[str, Any]):
+        """Store event listener; safe to call from any thread"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self._publish(event)
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._publish(event)
+        else:
+            loop.call_soon_threadsafe(self._publish, event)
+
+    def _publish(self, event: Dict[str, Any]):
+        self.seq += 1
+        counts = db.get_moderation_stats()
+        counts.pop('timestamp', None)
+        message = json.dumps({
+            'v': 2,
+            'type': 'delta',
+            'seq': self.seq,
+            'event': event['type'],
+            'user_id': event.get('user_id'),
+            'moderator_id': event.get('moderator_id'),
+            'timestamp': event.get('timestamp'),
+            'counts': counts
+        })
+        self._buffer.append((self.seq, message))
+        manager.broadcast_nowait(message, protocol=2)
+
+    def snapshot(self) -> str:
+        """Full stats at the current sequence number"""
+        return json.dumps({
+            'v': 2,
+            'type': 'snapshot',
+            'stream': self.stream_id,
+            'seq': self.seq,
+            'data': get_moderation_stats()
+        })
+
+    def replay(self, stream: Optional[str], since: Optional[int]) -> Optional[List[str]]:
+        """Deltas after `since`, or None if the client has to start from a snapshot"""
+        if stream != self.stream_id or since is None or since > self.seq:
+            return None
+        oldest = self._buffer[0][0] if self._buffer else self.seq + 1
+        if since + 1 < oldest:
+            # Fell out of the buffer
+            return None
+        return [message for seq, message in self._buffer if seq > since]
+
+event_stream = EventStream()
+
+class StatsCache:
+    """Serialized /api/stats snapshot, reused until the data changes"""
+    def __init__(self, max_age: float = API_STATS_MAX_AGE):
+        # Mutes expire without a change event, so snapshots also go stale with age
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._version = 0
+        self._changed_at = time.time()
+        self._waiters: List[asyncio.Future] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
-# Set up database callback to broadcast updates
-db.add_data_change_callback(lambda: asyncio.create_task(broadcast_stats_update()))
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Wake long-polls on this event loop (the one serving the API)"""
+        self._loop = loop
+
+    def invalidate(self):
+        """Data change callback; safe to call from any thread"""
+        with self._lock:
+            self._version += 1
+            self._changed_at = time.time()
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wake()
+        else:
+            loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def get(self) -> Tuple[Dict[str, Any], bool]:
+        """Current snapshot, and whether it was served from the cache"""
+        with self._lock:
+            snapshot = self._snapshot
+            version = self._version
+            changed_at = self._changed_at
+            if snapshot and snapshot['version'] == version and time.monotonic() - snapshot['built_at'] < self.max_age:
+                return snapshot, True
+        stats = get_moderation_stats()
+        counts = {key: value for key, value in stats.items() if key != 'timestamp'}
+        # Derived from the counts alone, so every web process agrees on it
+        etag = '"' + hashlib.sha1(json.dumps(counts, sort_keys=True).encode()).hexdigest()[:16] + '"'
+        if snapshot and snapshot['etag'] == etag:
+            last_modified = snapshot['last_modified']
+        elif snapshot and snapshot['version'] == version:
+            # The counts moved without a change event (a mute expired)
+            last_modified = time.time()
+        else:
+            last_modified = changed_at
+        snapshot = {
+            'body': json.dumps(stats).encode(),
+            'etag': etag,
+            'last_modified': last_modified,
+            'version': version,
+            'built_at': time.monotonic()
+        }
+        with self._lock:
+            # Don't cache totals read before a change that landed meanwhile
+            if self._version == version:
+                self._snapshot = snapshot
+        return snapshot, False
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for the next data change"""
+        if timeout <= 0:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+stats_cache = StatsCache()
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 asks for GET)"""
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+def _not_modified(request: Request, snapshot: Dict[str, Any]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, snapshot['etag'])
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates only have whole seconds
+    return int(snapshot['last_modified']) <= since
+
+def _cache_headers(snapshot: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        'ETag': snapshot['etag'],
+        'Last-Modified': formatdate(snapshot['last_modified'], usegmt=True),
+        # Clients may keep the body but must revalidate before using it
+        'Cache-Control': 'no-cache'
+    }
+
+def set_database(store, activity=None) -> None:
+    """Serve stats from the given moderation store and broadcast its changes"""
+    global db, activity_rollup
+    db = store
+    activity_rollup = activity
+    db.add_data_change_callback(stats_notifier.mark_dirty)
+    db.add_data_change_callback(stats_cache.invalidate)
+    db.add_event_listener(event_stream.publish)
 
 def get_moderation_stats() -> Dict[str, Any]:
     """Get current moderation statistics"""
@@ -70,33 +413,120 @@ async def metrics() -> PlainTextResponse:
 		"# TYPE app_uptime_seconds counter",
 		f"app_uptime_seconds {uptime}",
 	]
-	return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+	# Every metric is kept in memory, so rendering is a cheap read
+	return PlainTextResponse("\n".join(lines) + "\n" + registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/stats")
-async def get_stats() -> Dict[str, Any]:
-    """API endpoint to get current moderation statistics"""
-    return get_moderation_stats()
+async def get_stats(request: Request, wait: Optional[float] = None) -> Response:
+    """API endpoint to get current moderation statistics, with conditional GETs and ?wait= long-polls"""
+    stats_cache.bind(asyncio.get_running_loop())
+    snapshot, cached = stats_cache.get()
+    if_none_match = request.headers.get("if-none-match")
+    if wait and wait > 0 and (if_none_match is None or _etag_matches(if_none_match, snapshot['etag'])):
+        deadline = time.monotonic() + min(wait, API_STATS_MAX_WAIT)
+        while await stats_cache.wait(deadline - time.monotonic()):
+            snapshot, cached = stats_cache.get()
+            # Plain long-polls return on the next change, conditional ones once the client's copy is stale
+            if if_none_match is None or not _etag_matches(if_none_match, snapshot['etag']):
+                break
+        else:
+            # Timed out; pick up any mute that expired meanwhile
+            snapshot, cached = stats_cache.get()
+    if _not_modified(request, snapshot):
+        stats_api_requests.inc(result="not_modified")
+        return Response(status_code=304, headers=_cache_headers(snapshot))
+    stats_api_requests.inc(result="hit" if cached else "miss")
+    return Response(snapshot['body'], media_type="application/json", headers=_cache_headers(snapshot))
+
+@app.get("/api/guilds/{guild_id}/stats")
+async def get_guild_stats(guild_id: int) -> Dict[str, Any]:
+    """API endpoint to get one guild's moderation statistics"""
+    if not hasattr(db, "get_guild_stats"):
+        raise HTTPException(status_code=404, detail="Per-guild stats need DB_PARTITION_BY_GUILD=true")
+    return db.get_guild_stats(guild_id)
+
+# Range covered when /api/timeseries is called without a start
+DEFAULT_TIMESERIES_SPAN = {'minute': 3600, 'hour': 86400, 'day': 30 * 86400}
+
+@app.get("/api/timeseries")
+async def get_timeseries(
+    granularity: str = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    action: Optional[str] = None,
+    moderator_id: Optional[int] = None,
+    guild_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """API endpoint to get moderation actions per minute, hour or day, by action type and moderator"""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+    end_ts = end.timestamp() if end else time.time()
+    start_ts = start.timestamp() if start else end_ts - DEFAULT_TIMESERIES_SPAN[granularity]
+    if start_ts >= end_ts:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    params = {
+        'granularity': granularity,
+        'start': start_ts,
+        'end': end_ts,
+        'action': action,
+        'moderator_id': moderator_id,
+        'guild_id': guild_id
+    }
+    try:
+        if activity_rollup is not None:
+            return activity_rollup.query(**params)
+        if isinstance(db, StatsSubscriber):
+            # WEB_MODE=process: the rollups live in the bot (or launcher) process
+            result = await db.query_activity(params)
+            if result is None:
+                raise HTTPException(status_code=503, detail="Activity history is not available from the bot process")
+            return result
+    except ValueError as e:
+        # e.g. a guild_id filter when the store isn't partitioned by guild
+        raise HTTPException(status_code=400, detail=str(e))
+    raise HTTPException(status_code=404, detail="Activity history is kept by the bot process; run the web server from main.py")
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, v: int = 1, stream: Optional[str] = None, since: Optional[int] = None):
+    loop = asyncio.get_running_loop()
+    stats_notifier.bind(loop)
+    event_stream.bind(loop)
+    protocol = 2 if v >= 2 else 1
+    await manager.connect(websocket, protocol)
     try:
-        # Send initial stats
-        stats = get_moderation_stats()
-        await websocket.send_text(json.dumps({
-            'type': 'stats_update',
-            'data': stats
-        }))
+        if protocol == 2:
+            # No await between reading the sequence and queueing, so no delta can slip in between
+            missed = event_stream.replay(stream, since)
+            if missed is None:
+                await manager.send_personal_message(event_stream.snapshot(), websocket)
+            else:
+                await manager.send_personal_message(json.dumps({
+                    'v': 2,
+                    'type': 'resume',
+                    'stream': event_stream.stream_id,
+                    'seq': event_stream.seq
+                }), websocket)
+                for message in missed:
+                    await manager.send_personal_message(message, websocket)
+        else:
+            # Send initial stats
+            stats = get_moderation_stats()
+            await manager.send_personal_message(json.dumps({
+                'type': 'stats_update',
+                'data': stats
+            }), websocket)
         
         # Keep connection alive and handle incoming messages
         while True:
             data = await websocket.receive_text()
             # Echo back for ping/pong
-            await websocket.send_text(json.dumps({
+            await manager.send_personal_message(json.dumps({
                 'type': 'pong',
                 'data': data
-            }))
+            }), websocket)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 @app.get("/", response_class=HTMLResponse)
@@ -167,6 +597,7 @@ async def root() -> str:
 				<li><strong>Health</strong>: <code>GET /health</code></li>
 				<li><strong>Metrics</strong>: <code>GET /metrics</code></li>
 				<li><strong>Stats API</strong>: <code>GET /api/stats</code></li>
+				<li><strong>Activity API</strong>: <code>GET /api/timeseries?granularity=hour</code></li>
 				<li><strong>WebSocket</strong>: <code>ws://localhost:8000/ws</code></li>
 			</ul>
 		</div>
@@ -174,6 +605,9 @@ async def root() -> str:
 		<script>
 			let ws = null;
 			let reconnectInterval = null;
+			// Delta protocol position, used to resume after a reconnect
+			let streamId = null;
+			let lastSeq = null;
 			
 			function updateStats(data) {
 				document.getElementById('totalWarnings').textContent = data.total_warnings;
@@ -206,7 +640,10 @@ async def root() -> str:
 				}
 				
 				const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-				const wsUrl = protocol + '//' + window.location.host + '/ws';
+				let wsUrl = protocol + '//' + window.location.host + '/ws?v=2';
+				if (streamId !== null && lastSeq !== null) {
+					wsUrl += `&stream=${streamId}&since=${lastSeq}`;
+				}
 				
 				ws = new WebSocket(wsUrl);
 				
@@ -224,6 +661,15 @@ async def root() -> str:
 						const message = JSON.parse(event.data);
 						if (message.type === 'stats_update') {
 							updateStats(message.data);
+						} else if (message.type === 'snapshot') {
+							streamId = message.stream;
+							lastSeq = message.seq;
+							updateStats(message.data);
+						} else if (message.type === 'resume') {
+							streamId = message.stream;
+						} else if (message.type === 'delta') {
+							lastSeq = message.seq;
+							updateStats(message.counts);
 						}
 					} catch (e) {
 						console.error('Error parsing message:', e);
@@ -278,6 +724,80 @@ async def favicon() -> PlainTextResponse:
 
 async def serve() -> None:
 	import uvicorn
+	if db is None and WEB_MODE != "process":
+		# Running standalone (start_web.py) without a store from the bot
+		set_database(create_database())
 	config = uvicorn.Config(app=app, host=WEB_HOST, port=WEB_PORT, log_level="info")
 	server = uvicorn.Server(config)
 	await server.serve()
+
+class WebServer:
+    """Runs the dashboard for a bot process in the configured WEB_MODE"""
+    def __init__(self, store, activity=None, mode: str = WEB_MODE, workers: int = WEB_WORKERS):
+        self.store = store
+        self.activity = activity
+        self.mode = mode if mode in ("inline", "thread", "process") else "inline"
+        self.workers = max(1, workers)
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._server = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._hub: Optional[StatsHub] = None
+
+    async def start(self):
+        if self.mode == "process":
+            await self._start_processes()
+        elif self.mode == "thread":
+            set_database(self.store, self.activity)
+            self._thread = threading.Thread(target=self._run_thread, name="web-server", daemon=True)
+            self._thread.start()
+        else:
+            set_database(self.store, self.activity)
+            self._server = self._make_server()
+            self._task = asyncio.create_task(self._server.serve())
+        print(f"🌐 Web server starting ({self.mode})...")
+
+    def _make_server(self):
+        import uvicorn
+        config = uvicorn.Config(app=app, host=WEB_HOST, port=WEB_PORT, log_level="info")
+        return uvicorn.Server(config)
+
+    def _run_thread(self):
+        self._server = self._make_server()
+        # Its own event loop, so dashboard traffic never delays gateway events and acks
+        asyncio.run(self._server.serve())
+
+    async def _start_processes(self):
+        # launcher.py already runs a hub for its workers; a single bot process starts one
+        if isinstance(self.store, StatsHub):
+            hub = self.store
+        else:
+            hub = self._hub = StatsHub(IPC_SOCKET)
+            await hub.start()
+            hub.attach(self.store)
+        # The web processes send their /api/timeseries queries to the hub
+        hub.activity = self.activity
+        self._process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "web:app",
+            "--app-dir", APP_DIR,
+            "--host", WEB_HOST,
+            "--port", str(WEB_PORT),
+            "--workers", str(self.workers),
+            env=dict(os.environ, WEB_MODE="process", IPC_SOCKET=hub.socket_path)
+        )
+
+    async def stop(self):
+        if self._task:
+            # Graceful shutdown; cancelling serve() mid-lifespan logs a traceback
+            self._server.should_exit = True
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        if self._thread:
+            if self._server is not None:
+                self._server.should_exit = True
+            await asyncio.to_thread(self._thread.join, 10)
+        if self._process and self._process.returncode is None:
+            self._process.terminate()
+            await self._process.wait()
+        if self._hub:
+            await self._hub.close()
@@ -0,0 +1,298 @@
+import heapq
+import json
+import os
+import string
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import AUTOMOD_BANNED_WORDS, AUTOMOD_WORDS_FILE
+
+# Digits and symbols used as look-alike letters
+LEETSPEAK = {
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b',
+    '@': 'a', '$': 's', '|': 'l', '+': 't'
+}
+# Separators people put inside a word to dodge filters (b.a.d, b-a-d, b_a_d)
+INWORD_SEPARATORS = ".-_*'`~"
+
+def _build_fold_table() -> Dict[int, Optional[str]]:
+    table: Dict[int, Optional[str]] = {}
+    for char in string.punctuation:
+        table[ord(char)] = ' '
+    for char in INWORD_SEPARATORS:
+        table[ord(char)] = None
+    for char in string.whitespace:
+        table[ord(char)] = ' '
+    for char, letter in LEETSPEAK.items():
+        table[ord(char)] = letter
+    return table
+
+FOLD_TABLE = _build_fold_table()
+
+def normalize(text: str) -> str:
+    """Fold text so obfuscated variants compare equal: case, accents, width, leetspeak, separators"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    if not text.isascii():
+        # Drop the combining accents NFKD split off (é -> e)
+        text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.translate(FOLD_TABLE).split())
+
+class WordMatcher:
+    """Aho-Corasick automaton over normalized banned terms; one pass per message regardless of term count"""
+    def __init__(self, terms: Iterable[str] = (), whole_words: bool = True):
+        self.whole_words = whole_words
+        self.terms: Dict[str, str] = {}
+        # Trie: per node the outgoing edges, the failure link, the term ending exactly
+        # there and every term matched there (including through failure links),
+        # each as (term, folded length)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._own: List[Tuple[Tuple[str, int], ...]] = [()]
+        self._output: List[Tuple[Tuple[str, int], ...]] = [()]
+        # Per node its parent, the edge into it and its depth, so new nodes can be linked on their own
+        self._parent: List[int] = [0]
+        self._char: List[str] = [""]
+        self._depth: List[int] = [0]
+        # Reverse failure links: node -> nodes whose failure link points at it
+        self._fail_children: Dict[int, Set[int]] = {}
+        self.add(terms)
+    
+    def __len__(self) -> int:
+        return len(self.terms)
+    
+    def add(self, terms: Iterable[str]):
+        """Insert terms, linking only the new nodes and the existing nodes they affect"""
+        goto = self._goto
+        new_nodes: List[int] = []
+        ended: List[int] = []
+        for term in terms:
+            folded = normalize(term)
+            if not folded or folded in self.terms:
+                continue
+            self.terms[folded] = term
+            node = 0
+            for char in folded:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto.append({})
+                    self._fail.append(0)
+                    self._own.append(())
+                    self._output.append(())
+                    self._parent.append(node)
+                    self._char.append(char)
+                    self._depth.append(self._depth[node] + 1)
+                    goto[node][char] = next_node
+                    new_nodes.append(next_node)
+                node = next_node
+            self._own[node] = ((term, len(folded)),)
+            ended.append(node)
+        if not ended:
+            return
+        if len(new_nodes) * 2 > len(goto):
+            # Mostly new trie (first build, or a rebuild after remove): one full pass is cheaper
+            self._link()
+        else:
+            self._link_new(new_nodes, ended)
+    
+    def remove(self, terms: Iterable[str]):
+        """Drop terms; the trie is rebuilt from the remaining ones"""
+        removed = {normalize(term) for term in terms}
+        remaining = [term for folded, term in self.terms.items() if folded not in removed]
+        if len(remaining) == len(self.terms):
+            return
+        self.terms = {}
+        self._goto, self._fail, self._own, self._output = [{}], [0], [()], [()]
+        self._parent, self._char, self._depth = [0], [""], [0]
+        self._fail_children = {}
+        self.add(remaining)
+    
+    def _set_fail(self, node: int, target: int):
+        children = self._fail_children.get(self._fail[node])
+        if children is not None:
+            children.discard(node)
+        self._fail[node] = target
+        self._fail_children.setdefault(target, set()).add(node)
+    
+    def _link(self):
+        """Compute every failure link breadth-first"""
+        goto, fail, own, output = self._goto, self._fail, self._own, self._output
+        self._fail_children = {}
+        queue = deque()
+        for child in goto[0].values():
+            self._set_fail(child, 0)
+            output[child] = own[child]
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                link = fail[node]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                self._set_fail(child, goto[link].get(char, 0))
+                output[child] = own[child] + output[fail[child]]
+                queue.append(child)
+    
+    def _link_new(self, new_nodes: List[int], ended: List[int]):
+        """Link freshly inserted nodes and re-point existing nodes whose longest suffix is now a new one"""
+        goto, fail, depth = self._goto, self._fail, self._depth
+        new = set(new_nodes)
+        queue = [(depth[node], node) for node in new_nodes]
+        # An existing node may gain a new node as its failure target: its parent's chain
+        # runs through the new node's parent, with no nearer node having the same edge
+        for node in new_nodes:
+            parent, char = self._parent[node], self._char[node]
+            if parent in new:
+                continue
+            stack = list(self._fail_children.get(parent, ()))
+            while stack:
+                suffixed = stack.pop()
+                child = goto[suffixed].get(char)
+                if child is None:
+                    stack.extend(self._fail_children.get(suffixed, ()))
+                elif child not in new:
+                    queue.append((depth[child], child))
+        heapq.heapify(queue)
+        
+        # Recompute in depth order, so every parent's failure chain is already final
+        changed = list(ended)
+        seen: Set[int] = set()
+        while queue:
+            _, node = heapq.heappop(queue)
+            if node in seen:
+                continue
+            seen.add(node)
+            parent, char = self._parent[node], self._char[node]
+            target = 0
+            if parent:
+                link = fail[parent]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                target = goto[link].get(char, 0)
+            if node not in new and target == fail[node]:
+                continue
+            self._set_fail(node, target)
+            changed.append(node)
+            # Children of this node, and of every node failing through it, see a different chain
+            stack = [node]
+            while stack:
+                suffixed = stack.pop()
+                for child in goto[suffixed].values():
+                    if child not in seen:
+                        heapq.heappush(queue, (depth[child], child))
+                stack.extend(self._fail_children.get(suffixed, ()))
+        
+        own, output = self._own, self._output
+        done: Set[int] = set()
+        for root in sorted(changed, key=depth.__getitem__):
+            if root in done:
+                continue
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                done.add(node)
+                output[node] = own[node] + output[fail[node]]
+                stack.extend(self._fail_children.get(node, ()))
+    
+    def search(self, text: str, folded: Optional[str] = None) -> Optional[str]:
+        """Return the first banned term found in text, or None"""
+        if not self.terms:
+            return None
+        if folded is None:
+            folded = normalize(text)
+        goto, fail, output = self._goto, self._fail, self._output
+        whole_words = self.whole_words
+        length = len(folded)
+        node = 0
+        for index, char in enumerate(folded):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                for term, size in output[node]:
+                    if not whole_words:
+                        return term
+                    start = index - size + 1
+                    # Whole words only: "class" must not match "ass"
+                    if (start == 0 or not folded[start - 1].isalnum()) and (index + 1 == length or not folded[index + 1].isalnum()):
+                        return term
+        return None
+
+class WordFilterRegistry:
+    """Banned-term matchers per guild, on top of the global AUTOMOD_BANNED_WORDS"""
+    def __init__(self, words_file: str = AUTOMOD_WORDS_FILE, global_terms: Iterable[str] = AUTOMOD_BANNED_WORDS):
+        self.words_file = words_file
+        self.global_terms = list(global_terms)
+        self._guild_terms: Dict[int, List[str]] = self._load()
+        self._global = WordMatcher(self.global_terms)
+        self._matchers: Dict[int, WordMatcher] = {}
+    
+    def _load(self) -> Dict[int, List[str]]:
+        if not self.words_file or not os.path.exists(self.words_file):
+            return {}
+        try:
+            with open(self.words_file, 'r') as f:
+                return {int(guild_id): terms for guild_id, terms in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            print(f"Error loading banned words: {e}")
+            return {}
+    
+    def _save(self, guild_id: int):
+        """Write one guild's terms, keeping other guilds' entries as they are on disk"""
+        if not self.words_file:
+            return
+        # Bot workers (launcher.py) share the file but each only edits its own guilds
+        stored = self._load()
+        if guild_id in self._guild_terms:
+            stored[guild_id] = self._guild_terms[guild_id]
+        else:
+            stored.pop(guild_id, None)
+        tmp_file = f"{self.words_file}.tmp.{os.getpid()}"
+        with open(tmp_file, 'w') as f:
+            json.dump({str(guild_id): terms for guild_id, terms in stored.items()}, f, indent=2)
+        os.replace(tmp_file, self.words_file)
+    
+    def matcher(self, guild_id: Optional[int]) -> WordMatcher:
+        """Matcher for a guild's own terms plus the global ones"""
+        if guild_id not in self._guild_terms:
+            return self._global
+        matcher = self._matchers.get(guild_id)
+        if matcher is None:
+            matcher = self._matchers[guild_id] = WordMatcher(self.global_terms + self._guild_terms[guild_id])
+        return matcher
+    
+    def terms(self, guild_id: int) -> List[str]:
+        return list(self._guild_terms.get(guild_id, []))
+    
+    def add(self, guild_id: int, terms: Iterable[str]) -> List[str]:
+        """Add terms for a guild; returns the ones that were new"""
+        current = list(self._guild_terms.get(guild_id, []))
+        known = {normalize(term) for term in current}
+        added = []
+        for term in terms:
+            folded = normalize(term)
+            if folded and folded not in known:
+                known.add(folded)
+                current.append(term)
+                added.append(term)
+        if added:
+            self._guild_terms[guild_id] = current
+            # Only the new terms' nodes (and the existing nodes they affect) are linked
+            if guild_id in self._matchers:
+                self._matchers[guild_id].add(added)
+            self._save(guild_id)
+        return added
+    
+    def remove(self, guild_id: int, terms: Iterable[str]) -> List[str]:
+        """Remove terms from a guild; returns the ones that were present"""
+        removed_folded = {normalize(term) for term in terms}
+        current = self._guild_terms.get(guild_id, [])
+        removed = [term for term in current if normalize(term) in removed_folded]
+        if removed:
+            self._guild_terms[guild_id] = [term for term in current if normalize(term) not in removed_folded]
+            if not self._guild_terms[guild_id]:
+                del self._guild_terms[guild_id]
+            self._matchers.pop(guild_id, None)
+            self._save(guild_id)
+        return removed